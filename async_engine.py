@@ -0,0 +1,348 @@
+# 异步执行引擎 - 单进程并发处理多个期权合约的贴卖一卖出
+# 每个任务执行与 market_trade.py main() 相同的逻辑: 卖一减折扣挂单, 不低于买一, 数量不超过卖一
+# 所有任务共享一个 aiohttp 连接池和 http_client 的同一个限速器
+# 下单超时按 clientOrderId 确认后才重发; 结果未确认的订单先查清并撤掉, 才按剩余数量挂下一单, 不会超卖
+# python async_engine.py --jobs jobs.csv
+# python async_engine.py --job ETH-250728-3600-C:0.1:2 --job ETH-250728-3700-C:1:2
+# jobs.csv 格式 (带表头): symbol,quantity,discount
+import aiohttp
+import argparse
+import asyncio
+import csv
+import json
+import time
+import urllib.parse
+
+import http_client
+from market_trade import (
+    SIGNER, TIME_SYNC, EXCHANGE_INFO, BASE_URL, ORDERBOOK_ENDPOINT, ORDER_ENDPOINT,
+    ORDER_NOT_FOUND, ORDER_UNKNOWN, SUBMIT_RETRIES, calculate_order_price, configure_endpoints, retry_delay,
+)
+from signer import encode_params
+from order_manager import ACTIVE_STATUSES, OrderManager, to_decimal
+from rate_limiter import request_cost
+from risk_book import RiskBook
+from risk_gate import RiskGate, load_limits
+from time_sync import TIMESTAMP_ERROR_CODE
+
+# 订单状态轮询间隔 (秒), 实际节奏还受限速器约束
+ORDER_POLL_INTERVAL = 1
+DEFAULT_POOL_SIZE = 20
+
+
+class EngineStats:
+    """引擎汇总统计"""
+
+    def __init__(self):
+        self.start_time = time.monotonic()
+        self.orders = 0
+        self.fills = 0
+        self.filled_qty = to_decimal(0)
+        self.errors = 0
+
+    def report(self):
+        elapsed = time.monotonic() - self.start_time
+        print(f"总耗时: {elapsed:.2f} 秒")
+        print(f"下单数: {self.orders}, 成交订单数: {self.fills}, 成交数量: {self.filled_qty}, 错误: {self.errors}")
+        if elapsed > 0:
+            print(f"吞吐: {self.orders / elapsed:.2f} 单/秒, {self.fills / elapsed:.2f} 成交/秒")
+
+
+class AsyncEngine:
+    """共享连接池和限速器的并发卖出引擎"""
+
+    def __init__(self, base_url=BASE_URL, pool_size=DEFAULT_POOL_SIZE, gate=None):
+        self.base_url = base_url
+        self.pool_size = pool_size
+        # 下单前风控 (只读快照, 在事件循环内同步检查, 每单几微秒)
+        self.gate = gate
+        self.limiter = http_client.get_limiter(urllib.parse.urlsplit(base_url).netloc)
+        self.stats = EngineStats()
+        self.session = None
+
+    async def request(self, method, path, params, signed=False):
+        """发送请求: 先向限速器预占额度, 异步等待后再发出"""
+        weight, orders = request_cost(method, path)
+        delay = self.limiter.reserve(weight, orders)
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+        if signed:
+            query_string = SIGNER.sign_params(params)
+            headers = SIGNER.headers
+        else:
+            query_string = encode_params(params)
+            headers = {}
+
+        url = f"{self.base_url}{path}?{query_string}"
+        timeout = http_client.get_timeout(url)
+        if not isinstance(timeout, tuple):
+            timeout = (timeout, timeout)
+        timeout = aiohttp.ClientTimeout(sock_connect=timeout[0], sock_read=timeout[1])
+        async with self.session.request(method, url, headers=headers, timeout=timeout) as response:
+            self.limiter.update_from_headers(response.headers, response.status)
+            return await response.json(content_type=None)
+
+    async def request_safely(self, method, path, params, signed=False):
+        """同 request, 网络错误/超时/响应无法解析时返回None"""
+        try:
+            return await self.request(method, path, params, signed)
+        except (aiohttp.ClientError, asyncio.TimeoutError, json.JSONDecodeError) as e:
+            print(f"{method} {path} 请求失败: {e!r}")
+            return None
+
+    async def get_orderbook(self, symbol, limit=100):
+        orderbook = await self.request("GET", ORDERBOOK_ENDPOINT, {"symbol": symbol, "limit": limit})
+        if 'bids' not in orderbook or 'asks' not in orderbook:
+            print(f"[{symbol}] 获取订单簿失败: {orderbook}")
+            return None
+        return orderbook
+
+    async def send_limit_order(self, symbol, side, quantity, price, client_order_id=None,
+                               best_bid=None, best_ask=None):
+        if self.gate is not None:
+            reason = self.gate.check(symbol, side, quantity, price, best_bid, best_ask)
+            if reason is not None:
+                print(f"[{symbol}] 风控拒绝下单: {reason}")
+                return None
+        params = {
+            "symbol": symbol,
+            "side": side,
+            "type": "LIMIT",
+            "quantity": str(quantity),
+            "price": str(price),
+            "timeInForce": "GTC",
+            "clientOrderId": client_order_id,
+        }
+        # 与 market_trade.send_limit_order 相同: 超时后按 clientOrderId 确认, 未创建才用同一ID重发
+        for attempt in range(SUBMIT_RETRIES + 1):
+            try:
+                result = await self.request("POST", ORDER_ENDPOINT, params, signed=True)
+                if isinstance(result, dict) and result.get('code') == TIMESTAMP_ERROR_CODE:
+                    # 时间戳超出接收窗口说明订单已被拒绝: 重新同步服务器时间 (阻塞请求放到线程池) 后重新签名发送一次
+                    print(f"[{symbol}] 时间戳超出接收窗口, 重新同步服务器时间...")
+                    await asyncio.get_running_loop().run_in_executor(None, TIME_SYNC.sync)
+                    result = await self.request("POST", ORDER_ENDPOINT, params, signed=True)
+            except (aiohttp.ClientError, asyncio.TimeoutError, json.JSONDecodeError) as e:
+                print(f"[{symbol}] 下单请求失败: {e!r}, 按clientOrderId查询是否已下单...")
+                existing = await self.query_order(symbol, client_order_id=client_order_id)
+                if existing and existing != ORDER_UNKNOWN:
+                    result = existing
+                elif attempt == SUBMIT_RETRIES:
+                    break
+                else:
+                    continue
+            if 'orderId' not in result:
+                if attempt > 0:
+                    # 重发被拒绝时, 可能是前一次请求其实已经下单成功
+                    existing = await self.query_order(symbol, client_order_id=client_order_id)
+                    if existing == ORDER_UNKNOWN:
+                        return ORDER_UNKNOWN
+                    if existing:
+                        result = existing
+                if 'orderId' not in result:
+                    print(f"[{symbol}] 下单失败: {result}")
+                    return None
+            self.stats.orders += 1
+            print(f"[{symbol}] 下单成功! 订单ID: {result['orderId']}, 价格: {price}, 数量: {quantity}")
+            return result['orderId']
+        print(f"[{symbol}] 下单重试{SUBMIT_RETRIES}次仍未确认, 订单状态未知, 需对账后再继续")
+        return ORDER_UNKNOWN
+
+    async def query_order(self, symbol, order_id=None, client_order_id=None):
+        """按 orderId 或 clientOrderId 查询单个订单, 交易所确认不存在返回None, 查询失败返回 ORDER_UNKNOWN"""
+        order = await self.request_safely("GET", ORDER_ENDPOINT, {
+            "symbol": symbol, "orderId": order_id, "clientOrderId": client_order_id}, signed=True)
+        if not isinstance(order, dict):
+            return ORDER_UNKNOWN
+        if order.get('code') == ORDER_NOT_FOUND:
+            return None
+        if 'status' not in order:
+            print(f"[{symbol}] 查询订单状态失败: {order}")
+            return ORDER_UNKNOWN
+        return order
+
+    async def cancel_order(self, symbol, order_id):
+        """撤销订单, 返回撤单时的 (status, executed_qty); 撤单失败(如已成交)返回 (None, 0)"""
+        result = await self.request_safely("DELETE", ORDER_ENDPOINT, {"symbol": symbol, "orderId": order_id},
+                                           signed=True)
+        if not isinstance(result, dict) or 'status' not in result:
+            print(f"[{symbol}] 撤单失败: {result}")
+            return None, 0
+        return result['status'], to_decimal(result['executedQty'])
+
+    async def settle_orders(self, manager):
+        """结果未确认的订单按 clientOrderId 查清: 不存在记为拒绝, 仍在挂单则撤掉, 全部结束返回True"""
+        symbol = manager.symbol
+        for client_order_id in [coid for coid in manager.orders if not manager.is_final(coid)]:
+            order = await self.query_order(symbol, client_order_id=client_order_id)
+            if order == ORDER_UNKNOWN:
+                return False
+            if order is None:
+                manager.update(client_order_id, "REJECTED", 0)
+                continue
+            if manager.get(client_order_id)["orderId"] is None:
+                manager.bind(client_order_id, order['orderId'])
+            status, executed_qty = order['status'], to_decimal(order['executedQty'])
+            if status in ACTIVE_STATUSES:
+                status, executed_qty = await self.cancel_order(symbol, order['orderId'])
+                if status is None:
+                    # 撤单失败多半是刚好成交, 下一轮重新查询
+                    return False
+            manager.update(client_order_id, status, executed_qty)
+            print(f"[{symbol}] 对账: 订单 {client_order_id} 状态={status}, 已成交={executed_qty}")
+        return True
+
+    async def monitor_order(self, manager, client_order_id, order_id):
+        """轮询订单直到结束; 查询失败时退避后继续监控同一订单, 不会另挂新单"""
+        symbol = manager.symbol
+        failures = 0
+        while True:
+            await asyncio.sleep(ORDER_POLL_INTERVAL)
+            order = await self.query_order(symbol, order_id=order_id)
+            if not order or order == ORDER_UNKNOWN:
+                self.stats.errors += 1
+                delay = retry_delay(failures)
+                failures += 1
+                print(f"[{symbol}] 查询订单 {order_id} 失败, 等待{delay}秒后继续监控...")
+                await asyncio.sleep(delay)
+                continue
+            failures = 0
+            status, executed_qty = order['status'], to_decimal(order['executedQty'])
+            if status in ACTIVE_STATUSES:
+                continue
+            # 终结状态: 按实际成交数量累计 (含部分成交后撤单/过期)
+            manager.update(client_order_id, status, executed_qty)
+            if executed_qty > 0:
+                self.stats.fills += 1
+                self.stats.filled_qty += executed_qty
+            print(f"[{symbol}] 订单状态: {status}, 成交: {executed_qty}, 已完成: {manager.executed_qty}/{manager.total_qty}")
+            return
+
+    async def run_job(self, symbol, quantity, discount):
+        """单个合约的卖出任务"""
+        on_fill = self.gate.risk_book.fill_callback() if self.gate is not None and self.gate.risk_book else None
+        manager = OrderManager(symbol, "SELL", quantity, on_fill=on_fill)
+        failures = 0
+        while manager.remaining_qty > 0:
+            halted = self.gate.halt_reason() if self.gate is not None else None
+            if halted is not None:
+                # 停止开关/日内亏损上限下重试只会不断被拒, 直接结束任务
+                print(f"[{symbol}] 风控已停止下单 ({halted}), 结束任务")
+                break
+            try:
+                if manager.open_qty > 0:
+                    # 提交结果未知的订单可能已挂出, 查清并撤掉后才能按剩余数量继续
+                    if not await self.settle_orders(manager):
+                        raise ValueError("未确认的订单对账未完成")
+                remaining_qty = manager.remaining_qty
+                orderbook = await self.get_orderbook(symbol)
+                if not orderbook or not orderbook['bids'] or not orderbook['asks'] or float(orderbook['asks'][0][1]) == 0:
+                    raise ValueError("无买卖单深度")
+
+                best_bid_price = float(orderbook['bids'][0][0])
+                best_ask_price = float(orderbook['asks'][0][0])
+                best_ask_qty = float(orderbook['asks'][0][1])
+
+                order_price = calculate_order_price(best_bid_price, best_ask_price, discount)
+                order_qty = min(to_decimal(best_ask_qty), remaining_qty)
+
+                # 按交易规则量化价格和数量
+                filters = EXCHANGE_INFO.symbols.get(symbol)
+                if filters is not None:
+                    order_price = filters.quantize_price(order_price, "SELL")
+                    order_qty = filters.quantize_qty(order_qty)
+                    if filters.min_qty is not None and order_qty < filters.min_qty:
+                        order_qty = min(filters.min_qty, filters.quantize_qty(remaining_qty))
+                    if filters.min_qty is not None and order_qty < filters.min_qty:
+                        print(f"[{symbol}] 剩余数量{remaining_qty}低于最小下单量{filters.min_qty}, 停止")
+                        break
+                    error = filters.validate(order_price, order_qty)
+                    if error:
+                        raise ValueError(f"挂单不符合交易规则: {error}")
+                client_order_id = manager.new_order(order_qty, order_price)
+                order_id = await self.send_limit_order(symbol, "SELL", order_qty, order_price, client_order_id,
+                                                       best_bid_price, best_ask_price)
+                if order_id == ORDER_UNKNOWN:
+                    # 保持订单未结束, 下一轮开始前对账
+                    raise ValueError("下单结果未确认")
+                if not order_id:
+                    manager.update(client_order_id, "REJECTED", 0)
+                    if self.gate is not None and self.gate.halt_reason() is not None:
+                        continue
+                    raise ValueError("下单失败")
+                manager.bind(client_order_id, order_id)
+                failures = 0
+                await self.monitor_order(manager, client_order_id, order_id)
+            except (aiohttp.ClientError, asyncio.TimeoutError, json.JSONDecodeError, ValueError) as e:
+                self.stats.errors += 1
+                delay = retry_delay(failures)
+                failures += 1
+                print(f"[{symbol}] {e}, 等待{delay}秒后重试...")
+                await asyncio.sleep(delay)
+        print(f"[{symbol}] 完成! 总成交数量: {manager.executed_qty}")
+
+    async def run(self, jobs):
+        """并发执行所有任务"""
+        connector = aiohttp.TCPConnector(limit=self.pool_size)
+        async with aiohttp.ClientSession(connector=connector) as session:
+            self.session = session
+            self.stats = EngineStats()
+            await asyncio.gather(*(self.run_job(*job) for job in jobs))
+        self.stats.report()
+        print(f"限速器统计: {self.limiter.stats()}")
+
+
+def load_jobs(path):
+    """读取任务CSV: symbol,quantity,discount"""
+    with open(path, newline='') as f:
+        return [
+            (row['symbol'], to_decimal(row['quantity']), float(row.get('discount') or 5.0))
+            for row in csv.DictReader(f)
+        ]
+
+
+def parse_job(text):
+    """解析 SYMBOL:QUANTITY[:DISCOUNT]"""
+    parts = text.split(':')
+    discount = float(parts[2]) if len(parts) > 2 else 5.0
+    return parts[0], to_decimal(parts[1]), discount
+
+
+def main():
+    parser = argparse.ArgumentParser(description='币安期权多合约并发贴卖一卖出')
+    parser.add_argument('--jobs', help='任务CSV文件 (symbol,quantity,discount)')
+    parser.add_argument('--job', action='append', default=[], help='单个任务 SYMBOL:QUANTITY[:DISCOUNT], 可重复')
+    parser.add_argument('--pool-size', type=int, default=DEFAULT_POOL_SIZE, help=f'连接池大小 (默认: {DEFAULT_POOL_SIZE})')
+    parser.add_argument('--base-url', default=BASE_URL, help='REST地址 (默认: 币安期权)')
+    parser.add_argument('--risk-config', help='下单前风控限额 (JSON, 见 risk_gate.py), 不指定时只做价格带检查')
+    parser.add_argument('--kill-switch', default='KILL_SWITCH', help='停止开关文件, 存在时拒绝所有新订单 (默认: KILL_SWITCH)')
+    args = parser.parse_args()
+
+    jobs = [parse_job(text) for text in args.job]
+    if args.jobs:
+        jobs.extend(load_jobs(args.jobs))
+    if not jobs:
+        print("请通过 --jobs 或 --job 指定至少一个任务")
+        return
+    try:
+        limits = load_limits(args.risk_config)
+    except (OSError, json.JSONDecodeError) as e:
+        print(f"读取风控限额失败: {e}")
+        return
+
+    print(f"开始并发执行 {len(jobs)} 个卖出任务")
+    configure_endpoints(args.base_url)
+    TIME_SYNC.start()
+    EXCHANGE_INFO.load()
+    gate = RiskGate(limits, RiskBook(), args.kill_switch)
+    gate.start(args.base_url, symbols=[job[0] for job in jobs])
+    engine = AsyncEngine(base_url=args.base_url, pool_size=args.pool_size, gate=gate)
+    asyncio.run(engine.run(jobs))
+    gate.stop()
+    if gate.rejects:
+        print(f"风控拒单: {gate.rejects}")
+
+
+if __name__ == "__main__":
+    main()
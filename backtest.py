@@ -0,0 +1,321 @@
+# 回测/回放 - 用 depth_recorder.py 记录的深度和成交数据离线评估 market_trade.py 的卖出逻辑
+# 挂单价格 (卖一减折扣, 不高于买一时挂卖一) 直接复用 market_trade.calculate_order_price,
+# 每轮数量 = min(卖一数量, 剩余数量), 追单模式在挂单被更低卖价压住时撤单重挂, 与实盘循环一致
+# 模拟撮合: 挂单生效有延迟, 挂在已有价位时排在该价位已有数量之后, 买方主动成交先消耗排在前面的数量
+# 成交数据是 depth_recorder.py 记录的逐笔成交 (taker_trades), 大宗交易是场外协商的, 不与挂单撮合, 不参与回放
+# 完全离线, 同样的数据和参数结果完全一致; 多组参数用 multiprocessing 并行
+# python backtest.py --data data --symbol ETH-250728-3600-C --quantity 1,5 --discount 0.5,1,2,5 --chase 0,1
+import argparse
+import csv
+import itertools
+import math
+import multiprocessing
+import os
+
+from depth_recorder import from_fixed, load_chunks
+from local_orderbook import BookSide
+from market_trade import calculate_order_price
+
+# 事件类型
+DEPTH_EVENT = 0
+TRADE_EVENT = 1
+
+# 成交模型: depth = 卖一档数量减少视为主动买入 (偏乐观, 撤单也会被算作成交)
+#           trades = 只用逐笔成交中的主动买单和买一穿价 (偏保守, 需要记录了 taker_trades)
+FILL_MODELS = ("depth", "trades")
+
+# depth_recorder.py 中逐笔成交的目录, side: 1=主动买, -1=主动卖
+TRADES_KIND = "taker_trades"
+
+# 每个工作进程加载一次的事件序列
+_EVENTS = None
+
+RESULT_FIELDS = [
+    "quantity", "discount", "chase", "latency_ms", "requote_interval_ms", "max_requotes",
+    "executed_qty", "fill_rate", "orders", "requotes", "time_to_complete_s",
+    "avg_price", "arrival_bid", "arrival_ask", "slippage_vs_mid_bps", "premium_vs_bid_bps",
+]
+
+
+def build_events(depth, trades):
+    """把按列存储的深度和成交数据合并成按时间排序的事件列表
+
+    深度: (ts, DEPTH_EVENT, (是否快照, [(side, price, qty), ...])), 同一时间戳和更新ID的行合并为一个事件
+    成交: (ts, TRADE_EVENT, (side, price, qty))
+    """
+    events = []
+    depth_prices = from_fixed(depth["price"]).tolist()
+    depth_qtys = from_fixed(depth["qty"]).tolist()
+    depth_ts = depth["ts"].tolist()
+    update_ids = depth["update_id"].tolist()
+    sides = depth["side"].tolist()
+    snapshots = depth["snapshot"].tolist()
+
+    key = None
+    rows = None
+    for i in range(len(depth_ts)):
+        row_key = (depth_ts[i], update_ids[i], snapshots[i])
+        if row_key != key:
+            key = row_key
+            rows = []
+            events.append((depth_ts[i], DEPTH_EVENT, (snapshots[i] == 1, rows)))
+        rows.append((sides[i], depth_prices[i], depth_qtys[i]))
+
+    trade_prices = from_fixed(trades["price"]).tolist()
+    trade_qtys = from_fixed(trades["qty"]).tolist()
+    for ts, side, price, qty in zip(trades["ts"].tolist(), trades["side"].tolist(), trade_prices, trade_qtys):
+        events.append((ts, TRADE_EVENT, (side, price, qty)))
+
+    # 稳定排序: 同一毫秒内深度事件排在成交之前, 保持记录顺序
+    events.sort(key=lambda event: (event[0], event[1]))
+    return events
+
+
+def load_events(root, symbol, start_ms=None, end_ms=None):
+    depth = load_chunks(root, "depth", symbol, start_ms, end_ms)
+    trades = load_chunks(root, TRADES_KIND, symbol, start_ms, end_ms)
+    return build_events(depth, trades)
+
+
+def quantize(value, step, rounding):
+    """浮点版本的 tickSize/stepSize 对齐, 回测热路径上不用 Decimal"""
+    if not step:
+        return value
+    # 容差避免 0.3 / 0.1 = 2.9999999999999996 这类误差被取整到错误的一格
+    units = value / step
+    units = math.ceil(units - 1e-9) if rounding == "up" else math.floor(units + 1e-9)
+    return round(units * step, 10)
+
+
+def simulate(events, quantity, discount, chase=False, latency_ms=100, requote_interval_ms=1000,
+             max_requotes=20, tick_size=None, step_size=None, min_qty=None, fill_model="depth"):
+    """按 market_trade.py 的卖出循环回放一组参数, 返回结果字典"""
+    bids = BookSide(descending=True)
+    asks = BookSide(descending=False)
+    remaining = quantity
+    executed = 0.0
+    notional = 0.0
+    orders = 0
+    requotes = 0
+    start_ts = None
+    complete_ts = None
+    arrival = None
+    # 当前挂单: price, qty, filled, queue(排在前面的数量), live_at(生效时间), active
+    order = None
+    next_decision = None
+
+    def fill(amount, price, ts):
+        nonlocal executed, notional, remaining, order, next_decision, complete_ts
+        amount = min(amount, order["qty"] - order["filled"])
+        if amount <= 0:
+            return 0.0
+        order["filled"] += amount
+        executed += amount
+        remaining -= amount
+        notional += amount * price
+        if order["qty"] - order["filled"] <= 1e-12:
+            order = None
+            # 下一轮下单前需要一次状态确认和下单往返
+            next_decision = ts + latency_ms
+            if remaining <= 1e-12:
+                complete_ts = ts
+        return amount
+
+    for ts, kind, data in events:
+        if complete_ts is not None:
+            break
+
+        if kind == DEPTH_EVENT:
+            snapshot, rows = data
+            if snapshot:
+                bids.clear()
+                asks.clear()
+            for side, price, qty in rows:
+                book = bids if side == 0 else asks
+                if (fill_model == "depth" and not snapshot and order is not None and order["active"]
+                        and side == 1 and asks.prices and price == asks.prices[0] and price >= order["price"]):
+                    # 卖一档数量减少: 视为主动买入, 先成交价格更低的模拟挂单, 同价位时先消耗排在前面的数量
+                    consumed = book.levels.get(price, 0.0) - qty
+                    if consumed > 0:
+                        if price == order["price"]:
+                            ahead = min(order["queue"], consumed)
+                            order["queue"] -= ahead
+                            consumed -= ahead
+                        fill(consumed, order["price"], ts)
+                book.update(price, qty)
+            # 买一穿过挂单价: 按挂单价全部成交
+            if order is not None and order["active"] and bids.prices and bids.prices[-1] >= order["price"]:
+                fill(order["qty"], order["price"], ts)
+        elif fill_model == "trades":
+            # 只有主动买单会和我们的卖单撮合; 主动卖单是打买一, 与卖方挂单无关
+            side, price, qty = data
+            if side > 0 and order is not None and order["active"] and price >= order["price"]:
+                if price == order["price"]:
+                    ahead = min(order["queue"], qty)
+                    order["queue"] -= ahead
+                    qty -= ahead
+                fill(qty, order["price"], ts)
+
+        if complete_ts is not None or not bids.prices or not asks.prices:
+            continue
+        best_bid_price = bids.prices[-1]
+        best_ask_price, best_ask_qty = asks.prices[0], asks.levels[asks.prices[0]]
+
+        # 挂单生效: 挂在已有价位时排在该价位已有数量之后
+        if order is not None and not order["active"] and ts >= order["live_at"]:
+            order["active"] = True
+            order["queue"] = asks.levels.get(order["price"], 0.0)
+
+        # 追单: 挂单已不是卖一时撤单, 撤单往返后按最新盘口重挂
+        if (chase and order is not None and order["active"] and requotes < max_requotes
+                and ts - order["live_at"] >= requote_interval_ms and best_ask_price < order["price"]):
+            requotes += 1
+            order = None
+            next_decision = ts + latency_ms
+            continue
+
+        if order is not None or remaining <= 1e-12:
+            continue
+        if next_decision is not None and ts < next_decision:
+            continue
+
+        if arrival is None:
+            start_ts = ts
+            arrival = (best_bid_price, best_ask_price)
+
+        # 与 market_trade.py 相同的定价和数量规则
+        order_price = quantize(calculate_order_price(best_bid_price, best_ask_price, discount), tick_size, "up")
+        order_qty = quantize(min(best_ask_qty, remaining), step_size, "down")
+        if min_qty is not None and order_qty < min_qty:
+            order_qty = min(min_qty, quantize(remaining, step_size, "down"))
+        if min_qty is not None and order_qty < min_qty:
+            break
+        if order_qty <= 0:
+            continue
+
+        orders += 1
+        order = {
+            "price": order_price, "qty": order_qty, "filled": 0.0, "queue": 0.0,
+            "live_at": ts + latency_ms, "active": False,
+        }
+
+    avg_price = notional / executed if executed else None
+    result = {
+        "quantity": quantity,
+        "discount": discount,
+        "chase": int(chase),
+        "latency_ms": latency_ms,
+        "requote_interval_ms": requote_interval_ms,
+        "max_requotes": max_requotes,
+        "executed_qty": round(executed, 10),
+        "fill_rate": round(executed / quantity, 6) if quantity else None,
+        "orders": orders,
+        "requotes": requotes,
+        "time_to_complete_s": (complete_ts - start_ts) / 1000 if complete_ts is not None else None,
+        "avg_price": avg_price,
+        "arrival_bid": arrival[0] if arrival else None,
+        "arrival_ask": arrival[1] if arrival else None,
+        "slippage_vs_mid_bps": None,
+        "premium_vs_bid_bps": None,
+    }
+    if avg_price is not None:
+        arrival_mid = (arrival[0] + arrival[1]) / 2
+        # 卖出: 成交均价低于到达时中间价的部分为滑点 (正数表示更差)
+        result["slippage_vs_mid_bps"] = round((arrival_mid - avg_price) / arrival_mid * 1e4, 3)
+        # 相对直接砸买一多卖出的部分
+        result["premium_vs_bid_bps"] = round((avg_price - arrival[0]) / arrival[0] * 1e4, 3)
+    return result
+
+
+def _init_worker(root, symbol, start_ms, end_ms):
+    global _EVENTS
+    _EVENTS = load_events(root, symbol, start_ms, end_ms)
+
+
+def _run_params(params):
+    return simulate(_EVENTS, **params)
+
+
+def parameter_grid(quantities, discounts, chase_modes, latencies, requote_intervals,
+                   max_requotes=20, tick_size=None, step_size=None, min_qty=None, fill_model="depth"):
+    """参数组合列表, 顺序固定"""
+    return [
+        {
+            "quantity": quantity, "discount": discount, "chase": chase, "latency_ms": latency,
+            "requote_interval_ms": interval, "max_requotes": max_requotes, "tick_size": tick_size,
+            "step_size": step_size, "min_qty": min_qty, "fill_model": fill_model,
+        }
+        for quantity, discount, chase, latency, interval in itertools.product(
+            quantities, discounts, chase_modes, latencies, requote_intervals)
+    ]
+
+
+def run_grid(root, symbol, grid, start_ms=None, end_ms=None, workers=None):
+    """并行回放所有参数组合, 结果与grid顺序一致"""
+    if workers == 1:
+        _init_worker(root, symbol, start_ms, end_ms)
+        return [_run_params(params) for params in grid]
+    with multiprocessing.Pool(workers, initializer=_init_worker, initargs=(root, symbol, start_ms, end_ms)) as pool:
+        return pool.map(_run_params, grid, chunksize=max(1, len(grid) // ((workers or os.cpu_count() or 1) * 4)))
+
+
+def parse_list(text, cast=float):
+    return [cast(item) for item in text.split(',') if item.strip()]
+
+
+def main():
+    parser = argparse.ArgumentParser(description='market_trade 卖出逻辑离线回测')
+    parser.add_argument('--data', default='data', help='depth_recorder.py 输出目录 (默认: data)')
+    parser.add_argument('--symbol', required=True, help='期权交易对，例如: ETH-250728-3600-C')
+    parser.add_argument('--start', type=int, help='起始时间 (毫秒时间戳)')
+    parser.add_argument('--end', type=int, help='结束时间 (毫秒时间戳)')
+    parser.add_argument('--quantity', default='1', help='逗号分隔的总卖出数量 (默认: 1)')
+    parser.add_argument('--discount', default='5', help='逗号分隔的折扣 (默认: 5)')
+    parser.add_argument('--chase', default='0', help='逗号分隔的追单开关 0/1 (默认: 0)')
+    parser.add_argument('--latency-ms', default='100', help='逗号分隔的下单/撤单往返延迟毫秒 (默认: 100)')
+    parser.add_argument('--requote-interval-ms', default='1000', help='逗号分隔的追单最小重挂间隔毫秒 (默认: 1000)')
+    parser.add_argument('--max-requotes', type=int, default=20, help='追单最多重挂次数 (默认: 20)')
+    parser.add_argument('--tick-size', type=float, help='价格精度, 不填则不量化')
+    parser.add_argument('--step-size', type=float, help='数量精度, 不填则不量化')
+    parser.add_argument('--min-qty', type=float, help='最小下单量')
+    parser.add_argument('--fill-model', choices=FILL_MODELS, default='depth', help='成交模型 (默认: depth)')
+    parser.add_argument('--workers', type=int, help='进程数 (默认: CPU核数)')
+    parser.add_argument('--out', help='结果CSV路径')
+    parser.add_argument('--top', type=int, default=10, help='打印成交率/滑点最优的前N组 (默认: 10)')
+    args = parser.parse_args()
+
+    if args.fill_model == "trades" and not os.path.isdir(os.path.join(args.data, TRADES_KIND, args.symbol)):
+        print(f"没有逐笔成交数据 ({os.path.join(args.data, TRADES_KIND, args.symbol)}), "
+              f"trades 成交模型需要用新版 depth_recorder.py 记录")
+        return
+
+    grid = parameter_grid(
+        parse_list(args.quantity), parse_list(args.discount), [bool(int(x)) for x in parse_list(args.chase, int)],
+        parse_list(args.latency_ms, int), parse_list(args.requote_interval_ms, int),
+        max_requotes=args.max_requotes, tick_size=args.tick_size, step_size=args.step_size,
+        min_qty=args.min_qty, fill_model=args.fill_model,
+    )
+    print(f"回测 {args.symbol}: {len(grid)} 组参数")
+    results = run_grid(args.data, args.symbol, grid, args.start, args.end, args.workers)
+
+    if args.out:
+        with open(args.out, 'w', newline='') as f:
+            writer = csv.DictWriter(f, fieldnames=RESULT_FIELDS)
+            writer.writeheader()
+            writer.writerows(results)
+        print(f"结果已写入: {args.out}")
+
+    # 成交率高优先, 其次滑点小
+    ranked = sorted(results, key=lambda r: (-r["fill_rate"],
+                                            r["slippage_vs_mid_bps"] if r["slippage_vs_mid_bps"] is not None else math.inf))
+    print(f"{'数量':>8} {'折扣':>8} {'追单':>4} {'延迟ms':>6} {'成交率':>8} {'订单':>5} {'完成秒':>8} {'均价':>10} {'滑点bps':>9}")
+    for r in ranked[:args.top]:
+        done = f"{r['time_to_complete_s']:.1f}" if r['time_to_complete_s'] is not None else "-"
+        avg = f"{r['avg_price']:.4f}" if r['avg_price'] is not None else "-"
+        slip = f"{r['slippage_vs_mid_bps']:.1f}" if r['slippage_vs_mid_bps'] is not None else "-"
+        print(f"{r['quantity']:>8} {r['discount']:>8} {r['chase']:>4} {r['latency_ms']:>6} {r['fill_rate']:>8.2%} "
+              f"{r['orders']:>5} {done:>8} {avg:>10} {slip:>9}")
+
+
+if __name__ == "__main__":
+    main()
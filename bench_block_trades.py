@@ -0,0 +1,96 @@
+# 大宗交易汇总开销基准 - 模拟多轮轮询 (每轮每个合约返回最近100笔, 大部分是上一轮见过的)
+# 对比: 每轮把所有原始成交存下来再按窗口全量重算汇总 / BlockTradeIngest 去重后增量更新滚动累加和
+# python bench_block_trades.py --symbols 50 --rounds 200
+import argparse
+import random
+import time
+
+from block_trades import POLL_LIMIT, BlockTradeIngest, expiry_of
+
+EXPIRIES = ("ETH-250725", "ETH-250801", "ETH-250829")
+
+
+def make_rounds(symbols, rounds, new_per_round, seed):
+    """每轮每个合约的接口返回: 最近 POLL_LIMIT 笔, 其中 new_per_round 笔是新的"""
+    rng = random.Random(seed)
+    history = {symbol: [] for symbol in symbols}
+    next_id = 1
+    now = 1753000000000
+    result = []
+    for _ in range(rounds):
+        now += 10000
+        batch = {}
+        for symbol in symbols:
+            for _ in range(new_per_round):
+                history[symbol].append({"id": next_id, "symbol": symbol, "price": str(round(rng.uniform(50, 150), 1)),
+                                        "qty": str(round(rng.uniform(0.1, 20), 2)), "side": rng.choice((1, -1)),
+                                        "time": now - rng.randint(0, 9999)})
+                next_id += 1
+            batch[symbol] = history[symbol][-POLL_LIMIT:]
+        result.append((now, batch))
+    return result
+
+
+def naive(rounds, window_ms):
+    """对照组: 按ID存全部原始成交, 每轮对每个合约和到期日按窗口重新汇总"""
+    seen = {}
+    for now, batch in rounds:
+        for symbol, trades in batch.items():
+            for trade in trades:
+                seen[(symbol, trade['id'])] = trade
+        by_key = {}
+        for (symbol, _), trade in seen.items():
+            if int(trade['time']) > now - window_ms:
+                by_key.setdefault(symbol, []).append(trade)
+                by_key.setdefault(expiry_of(symbol), []).append(trade)
+        summary = {}
+        for key, trades in by_key.items():
+            volume = sum(float(t['qty']) for t in trades)
+            notional = sum(float(t['qty']) * float(t['price']) for t in trades)
+            buy = sum(float(t['qty']) for t in trades if t['side'] > 0)
+            summary[key] = (len(trades), volume, notional / volume, (2 * buy - volume) / volume)
+    return summary
+
+
+def main():
+    parser = argparse.ArgumentParser(description='大宗交易增量汇总开销基准')
+    parser.add_argument('--symbols', type=int, default=50, help='合约数 (默认: 50)')
+    parser.add_argument('--rounds', type=int, default=200, help='轮询轮数 (默认: 200)')
+    parser.add_argument('--new', type=int, default=5, help='每轮每个合约的新成交数 (默认: 5)')
+    parser.add_argument('--window', type=int, default=600, help='统计窗口秒数 (默认: 600)')
+    parser.add_argument('--seed', type=int, default=1, help='随机种子 (默认: 1)')
+    args = parser.parse_args()
+
+    symbols = [f"{EXPIRIES[i % len(EXPIRIES)]}-{3000 + 50 * i}-{'C' if i % 2 else 'P'}" for i in range(args.symbols)]
+    rounds = make_rounds(symbols, args.rounds, args.new, args.seed)
+    received = sum(len(trades) for _, batch in rounds for trades in batch.values())
+
+    start = time.perf_counter()
+    expected = naive(rounds, args.window * 1000)
+    naive_time = time.perf_counter() - start
+
+    ingest = BlockTradeIngest(symbols, window=args.window)
+    start = time.perf_counter()
+    for now, batch in rounds:
+        for symbol, trades in batch.items():
+            ingest.ingest(symbol, trades)
+        summary = ingest.summary(now)
+    ingest_time = time.perf_counter() - start
+
+    # 校验: 两种方式在最后一轮的结果一致
+    mismatches = 0
+    for key, (count, volume, vwap, imbalance) in expected.items():
+        row = summary["symbols"].get(key) or summary["expiries"].get(key)
+        if (row["trades"] != count or abs(row["volume"] - volume) > 1e-6 * volume
+                or abs(row["vwap"] - vwap) > 1e-6 * vwap or abs(row["imbalance"] - imbalance) > 1e-6):
+            mismatches += 1
+
+    print(f"合约: {args.symbols}, 轮数: {args.rounds}, 收到成交: {received}, 去重后: {ingest.ingested}")
+    print(f"全量重算:   共 {naive_time:8.3f} 秒, 每轮 {naive_time / args.rounds * 1000:8.2f} ms")
+    print(f"增量汇总:   共 {ingest_time:8.3f} 秒, 每轮 {ingest_time / args.rounds * 1000:8.2f} ms, "
+          f"每笔收到的成交 {ingest_time / received * 1e6:.2f} µs")
+    print(f"最后一轮汇总不一致: {mismatches} / {len(expected)}")
+
+
+if __name__ == "__main__":
+    main()
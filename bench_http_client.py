@@ -0,0 +1,85 @@
+# HTTP连接复用微基准 - 对比每次新建连接与共享连接池的请求延迟
+# 在本地启动一个keep-alive的HTTP桩服务器, 不访问币安; 直接使用共享Session, 不经过限速器
+# python bench_http_client.py --requests 500
+import requests
+import argparse
+import json
+import statistics
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import http_client
+
+# 模拟 /eapi/v1/depth 的返回
+STUB_BODY = json.dumps({
+    "bids": [["100.0", "1.0"]],
+    "asks": [["101.0", "1.0"]],
+    "T": 0,
+    "u": 1
+}).encode('utf-8')
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    """支持HTTP/1.1 keep-alive的桩接口"""
+    protocol_version = "HTTP/1.1"
+    # 头和body分两次写, 不关Nagle会叠加40ms延迟确认
+    disable_nagle_algorithm = True
+
+    def do_GET(self):
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(STUB_BODY)))
+        self.end_headers()
+        self.wfile.write(STUB_BODY)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_stub_server():
+    """在随机端口启动桩服务器, 返回 (server, base_url)"""
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StubHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}"
+
+
+def measure(send, url, count):
+    """发送count次请求, 返回每次延迟(毫秒)"""
+    latencies = []
+    for _ in range(count):
+        start = time.perf_counter()
+        response = send(url)
+        response.content
+        latencies.append((time.perf_counter() - start) * 1000)
+    return latencies
+
+
+def report(name, latencies):
+    latencies = sorted(latencies)
+    p50 = statistics.median(latencies)
+    p99 = latencies[int(len(latencies) * 0.99) - 1]
+    print(f"{name:<12} 平均: {statistics.mean(latencies):7.3f} ms | p50: {p50:7.3f} ms | p99: {p99:7.3f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='HTTP连接复用微基准')
+    parser.add_argument('--requests', type=int, default=500, help='每种方式的请求次数 (默认: 500)')
+    args = parser.parse_args()
+
+    server, base_url = start_stub_server()
+    url = base_url + "/eapi/v1/depth"
+
+    # 预热
+    measure(requests.get, url, 10)
+    measure(http_client.get_session().get, url, 10)
+
+    print(f"本地桩服务器: {base_url}, 每种方式 {args.requests} 次请求")
+    report("新建连接", measure(requests.get, url, args.requests))
+    report("连接池复用", measure(http_client.get_session().get, url, args.requests))
+
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
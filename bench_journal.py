@@ -0,0 +1,80 @@
+# 执行日志写入开销基准 - 下单循环里每个订单 (登记/提交/成交) 的日志耗时
+# 对比: 不写日志 / Journal 入队 + 后台攒批提交 / 每条事件同步写入并提交 (每条一次fsync)
+# python bench_journal.py --orders 20000
+import argparse
+import os
+import sqlite3
+import tempfile
+import time
+
+from journal import INSERT_EVENT, Journal, connect
+from order_manager import OrderManager
+
+SYMBOL = "ETH-250728-3600-C"
+
+
+def run_orders(manager, count):
+    """模拟卖出循环对订单管理器的调用: 登记、绑定orderId、部分成交、完全成交"""
+    start = time.perf_counter()
+    for i in range(count):
+        client_order_id = manager.new_order("0.5", "120.5")
+        manager.bind(client_order_id, 4700000000 + i)
+        manager.update(client_order_id, "PARTIALLY_FILLED", "0.2")
+        manager.update(client_order_id, "FILLED", "0.5")
+    return (time.perf_counter() - start) / count
+
+
+class SyncJournal:
+    """对照组: 每条事件在调用线程里写入并提交"""
+
+    def __init__(self, path):
+        self._conn = connect(path)
+
+    def record(self, job_id, kind, client_order_id, order_id=None, quantity=None, price=None,
+               status=None, executed_qty=None):
+        with self._conn:
+            self._conn.execute(INSERT_EVENT, (
+                job_id, time.time(), kind, client_order_id, None if order_id is None else str(order_id),
+                None if quantity is None else str(quantity), None if price is None else str(price),
+                status, None if executed_qty is None else str(executed_qty)))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='执行日志写入开销基准')
+    parser.add_argument('--orders', type=int, default=20000, help='模拟订单数, 每单4条事件 (默认: 20000)')
+    parser.add_argument('--sync-orders', type=int, default=500, help='同步写入对照组的订单数 (默认: 500)')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        baseline = run_orders(OrderManager(SYMBOL, "SELL", 10 ** 9), args.orders)
+
+        journal = Journal(os.path.join(directory, "journal.db"))
+        manager = OrderManager(SYMBOL, "SELL", 10 ** 9, journal=journal)
+        journal.start_job(manager.job_id, SYMBOL, "SELL", manager.total_qty)
+        start = time.perf_counter()
+        per_order = run_orders(manager, args.orders)
+        journal.flush(timeout=60)
+        drained = time.perf_counter() - start
+        journal.close()
+        stats = journal.stats()
+
+        sync = SyncJournal(os.path.join(directory, "sync.db"))
+        sync_per_order = run_orders(OrderManager(SYMBOL, "SELL", 10 ** 9, journal=sync), args.sync_orders)
+
+        # 回放校验: 日志里的事件能完整恢复订单状态
+        restored = OrderManager(SYMBOL, "SELL", manager.total_qty, job_id=manager.job_id)
+        restored.restore(journal.events(manager.job_id))
+        with sqlite3.connect(os.path.join(directory, "journal.db")) as conn:
+            events = conn.execute("SELECT count(*) FROM events").fetchone()[0]
+
+    print(f"订单: {args.orders}, 每单4条事件")
+    print(f"不写日志:           每单 {baseline * 1e6:8.2f} µs")
+    print(f"入队 + 后台攒批:    每单 {per_order * 1e6:8.2f} µs (日志开销 {(per_order - baseline) * 1e6:.2f} µs)")
+    print(f"同步写入每条提交:   每单 {sync_per_order * 1e6:8.2f} µs ({args.sync_orders}单)")
+    print(f"后台写入: {stats['batches']} 批, 平均每批 {stats['avg_batch']} 条, 每批提交 {stats['avg_commit_ms']} ms, "
+          f"全部落盘耗时 {drained:.2f} 秒")
+    print(f"日志事件: {events} 条, 回放后成交 {restored.executed_qty} (应为 {manager.executed_qty})")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,146 @@
+# 模拟交易所下单吞吐基准 - 在子进程启动 mock_exchange, 用并发 aiohttp 客户端和共享连接池两种方式压测下单/撤单
+# 每笔下单都签名 (同 market_trade 的 RequestSigner), 统计每秒订单数和延迟分布; --min-rate 低于阈值时返回非零, 可放进CI捕捉吞吐回退
+# python bench_mock_exchange.py --orders 5000 --concurrency 64
+# python bench_mock_exchange.py --orders 5000 --min-rate 1000
+import argparse
+import asyncio
+import concurrent.futures
+import socket
+import statistics
+import subprocess
+import sys
+import time
+
+import aiohttp
+
+import http_client
+from mock_exchange import default_symbols
+from signer import RequestSigner
+
+ORDER_ENDPOINT = '/eapi/v1/order'
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def start_exchange(port, latency_ms):
+    """子进程启动模拟交易所 (关闭后台行情, 只测请求处理), 等到端口可连"""
+    process = subprocess.Popen(
+        [sys.executable, "mock_exchange.py", "--port", str(port), "--flow-interval", "0",
+         "--latency-ms", str(latency_ms), "--seed", "1"],
+        stdout=subprocess.DEVNULL)
+    deadline = time.time() + 10
+    while time.time() < deadline:
+        try:
+            socket.create_connection(("127.0.0.1", port), timeout=0.2).close()
+            return process
+        except OSError:
+            time.sleep(0.05)
+    process.kill()
+    raise RuntimeError("模拟交易所启动失败")
+
+
+def order_params(symbol, index):
+    """买卖交替挂在盘口外, 不撮合, 订单簿持续增长 (最坏情况)"""
+    side = "BUY" if index % 2 == 0 else "SELL"
+    return {
+        "symbol": symbol,
+        "side": side,
+        "type": "LIMIT",
+        "quantity": "0.1",
+        "price": "0.1" if side == "BUY" else "99999",
+        "timeInForce": "GTC",
+        "clientOrderId": f"bench-{index}",
+    }
+
+
+async def run_async(base_url, symbol, count, concurrency, signer, offset):
+    """aiohttp 并发压测 (同 async_engine 的方式), 返回 (耗时秒, 延迟列表, 失败数)"""
+    latencies = []
+    failures = 0
+    queue = asyncio.Queue()
+    for index in range(count):
+        queue.put_nowait(offset + index)
+
+    async def worker(session):
+        nonlocal failures
+        while not queue.empty():
+            index = queue.get_nowait()
+            url = signer.signed_url(base_url, ORDER_ENDPOINT, order_params(symbol, index))
+            start = time.perf_counter()
+            async with session.post(url, headers=signer.headers) as response:
+                await response.read()
+                if response.status != 200:
+                    failures += 1
+            latencies.append((time.perf_counter() - start) * 1000)
+
+    connector = aiohttp.TCPConnector(limit=concurrency)
+    async with aiohttp.ClientSession(connector=connector) as session:
+        start = time.perf_counter()
+        await asyncio.gather(*(worker(session) for _ in range(concurrency)))
+        elapsed = time.perf_counter() - start
+    return elapsed, latencies, failures
+
+
+def run_threads(base_url, symbol, count, threads, signer, offset):
+    """共享连接池 + 线程池 (同 market_trade/trade_daemon 的同步路径), 不经过限速器"""
+    session = http_client.get_session()
+
+    def send(index):
+        url = signer.signed_url(base_url, ORDER_ENDPOINT, order_params(symbol, index))
+        start = time.perf_counter()
+        response = session.post(url, headers=signer.headers)
+        return (time.perf_counter() - start) * 1000, response.status_code == 200
+
+    start = time.perf_counter()
+    with concurrent.futures.ThreadPoolExecutor(threads) as pool:
+        results = list(pool.map(send, range(offset, offset + count)))
+    elapsed = time.perf_counter() - start
+    return elapsed, [ms for ms, _ in results], sum(1 for _, ok in results if not ok)
+
+
+def report(name, elapsed, latencies, failures):
+    latencies = sorted(latencies)
+    rate = len(latencies) / elapsed
+    p99 = latencies[max(0, int(len(latencies) * 0.99) - 1)]
+    print(f"{name:<14} {rate:9.0f} 单/秒 | p50: {statistics.median(latencies):7.2f} ms | "
+          f"p99: {p99:7.2f} ms | 失败: {failures}")
+    return rate
+
+
+def main():
+    parser = argparse.ArgumentParser(description='模拟交易所下单吞吐基准')
+    parser.add_argument('--orders', type=int, default=5000, help='每种方式的下单数 (默认: 5000)')
+    parser.add_argument('--concurrency', type=int, default=64, help='aiohttp 并发数 (默认: 64)')
+    parser.add_argument('--threads', type=int, default=16, help='同步路径线程数 (默认: 16)')
+    parser.add_argument('--latency-ms', type=float, default=0.0, help='模拟交易所注入的延迟毫秒 (默认: 0)')
+    parser.add_argument('--min-rate', type=float, help='aiohttp 方式每秒订单数低于该值时以状态1退出')
+    args = parser.parse_args()
+
+    port = free_port()
+    base_url = f"http://127.0.0.1:{port}"
+    process = start_exchange(port, args.latency_ms)
+    symbol = default_symbols()[0]
+    signer = RequestSigner("bench", "bench")
+    try:
+        # 预热: 建立连接、触发导入
+        asyncio.run(run_async(base_url, symbol, 200, 8, signer, offset=10 ** 8))
+        print(f"模拟交易所: {base_url}, 合约 {symbol}, 每种方式 {args.orders} 笔")
+        rate = report(f"aiohttp x{args.concurrency}",
+                      *asyncio.run(run_async(base_url, symbol, args.orders, args.concurrency, signer, offset=0)))
+        report(f"连接池 x{args.threads}",
+               *run_threads(base_url, symbol, args.orders, args.threads, signer, offset=args.orders))
+    finally:
+        process.terminate()
+        process.wait()
+
+    if args.min_rate and rate < args.min_rate:
+        print(f"吞吐 {rate:.0f} 单/秒 低于阈值 {args.min_rate:.0f}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
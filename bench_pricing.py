@@ -0,0 +1,94 @@
+# 定价性能基准 - 整条期权链 (默认5000个合约) 买卖价隐含波动率 + 希腊值的批量计算耗时
+# 对比逐个合约用 math 循环求解的写法
+# python bench_pricing.py --contracts 5000
+import argparse
+import math
+import time
+
+import numpy as np
+
+from pricing import bs_price, evaluate_chain
+
+SPOT = 3500.0
+NOW_MS = 1750000000000
+EXPIRIES = ["250704", "250711", "250725", "250829", "250926", "251226"]
+
+
+def make_chain(count, seed=0):
+    """生成测试期权链: 不同到期日和行权价的看涨/看跌, 买卖价由随机波动率定价"""
+    rng = np.random.default_rng(seed)
+    symbols = []
+    for i in range(count):
+        expiry = EXPIRIES[i % len(EXPIRIES)]
+        strike = int(SPOT * rng.uniform(0.6, 1.6) / 25) * 25
+        symbols.append(f"ETH-{expiry}-{strike}-{'C' if i % 2 == 0 else 'P'}")
+    from pricing import parse_symbols, year_fraction
+    strikes, expiries, is_call = parse_symbols(symbols)
+    vols = rng.uniform(0.4, 1.2, count)
+    mid = bs_price(SPOT, strikes, year_fraction(expiries, NOW_MS), vols, is_call)
+    spread = np.maximum(mid * 0.02, 0.1)
+    return symbols, mid - spread / 2, mid + spread / 2
+
+
+def scalar_iv(price, spot, strike, t, is_call):
+    """逐个合约的标量写法: 牛顿法 + 二分保护"""
+    def cdf(x):
+        return 0.5 * math.erfc(-x / math.sqrt(2.0))
+
+    def price_at(vol):
+        d1 = (math.log(spot / strike) + 0.5 * vol * vol * t) / (vol * math.sqrt(t))
+        d2 = d1 - vol * math.sqrt(t)
+        if is_call:
+            return spot * cdf(d1) - strike * cdf(d2), d1
+        return strike * cdf(-d2) - spot * cdf(-d1), d1
+
+    intrinsic = max(spot - strike, 0.0) if is_call else max(strike - spot, 0.0)
+    if t <= 0 or not intrinsic < price < (spot if is_call else strike):
+        return math.nan
+    lo, hi, vol = 1e-4, 10.0, 0.8
+    for _ in range(50):
+        value, d1 = price_at(vol)
+        diff = value - price
+        if abs(diff) < 1e-8 * max(price, 1.0):
+            break
+        if diff > 0:
+            hi = vol
+        else:
+            lo = vol
+        vega = spot * math.exp(-0.5 * d1 * d1) / math.sqrt(2 * math.pi) * math.sqrt(t)
+        step = vol - diff / vega if vega > 1e-12 else None
+        vol = step if step is not None and lo < step < hi else 0.5 * (lo + hi)
+    return vol
+
+
+def main():
+    parser = argparse.ArgumentParser(description='期权链定价性能基准')
+    parser.add_argument('--contracts', type=int, default=5000, help='合约数量 (默认: 5000)')
+    parser.add_argument('--repeat', type=int, default=20, help='批量计算重复次数 (默认: 20)')
+    args = parser.parse_args()
+
+    symbols, bids, asks = make_chain(args.contracts)
+    evaluate_chain(symbols, SPOT, bids, asks, NOW_MS)
+
+    start = time.perf_counter()
+    for _ in range(args.repeat):
+        result = evaluate_chain(symbols, SPOT, bids, asks, NOW_MS)
+    vectorized = (time.perf_counter() - start) / args.repeat
+    solved = int(np.count_nonzero(~np.isnan(result["bid_iv"])) + np.count_nonzero(~np.isnan(result["ask_iv"])))
+    print(f"向量化: {args.contracts}个合约 (买卖价共{solved}个IV + 希腊值) 每次 {vectorized * 1000:.2f} ms")
+
+    strikes, t, is_call = result["strike"], result["t"], result["is_call"]
+    start = time.perf_counter()
+    scalar = [scalar_iv(price, SPOT, strikes[i % len(strikes)], t[i % len(strikes)], is_call[i % len(strikes)])
+              for i, price in enumerate(np.concatenate([bids, asks]).tolist())]
+    looped = time.perf_counter() - start
+    print(f"逐个循环: 仅IV 每次 {looped * 1000:.2f} ms")
+    print(f"提升: {looped / vectorized:.1f}x")
+
+    # 两种写法结果必须一致
+    difference = np.nanmax(np.abs(np.array(scalar) - np.concatenate([result["bid_iv"], result["ask_iv"]])))
+    print(f"最大IV差异: {difference:.2e}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+# 持仓账本性能基准 - 数千个持仓、多个子账户下每笔成交的增量更新耗时, 以及标记价格刷新和风控查询耗时
+# 对比每次成交后全量重算汇总的写法, 并校验增量汇总与全量重算一致
+# python bench_risk_book.py --positions 5000 --fills 100000
+import argparse
+import time
+
+import numpy as np
+
+from bench_pricing import make_chain
+from pricing import greeks, parse_symbols, year_fraction
+from risk_book import GREEKS, RiskBook
+
+SPOT = 3500.0
+NOW_MS = 1750000000000
+ACCOUNTS = ["master@example.com", "sub1@example.com", "sub2@example.com", "sub3@example.com"]
+
+
+def make_marks(symbols, bids, asks):
+    """按中间价和固定波动率生成 /eapi/v1/mark 格式的标记价格和希腊值"""
+    strikes, expiries, is_call = parse_symbols(symbols)
+    values = greeks(SPOT, strikes, year_fraction(expiries, NOW_MS), 0.7, is_call)
+    mid = (bids + asks) / 2
+    return {
+        symbol: {"markPrice": str(mid[i]), **{name: str(values[name][i]) for name in GREEKS}}
+        for i, symbol in enumerate(symbols)
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='持仓账本性能基准')
+    parser.add_argument('--positions', type=int, default=5000, help='合约数量 (默认: 5000)')
+    parser.add_argument('--fills', type=int, default=100000, help='成交笔数 (默认: 100000)')
+    args = parser.parse_args()
+
+    symbols, bids, asks = make_chain(args.positions)
+    marks = make_marks(symbols, bids, asks)
+    rng = np.random.default_rng(1)
+    fills = list(zip(
+        rng.integers(0, len(symbols), args.fills).tolist(),
+        rng.integers(0, len(ACCOUNTS), args.fills).tolist(),
+        rng.choice(["BUY", "SELL"], args.fills).tolist(),
+        np.round(rng.uniform(0.01, 2.0, args.fills), 2).tolist(),
+        rng.uniform(1, 500, args.fills).tolist(),
+    ))
+
+    book = RiskBook()
+    book.update_marks(marks)
+    start = time.perf_counter()
+    for index, account, side, qty, price in fills:
+        book.on_fill(symbols[index], side, qty, price, ACCOUNTS[account])
+    per_fill = (time.perf_counter() - start) / args.fills
+    print(f"增量更新: {args.fills}笔成交, {book.size}行持仓, 每笔 {per_fill * 1e6:.2f} µs")
+
+    start = time.perf_counter()
+    for _ in range(1000):
+        book.exposure("ETH", ACCOUNTS[0])
+        book.position(symbols[0], ACCOUNTS[0])
+    print(f"风控查询 (标的希腊值 + 单合约持仓): 每次 {(time.perf_counter() - start) / 1000 * 1e6:.2f} µs")
+
+    start = time.perf_counter()
+    for _ in range(10):
+        book.unrealized_pnl()
+    print(f"未实现盈亏 (全部持仓): 每次 {(time.perf_counter() - start) / 10 * 1000:.3f} ms")
+
+    incremental = book.exposure("ETH")
+    start = time.perf_counter()
+    book.update_marks(marks)
+    refresh = time.perf_counter() - start
+    print(f"标记价格刷新 + 全量重算汇总: {refresh * 1000:.2f} ms")
+    print(f"若每笔成交都全量重算: 每笔约 {refresh * 1e6:.0f} µs, 增量更新快 {refresh / per_fill:.0f}x")
+
+    # 增量汇总必须与全量重算一致
+    rebuilt = book.exposure("ETH")
+    difference = max(abs(incremental[name] - rebuilt[name]) / max(abs(rebuilt[name]), 1.0) for name in GREEKS)
+    print(f"增量与全量汇总最大相对差异: {difference:.2e}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,106 @@
+# 下单前风控性能基准 - 开启全部检查项 (含单合约持仓查询) 时每笔订单的 check() 耗时
+# 对比不经过风控的空循环和每次都重新解析合约/合并限额的写法, 并列出典型胖手指订单的拒绝原因
+# python bench_risk_gate.py --positions 5000 --orders 200000
+import argparse
+import time
+
+import numpy as np
+
+from bench_pricing import SPOT, make_chain
+from bench_risk_book import make_marks
+from risk_book import RiskBook
+from risk_gate import RiskGate, load_limits
+
+LIMITS = {
+    "max_qty": 50,
+    "max_notional": 20000,
+    "max_symbol_notional": 100000,
+    "mark_band": 0.3,
+    "book_band": 0.05,
+    "daily_loss_cap": 1e9,
+}
+
+
+def make_orders(symbols, bids, asks, count, rng):
+    """贴近盘口的正常订单: 卖单挂卖一附近, 买单挂买一附近"""
+    index = rng.integers(0, len(symbols), count)
+    sides = rng.choice(["BUY", "SELL"], count)
+    qty = np.round(rng.uniform(0.01, 5.0, count), 2)
+    orders = []
+    for i, side, q in zip(index.tolist(), sides.tolist(), qty.tolist()):
+        bid, ask = float(bids[i]), float(asks[i])
+        price = ask if side == "SELL" else bid
+        orders.append((symbols[i], side, q, price, bid, ask))
+    return orders
+
+
+def main():
+    parser = argparse.ArgumentParser(description='下单前风控性能基准')
+    parser.add_argument('--positions', type=int, default=5000, help='生成的合约数量, 去重前 (默认: 5000)')
+    parser.add_argument('--orders', type=int, default=200000, help='检查的订单笔数 (默认: 200000)')
+    args = parser.parse_args()
+
+    symbols, bids, asks = make_chain(args.positions)
+    # 随机行权价会重复, 同名合约只保留最后一个 (与标记价格字典一致); 去掉买价不为正的深度虚值合约
+    last = {symbol: i for i, symbol in enumerate(symbols)}
+    keep = [i for i in sorted(last.values()) if bids[i] > 0]
+    symbols, bids, asks = [symbols[i] for i in keep], bids[keep], asks[keep]
+    marks = make_marks(symbols, bids, asks)
+    rng = np.random.default_rng(2)
+
+    # 持仓账本里已有每个合约的持仓, 单合约名义价值检查需要查询
+    book = RiskBook()
+    book.update_marks(marks)
+    for symbol, side, qty in zip(symbols, rng.choice(["BUY", "SELL"], len(symbols)).tolist(),
+                                 rng.uniform(0.1, 10, len(symbols)).tolist()):
+        book.on_fill(symbol, side, qty, 10.0)
+
+    gate = RiskGate(dict(load_limits(), **LIMITS), book, kill_switch_path='KILL_SWITCH.bench')
+    gate.update_marks(marks)
+    gate.update_spots({"ETH": SPOT})
+    gate.refresh_pnl()
+    gate.prepare(symbols)
+    orders = make_orders(symbols, bids, asks, args.orders, rng)
+
+    start = time.perf_counter()
+    for symbol, side, qty, price, bid, ask in orders:
+        pass
+    baseline = (time.perf_counter() - start) / args.orders
+
+    start = time.perf_counter()
+    for symbol, side, qty, price, bid, ask in orders:
+        gate.check(symbol, side, qty, price, bid, ask)
+    per_order = (time.perf_counter() - start) / args.orders - baseline
+
+    sample = orders[:20000]
+    start = time.perf_counter()
+    for symbol, side, qty, price, bid, ask in sample:
+        gate._symbols.clear()
+        gate.check(symbol, side, qty, price, bid, ask)
+    uncached = (time.perf_counter() - start) / len(sample) - baseline
+
+    rejected = sum(gate.rejects.values())
+    print(f"合约: {len(symbols)}, 持仓行: {book.size}, 订单: {args.orders}")
+    print(f"空循环 (不经过风控): 每笔 {baseline * 1e6:.3f} µs")
+    print(f"风控检查 (全部检查项, 限额预计算): 每笔 {per_order * 1e6:.2f} µs")
+    print(f"每次重新解析合约/合并限额: 每笔 {uncached * 1e6:.2f} µs, 预计算快 {uncached / per_order:.1f}x")
+    print(f"正常订单被拒: {rejected} 笔 {dict(gate.rejects)}")
+
+    # 典型胖手指订单
+    symbol, bid, ask = symbols[0], float(bids[0]), float(asks[0])
+    mark = gate.marks[symbol]
+    cases = [
+        ("数量多打一个0", (symbol, "SELL", 500, ask, bid, ask)),
+        ("价格多打一个0", (symbol, "BUY", 1, round(mark * 10, 1), bid, ask)),
+        ("卖价远低于买一", (symbol, "SELL", 1, round(bid * 0.8, 1), bid, ask)),
+        ("行情过期 (交叉盘口)", (symbol, "SELL", 1, ask, ask + 1, ask)),
+    ]
+    print("-" * 50)
+    for name, order in cases:
+        print(f"{name}: {gate.check(*order)}")
+    gate.kill("基准测试")
+    print(f"停止开关: {gate.check(symbol, 'SELL', 1, ask, bid, ask)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,64 @@
+# 签名性能基准 - 对比原 create_signature + urlencode 写法与共享签名器的每秒签名次数
+# python bench_signer.py --count 200000
+import argparse
+import hashlib
+import hmac
+import time
+import urllib.parse
+
+from signer import RequestSigner
+
+SECRET_KEY = "x" * 64
+API_KEY = "y" * 64
+
+# 与 send_limit_order 相同的下单参数
+ORDER_PARAMS = {
+    "symbol": "ETH-250728-3600-C",
+    "side": "SELL",
+    "type": "LIMIT",
+    "quantity": "0.1",
+    "price": "125.5",
+    "timeInForce": "GTC",
+}
+
+
+def legacy_sign(params, timestamp):
+    """原 market_trade.py 的写法: 每次 urlencode + hmac.new"""
+    params = dict(params, timestamp=timestamp)
+    query_string = urllib.parse.urlencode(params)
+    signature = hmac.new(
+        SECRET_KEY.encode('utf-8'),
+        query_string.encode('utf-8'),
+        hashlib.sha256
+    ).hexdigest()
+    return f"{query_string}&signature={signature}"
+
+
+def run(name, sign, count):
+    start = time.perf_counter()
+    for _ in range(count):
+        sign()
+    elapsed = time.perf_counter() - start
+    rate = count / elapsed
+    print(f"{name:<10} {rate:12,.0f} 次/秒 | 单次 {elapsed / count * 1e6:6.2f} us")
+    return rate
+
+
+def main():
+    parser = argparse.ArgumentParser(description='签名性能基准')
+    parser.add_argument('--count', type=int, default=200000, help='签名次数 (默认: 200000)')
+    args = parser.parse_args()
+
+    timestamp = int(time.time() * 1000)
+    signer = RequestSigner(API_KEY, SECRET_KEY, time_source=lambda: timestamp)
+
+    # 两种写法输出必须一致
+    assert legacy_sign(ORDER_PARAMS, timestamp) == signer.sign_params(ORDER_PARAMS)
+
+    legacy = run("原写法", lambda: legacy_sign(ORDER_PARAMS, timestamp), args.count)
+    fast = run("签名器", lambda: signer.sign_params(ORDER_PARAMS), args.count)
+    print(f"提升: {fast / legacy:.2f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,358 @@
+# 大宗交易增量采集与滚动统计 - 定期并发拉取多个合约的 /eapi/v1/blockTrades, 按成交ID去重后更新汇总
+# 去重: 有界的 LRU 集合 (OrderedDict), 只记住最近 DEDUP_CAPACITY 个成交ID, 长时间运行内存不增长
+# 汇总: 每个合约和每个到期日 (如 ETH-250728) 各一个滚动窗口, 维护成交笔数、数量、名义价值、主动买/卖数量的累加和,
+#       按时间顺序到达的成交加入和过期移出都是 O(1) (均摊), 乱序晚到的成交放进按时间排序的最小堆, O(log n),
+#       查询时直接由累加和算出 VWAP 和买卖不平衡
+# 合约列表: 指定 --symbols, 或按 --underlying 取24小时有成交的合约, 定期刷新
+# python block_trades.py --underlying ETH --interval 10 --window 3600
+# python block_trades.py --symbols ETH-250728-3600-C,ETH-250728-3700-C --once
+# Python 调用: ingest = BlockTradeIngest(symbols); ingest.start(); ingest.stats("ETH-250728-3600-C")
+import requests
+import argparse
+import collections
+import heapq
+import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import http_client
+from chain_scanner import TICKER_ENDPOINT, fetch_all
+from pricing import parse_symbol
+
+# 币安期权API配置
+BASE_URL = "https://eapi.binance.com"
+BLOCK_TRADES_ENDPOINT = '/eapi/v1/blockTrades'
+
+# 首次拉取补齐最近500笔, 之后每次100笔 (接口只允许这两种条数)
+BACKFILL_LIMIT = 500
+POLL_LIMIT = 100
+POLL_INTERVAL = 10
+# 按 --underlying 采集时刷新活跃合约列表的间隔 (秒)
+SYMBOL_REFRESH_INTERVAL = 300
+DEFAULT_WINDOW = 3600
+DEFAULT_WORKERS = 8
+DEDUP_CAPACITY = 100000
+
+
+class TradeDeduper:
+    """有界的已见成交ID集合, 超出容量时淘汰最久未出现的ID"""
+
+    def __init__(self, capacity=DEDUP_CAPACITY):
+        self.capacity = capacity
+        self._seen = collections.OrderedDict()
+
+    def add(self, key):
+        """新ID返回True; 已见过返回False, 并刷新其位置"""
+        if key in self._seen:
+            self._seen.move_to_end(key)
+            return False
+        self._seen[key] = None
+        if len(self._seen) > self.capacity:
+            self._seen.popitem(last=False)
+        return True
+
+    def __len__(self):
+        return len(self._seen)
+
+
+class RollingAggregate:
+    """时间窗口内的成交累加和; window 为 None 时不过期 (累计值)"""
+
+    def __init__(self, window=DEFAULT_WINDOW):
+        self.window_ms = window * 1000 if window else None
+        # (时间, 数量, 名义价值, 主动买数量); 按时间顺序到达的放队列, 乱序晚到的放最小堆
+        self._trades = collections.deque()
+        self._late = []
+        self.trades = 0
+        self.volume = 0.0
+        self.notional = 0.0
+        self.buy_volume = 0.0
+        self.last_price = None
+        self.last_time = 0
+
+    def add(self, ts, price, qty, is_buy):
+        if self.window_ms is not None and ts <= self.last_time - self.window_ms:
+            # 已在窗口外的旧成交 (到期日汇总里其他合约的成交可能晚到) 不计入
+            return
+        notional = price * qty
+        buy = qty if is_buy else 0.0
+        entry = (ts, qty, notional, buy)
+        if self.window_ms is not None:
+            if self._trades and ts < self._trades[-1][0]:
+                # 乱序到达: 不在队列中间插入 (O(n)), 放进堆里, 过期时两边一起检查
+                heapq.heappush(self._late, entry)
+            else:
+                self._trades.append(entry)
+        self.trades += 1
+        self.volume += qty
+        self.notional += notional
+        self.buy_volume += buy
+        if ts >= self.last_time:
+            self.last_time = ts
+            self.last_price = price
+        self.expire(self.last_time)
+
+    def expire(self, now_ms):
+        """移出窗口外的成交"""
+        if self.window_ms is None:
+            return
+        cutoff = now_ms - self.window_ms
+        trades, late = self._trades, self._late
+        while trades and trades[0][0] <= cutoff:
+            self._remove(trades.popleft())
+        while late and late[0][0] <= cutoff:
+            self._remove(heapq.heappop(late))
+        if not trades and not late:
+            # 窗口清空时归零, 避免浮点累加误差残留
+            self.volume = self.notional = self.buy_volume = 0.0
+
+    def _remove(self, entry):
+        _, qty, notional, buy = entry
+        self.trades -= 1
+        self.volume -= qty
+        self.notional -= notional
+        self.buy_volume -= buy
+
+    def snapshot(self):
+        volume = self.volume
+        sell_volume = volume - self.buy_volume
+        return {
+            "trades": self.trades,
+            "volume": volume,
+            "notional": self.notional,
+            "vwap": self.notional / volume if volume > 0 else None,
+            "buy_volume": self.buy_volume,
+            "sell_volume": sell_volume,
+            # 买卖不平衡: (主动买 - 主动卖) / 总量, 范围 [-1, 1]
+            "imbalance": (self.buy_volume - sell_volume) / volume if volume > 0 else None,
+            "last_price": self.last_price,
+        }
+
+
+def expiry_of(symbol):
+    """到期日分组键: ETH-250728-3600-C -> ETH-250728"""
+    return '-'.join(symbol.split('-')[:2])
+
+
+def active_symbols(underlying, base_url=BASE_URL):
+    """标的下24小时有成交的合约"""
+    tickers = fetch_all(base_url, TICKER_ENDPOINT)
+    symbols = []
+    for symbol, ticker in tickers.items():
+        try:
+            if parse_symbol(symbol)["underlying"] != underlying:
+                continue
+        except ValueError:
+            continue
+        if float(ticker.get('volume') or 0) > 0:
+            symbols.append(symbol)
+    return sorted(symbols)
+
+
+class BlockTradeIngest:
+    """多合约大宗交易增量采集: 并发拉取, 按成交ID去重, 按合约/到期日滚动汇总, 线程安全"""
+
+    def __init__(self, symbols=(), base_url=BASE_URL, window=DEFAULT_WINDOW, workers=DEFAULT_WORKERS,
+                 dedup_capacity=DEDUP_CAPACITY, underlying=None):
+        self.symbols = list(symbols)
+        self.base_url = base_url
+        self.window = window
+        self.workers = workers
+        self.underlying = underlying
+        self._deduper = TradeDeduper(dedup_capacity)
+        self._symbol_stats = {}
+        self._expiry_stats = {}
+        self._totals = {}
+        self._backfilled = set()
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        self._symbols_at = 0
+        # 采集统计: 拉取次数、失败次数、收到的成交、去重后新增的成交
+        self.polls = 0
+        self.errors = 0
+        self.received = 0
+        self.ingested = 0
+
+    # ---------- 拉取 ----------
+
+    def fetch(self, symbol):
+        """拉取一个合约最近的大宗交易, 首次补齐最近 BACKFILL_LIMIT 笔, 失败返回空列表"""
+        limit = POLL_LIMIT if symbol in self._backfilled else BACKFILL_LIMIT
+        try:
+            response = http_client.get(self.base_url + BLOCK_TRADES_ENDPOINT, params={"symbol": symbol, "limit": limit})
+            response.raise_for_status()
+            trades = response.json()
+        except requests.exceptions.RequestException as e:
+            print(f"[{symbol}] 获取大宗交易失败: {e}")
+            self.errors += 1
+            return []
+        except json.JSONDecodeError as e:
+            print(f"[{symbol}] 解析大宗交易失败: {e}")
+            self.errors += 1
+            return []
+        self._backfilled.add(symbol)
+        return trades
+
+    def poll(self):
+        """并发拉取所有合约一次并入汇总, 返回新增成交数"""
+        if self.underlying and (not self.symbols or time.monotonic() - self._symbols_at >= SYMBOL_REFRESH_INTERVAL):
+            symbols = active_symbols(self.underlying, self.base_url)
+            if symbols:
+                self.symbols = symbols
+            self._symbols_at = time.monotonic()
+        if not self.symbols:
+            return 0
+        with ThreadPoolExecutor(max_workers=min(self.workers, len(self.symbols))) as executor:
+            results = list(executor.map(self.fetch, self.symbols))
+        self.polls += 1
+        return sum(self.ingest(symbol, trades) for symbol, trades in zip(self.symbols, results))
+
+    def start(self, interval=POLL_INTERVAL):
+        """后台线程按间隔轮询"""
+        def worker():
+            while not self._stop.is_set():
+                self.poll()
+                self._stop.wait(interval)
+
+        self._thread = threading.Thread(target=worker, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    # ---------- 汇总 ----------
+
+    def ingest(self, symbol, trades):
+        """按成交ID去重后并入汇总, 返回新增成交数"""
+        with self._lock:
+            self.received += len(trades)
+            # 先去重: 轮询返回的大部分是上一轮见过的成交, 只有新成交需要解析和排序
+            seen = self._deduper
+            fresh = [trade for trade in trades if seen.add((symbol, trade.get('id', trade.get('tradeId'))))]
+            if not fresh:
+                return 0
+            aggregates = []
+            for stats, key, window in ((self._symbol_stats, symbol, self.window),
+                                       (self._expiry_stats, expiry_of(symbol), self.window),
+                                       (self._totals, symbol, None)):
+                aggregate = stats.get(key)
+                if aggregate is None:
+                    aggregate = stats[key] = RollingAggregate(window)
+                aggregates.append(aggregate)
+            added = 0
+            for trade in sorted(fresh, key=lambda t: t.get('time', 0)):
+                try:
+                    ts, price, qty = int(trade['time']), float(trade['price']), float(trade['qty'])
+                except (KeyError, TypeError, ValueError):
+                    continue
+                # side: 1 为主动买 (taker买), -1 为主动卖
+                is_buy = int(trade.get('side', 0)) > 0
+                for aggregate in aggregates:
+                    aggregate.add(ts, price, qty, is_buy)
+                added += 1
+            self.ingested += added
+        return added
+
+    def _snapshot(self, stats, key, now_ms):
+        aggregate = stats.get(key)
+        if aggregate is None:
+            return RollingAggregate(self.window).snapshot()
+        aggregate.expire(now_ms)
+        return aggregate.snapshot()
+
+    def stats(self, symbol, now_ms=None):
+        """合约在滚动窗口内的汇总: 笔数、数量、名义价值、VWAP、主动买/卖数量、买卖不平衡、最新价"""
+        with self._lock:
+            return self._snapshot(self._symbol_stats, symbol, now_ms or int(time.time() * 1000))
+
+    def expiry_stats(self, expiry, now_ms=None):
+        """到期日 (如 ETH-250728) 在滚动窗口内的汇总"""
+        with self._lock:
+            return self._snapshot(self._expiry_stats, expiry, now_ms or int(time.time() * 1000))
+
+    def total_stats(self, symbol):
+        """合约自启动以来 (含首次补齐) 的累计汇总"""
+        with self._lock:
+            total = self._totals.get(symbol)
+            return (total or RollingAggregate(None)).snapshot()
+
+    def summary(self, now_ms=None):
+        now_ms = now_ms or int(time.time() * 1000)
+        with self._lock:
+            return {
+                "window": self.window,
+                "symbols": {key: self._snapshot(self._symbol_stats, key, now_ms) for key in sorted(self._symbol_stats)},
+                "expiries": {key: self._snapshot(self._expiry_stats, key, now_ms) for key in sorted(self._expiry_stats)},
+                "ingest": {"symbols": len(self.symbols), "polls": self.polls, "errors": self.errors,
+                           "received": self.received, "ingested": self.ingested, "dedup_size": len(self._deduper)},
+            }
+
+
+def print_summary(summary, limit=None):
+    def fmt(value, spec):
+        return "-" if value is None else format(value, spec)
+
+    def table(title, rows):
+        print(f"{title:<22} {'笔数':>6} {'数量':>10} {'名义价值':>12} {'VWAP':>10} {'买卖不平衡':>10} {'最新价':>10}")
+        for key, row in rows[:limit]:
+            print(f"{key:<22} {row['trades']:>6} {row['volume']:>10.2f} {row['notional']:>12.2f} "
+                  f"{fmt(row['vwap'], '>10.2f')} {fmt(row['imbalance'], '>10.2f')} {fmt(row['last_price'], '>10.2f')}")
+
+    window = summary["window"]
+    active = [(key, row) for key, row in summary["symbols"].items() if row["trades"]]
+    active.sort(key=lambda item: item[1]["notional"], reverse=True)
+    print(f"最近 {window} 秒大宗交易 (按名义价值排序, 共 {len(active)} 个合约有成交)")
+    table("合约", active)
+    print()
+    table("到期日", [(key, row) for key, row in summary["expiries"].items() if row["trades"]])
+    ingest = summary["ingest"]
+    print(f"采集: {ingest['symbols']}个合约, 轮询{ingest['polls']}次, 失败{ingest['errors']}次, "
+          f"收到{ingest['received']}笔, 去重后{ingest['ingested']}笔")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='币安期权大宗交易增量采集与滚动统计')
+    parser.add_argument('--symbols', help='合约列表, 逗号分隔, 例如: ETH-250728-3600-C,ETH-250728-3700-C')
+    parser.add_argument('--underlying', help='采集该标的下所有24小时有成交的合约, 例如: ETH')
+    parser.add_argument('--interval', type=float, default=POLL_INTERVAL, help=f'轮询间隔秒数 (默认: {POLL_INTERVAL})')
+    parser.add_argument('--window', type=int, default=DEFAULT_WINDOW, help=f'滚动统计窗口秒数 (默认: {DEFAULT_WINDOW})')
+    parser.add_argument('--workers', type=int, default=DEFAULT_WORKERS, help=f'并发拉取线程数 (默认: {DEFAULT_WORKERS})')
+    parser.add_argument('--limit', type=int, default=20, help='表格显示行数 (默认: 20)')
+    parser.add_argument('--once', action='store_true', help='只拉取一次并输出汇总')
+    parser.add_argument('--json', action='store_true', help='以JSON输出汇总')
+    parser.add_argument('--base-url', default=BASE_URL, help='REST地址 (默认: 币安期权)')
+    args = parser.parse_args()
+
+    symbols = [s.strip() for s in args.symbols.split(',') if s.strip()] if args.symbols else []
+    if not symbols and not args.underlying:
+        print("请通过 --symbols 或 --underlying 指定要采集的合约")
+        return
+
+    http_client.configure(pool_size=max(args.workers, http_client.DEFAULT_POOL_SIZE))
+    ingest = BlockTradeIngest(symbols, args.base_url, args.window, args.workers, underlying=args.underlying)
+
+    def report():
+        summary = ingest.summary()
+        if args.json:
+            print(json.dumps(summary, ensure_ascii=False))
+        else:
+            print_summary(summary, args.limit)
+            print("-" * 50)
+
+    try:
+        while True:
+            added = ingest.poll()
+            if not args.json:
+                print(f"{time.strftime('%H:%M:%S')} 新增大宗交易 {added} 笔")
+            report()
+            if args.once:
+                break
+            time.sleep(args.interval)
+    except KeyboardInterrupt:
+        print("已停止")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,207 @@
+# 期权链扫描 - 一次拉取某标的在到期区间内所有合约的报价/标记价格, 按价差、挂单量、权利金排序
+# 报价和标记价格用批量接口 /eapi/v1/ticker 和 /eapi/v1/mark 各一次请求取全市场,
+# 只有需要挂单数量时才按合约并发请求 /eapi/v1/depth (有界并发, 共享连接池和限速器)
+# python chain_scanner.py --underlying ETH --expiry-from 250728 --expiry-to 250829 --side CALL --sort premium
+# python chain_scanner.py --underlying ETH --depth --csv chain.csv
+# Python 调用: from chain_scanner import scan_chain, rank; rows = rank(scan_chain("ETH"), "spread_pct")
+import requests
+import argparse
+import csv
+import json
+from concurrent.futures import ThreadPoolExecutor
+
+import http_client
+from exchange_info import ExchangeInfo
+from pricing import parse_symbol
+
+# 币安期权API配置
+BASE_URL = "https://eapi.binance.com"
+TICKER_ENDPOINT = '/eapi/v1/ticker'
+MARK_ENDPOINT = '/eapi/v1/mark'
+ORDERBOOK_ENDPOINT = '/eapi/v1/depth'
+
+# 并发拉取深度的线程数 (同时也是连接池大小)
+DEFAULT_CONCURRENCY = 8
+
+# 输出列
+COLUMNS = [
+    "symbol", "side", "strike", "expiry", "bid", "ask", "bid_qty", "ask_qty", "spread", "spread_pct",
+    "mark", "mark_iv", "delta", "premium", "volume",
+]
+
+# 排序方式: 列名 -> 是否降序
+SORT_KEYS = {
+    "spread": False,
+    "spread_pct": False,
+    "bid_qty": True,
+    "ask_qty": True,
+    "premium": True,
+    "mark_iv": True,
+    "volume": True,
+}
+
+
+def _to_float(value):
+    try:
+        value = float(value)
+    except (TypeError, ValueError):
+        return None
+    return value if value > 0 else None
+
+
+def fetch_all(base_url, endpoint):
+    """批量接口: 一次返回全部合约, 按交易对索引"""
+    try:
+        response = http_client.get(base_url + endpoint)
+        response.raise_for_status()
+        return {item['symbol']: item for item in response.json()}
+    except (requests.exceptions.RequestException, json.JSONDecodeError, KeyError, TypeError) as e:
+        print(f"获取 {endpoint} 失败: {e}")
+        return {}
+
+
+def fetch_top(base_url, symbol):
+    """单个合约的买一/卖一数量, 失败返回 (None, None)"""
+    try:
+        response = http_client.get(base_url + ORDERBOOK_ENDPOINT, params={"symbol": symbol, "limit": 10})
+        response.raise_for_status()
+        data = response.json()
+    except (requests.exceptions.RequestException, json.JSONDecodeError) as e:
+        print(f"[{symbol}] 获取深度失败: {e}")
+        return None, None
+    bids, asks = data.get('bids', []), data.get('asks', [])
+    return (_to_float(bids[0][1]) if bids else None), (_to_float(asks[0][1]) if asks else None)
+
+
+def list_contracts(underlying, expiry_from=None, expiry_to=None, side=None, exchange_info=None):
+    """从交易规则缓存中筛选标的、到期区间 (YYMMDD, 含两端) 和方向"""
+    exchange_info = exchange_info or ExchangeInfo()
+    if not exchange_info.symbols:
+        exchange_info.load()
+    contracts = []
+    for symbol in exchange_info.symbols:
+        if not symbol.startswith(underlying + '-'):
+            continue
+        expiry = symbol.split('-')[1]
+        if expiry_from and expiry < expiry_from:
+            continue
+        if expiry_to and expiry > expiry_to:
+            continue
+        try:
+            contract = parse_symbol(symbol)
+        except ValueError:
+            continue
+        if side and contract["side"] != side:
+            continue
+        contracts.append(symbol)
+    return sorted(contracts)
+
+
+def scan_chain(underlying, expiry_from=None, expiry_to=None, side=None, depth=False,
+               concurrency=DEFAULT_CONCURRENCY, base_url=BASE_URL, exchange_info=None):
+    """扫描期权链, 返回每个合约一行的字典列表 (列见 COLUMNS)
+
+    depth=True 时并发拉取每个合约的买一/卖一数量, 否则数量列为 None
+    """
+    symbols = list_contracts(underlying, expiry_from, expiry_to, side, exchange_info or ExchangeInfo(base_url))
+    if not symbols:
+        return []
+
+    # 两个批量接口并发请求
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        tickers = executor.submit(fetch_all, base_url, TICKER_ENDPOINT)
+        marks = executor.submit(fetch_all, base_url, MARK_ENDPOINT)
+        tickers, marks = tickers.result(), marks.result()
+
+    sizes = {}
+    if depth:
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            sizes = dict(zip(symbols, executor.map(lambda symbol: fetch_top(base_url, symbol), symbols)))
+
+    rows = []
+    for symbol in symbols:
+        contract = parse_symbol(symbol)
+        ticker = tickers.get(symbol, {})
+        mark = marks.get(symbol, {})
+        bid = _to_float(ticker.get('bidPrice'))
+        ask = _to_float(ticker.get('askPrice'))
+        bid_qty, ask_qty = sizes.get(symbol, (None, None))
+        spread = ask - bid if bid is not None and ask is not None else None
+        rows.append({
+            "symbol": symbol,
+            "side": contract["side"],
+            "strike": contract["strike"],
+            "expiry": symbol.split('-')[1],
+            "bid": bid,
+            "ask": ask,
+            "bid_qty": bid_qty,
+            "ask_qty": ask_qty,
+            "spread": spread,
+            "spread_pct": spread / ask * 100 if spread is not None else None,
+            "mark": _to_float(mark.get('markPrice')),
+            "mark_iv": _to_float(mark.get('markIV')),
+            "delta": float(mark['delta']) if mark.get('delta') is not None else None,
+            # 卖出可得权利金: 按买一计, 有数量时乘以买一数量
+            "premium": bid * bid_qty if bid is not None and bid_qty is not None else bid,
+            "volume": float(ticker.get('volume') or 0),
+        })
+    return rows
+
+
+def rank(rows, key="premium"):
+    """按指定列排序, 缺失值排在最后"""
+    descending = SORT_KEYS[key]
+    present = [row for row in rows if row[key] is not None]
+    missing = [row for row in rows if row[key] is None]
+    return sorted(present, key=lambda row: row[key], reverse=descending) + missing
+
+
+def write_csv(rows, path):
+    with open(path, 'w', newline='') as f:
+        writer = csv.DictWriter(f, fieldnames=COLUMNS)
+        writer.writeheader()
+        writer.writerows(rows)
+
+
+def print_table(rows, limit=None):
+    def fmt(value, spec):
+        return "-" if value is None else format(value, spec)
+
+    print(f"{'交易对':<22} {'买一':>10} {'卖一':>10} {'买量':>8} {'卖量':>8} {'价差%':>7} "
+          f"{'标记价':>10} {'IV':>7} {'delta':>7} {'权利金':>10}")
+    for row in rows[:limit]:
+        print(f"{row['symbol']:<22} {fmt(row['bid'], '>10.2f')} {fmt(row['ask'], '>10.2f')} "
+              f"{fmt(row['bid_qty'], '>8.2f')} {fmt(row['ask_qty'], '>8.2f')} {fmt(row['spread_pct'], '>7.2f')} "
+              f"{fmt(row['mark'], '>10.2f')} {fmt(row['mark_iv'], '>7.3f')} {fmt(row['delta'], '>7.3f')} "
+              f"{fmt(row['premium'], '>10.2f')}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='币安期权链扫描')
+    parser.add_argument('--underlying', required=True, help='标的, 例如: ETH')
+    parser.add_argument('--expiry-from', help='最早到期日 YYMMDD, 例如: 250728')
+    parser.add_argument('--expiry-to', help='最晚到期日 YYMMDD, 例如: 250829')
+    parser.add_argument('--side', choices=['CALL', 'PUT'], help='只看看涨或看跌')
+    parser.add_argument('--depth', action='store_true', help='并发拉取每个合约的买一/卖一数量')
+    parser.add_argument('--concurrency', type=int, default=DEFAULT_CONCURRENCY, help=f'深度并发数 (默认: {DEFAULT_CONCURRENCY})')
+    parser.add_argument('--sort', choices=list(SORT_KEYS), default='premium', help='排序列 (默认: premium)')
+    parser.add_argument('--limit', type=int, default=30, help='表格显示行数 (默认: 30)')
+    parser.add_argument('--csv', help='输出全部结果到CSV')
+    parser.add_argument('--base-url', default=BASE_URL, help='REST地址 (默认: 币安期权)')
+    args = parser.parse_args()
+
+    http_client.configure(pool_size=max(args.concurrency, http_client.DEFAULT_POOL_SIZE))
+    rows = rank(scan_chain(args.underlying, args.expiry_from, args.expiry_to, args.side, args.depth,
+                           args.concurrency, args.base_url), args.sort)
+    if not rows:
+        print("没有符合条件的合约")
+        return
+    print(f"共 {len(rows)} 个合约, 按 {args.sort} 排序")
+    print_table(rows, args.limit)
+    if args.csv:
+        write_csv(rows, args.csv)
+        print(f"结果已写入: {args.csv}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,326 @@
+# 深度/成交记录器 - 连续记录多个合约的深度快照、增量深度、逐笔成交和大宗交易
+# 逐笔成交 (/eapi/v1/trades, 订单簿上的主动成交) 写入 taker_trades, 供 backtest.py 的 trades 成交模型回放;
+# 大宗交易 (/eapi/v1/blockTrades, 场外协商, 不与挂单撮合) 写入 trades, 只用于分析, 不能用来模拟挂单成交
+# 数据按列存储为压缩的 numpy .npz 分块文件, 价格和数量为定点 int64 (乘以 FIXED_SCALE)
+# 每个目录有 index.csv 记录各分块的起止时间, 按时间范围读取时只打开相关分块
+# 内存中只保留固定容量的缓冲区, 写满或定时刷盘, 可长时间运行
+# python depth_recorder.py --symbols ETH-250728-3600-C,ETH-250728-3700-C --out data
+# 目录结构: data/depth/ETH-250728-3600-C/1753660800000.npz, data/taker_trades/.../index.csv, data/trades/...
+import requests
+import argparse
+import csv
+import json
+import os
+import threading
+import time
+
+import numpy as np
+import websocket
+
+import http_client
+
+# 币安期权API配置
+BASE_URL = "https://eapi.binance.com"
+WS_URL = "wss://nbstream.binance.com/eapi/stream"
+ORDERBOOK_ENDPOINT = '/eapi/v1/depth'
+BLOCK_TRADES_ENDPOINT = '/eapi/v1/blockTrades'
+TRADES_ENDPOINT = '/eapi/v1/trades'
+DEPTH_STREAM = "{symbol}@depth1000@100ms"
+
+# 定点数精度: 价格/数量乘以1e8后存为int64
+FIXED_SCALE = 10 ** 8
+
+# 每个分块的行数上限 (缓冲区按此预分配, 每个深度缓冲约1.7MB), 以及刷盘/快照/大宗交易/逐笔成交轮询间隔 (秒)
+CHUNK_ROWS = 50000
+TRADE_CHUNK_ROWS = 5000
+FLUSH_INTERVAL = 60
+SNAPSHOT_INTERVAL = 600
+TRADE_POLL_INTERVAL = 30
+# 逐笔成交每次最多返回500笔, 轮询间隔内成交超过500笔会漏记, 间隔要短于大宗交易
+TAKER_TRADE_POLL_INTERVAL = 5
+
+# 成交数据目录 -> 接口
+TRADE_SOURCES = {
+    "trades": BLOCK_TRADES_ENDPOINT,
+    "taker_trades": TRADES_ENDPOINT,
+}
+
+# 列定义
+DEPTH_COLUMNS = {
+    "ts": np.int64,           # 事件时间 (毫秒)
+    "update_id": np.int64,    # 最后更新ID
+    "side": np.int8,          # 0=买, 1=卖
+    "price": np.int64,        # 定点价格
+    "qty": np.int64,          # 定点数量, 0表示删除该价位
+    "snapshot": np.int8,      # 1=来自REST快照, 0=增量
+}
+TRADE_COLUMNS = {
+    "ts": np.int64,
+    "trade_id": np.int64,
+    "side": np.int8,          # 1=主动买, -1=主动卖
+    "price": np.int64,
+    "qty": np.int64,
+}
+
+
+def to_fixed(value):
+    """字符串/浮点数转定点int64"""
+    return int(round(float(value) * FIXED_SCALE))
+
+
+def from_fixed(values):
+    """定点数组转回浮点"""
+    return np.asarray(values, dtype=np.float64) / FIXED_SCALE
+
+
+class ChunkWriter:
+    """单个目录的追加写入器: 定长列缓冲区, 写满或刷盘时输出一个压缩分块"""
+
+    def __init__(self, directory, columns, capacity=CHUNK_ROWS):
+        self.directory = directory
+        self.columns = columns
+        self.capacity = capacity
+        self.buffers = {name: np.empty(capacity, dtype=dtype) for name, dtype in columns.items()}
+        self.size = 0
+        self.rows_written = 0
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+
+    def append(self, row):
+        """追加一行 (按列定义顺序的元组)"""
+        with self._lock:
+            for buffer, value in zip(self.buffers.values(), row):
+                buffer[self.size] = value
+            self.size += 1
+            if self.size >= self.capacity:
+                self._flush_locked()
+
+    def flush(self):
+        with self._lock:
+            self._flush_locked()
+
+    def _flush_locked(self):
+        if self.size == 0:
+            return
+        data = {name: buffer[:self.size] for name, buffer in self.buffers.items()}
+        first_ts = int(data["ts"][0])
+        last_ts = int(data["ts"][-1])
+        filename = f"{first_ts}.npz"
+        path = os.path.join(self.directory, filename)
+        # 同一毫秒内多次刷盘时避免覆盖
+        suffix = 1
+        while os.path.exists(path):
+            filename = f"{first_ts}-{suffix}.npz"
+            path = os.path.join(self.directory, filename)
+            suffix += 1
+        np.savez_compressed(path, **data)
+        with open(os.path.join(self.directory, "index.csv"), "a", newline='') as f:
+            csv.writer(f).writerow([filename, first_ts, last_ts, self.size])
+        self.rows_written += self.size
+        self.size = 0
+
+
+def load_chunks(root, kind, symbol, start_ms=None, end_ms=None):
+    """读取某合约在时间范围内的数据, 返回按列的 numpy 数组字典
+
+    kind 为 'depth'、'taker_trades' 或 'trades'; 通过 index.csv 跳过时间范围外的分块
+    """
+    directory = os.path.join(root, kind, symbol)
+    columns = DEPTH_COLUMNS if kind == "depth" else TRADE_COLUMNS
+    parts = {name: [] for name in columns}
+    index_path = os.path.join(directory, "index.csv")
+    if not os.path.exists(index_path):
+        return {name: np.empty(0, dtype=dtype) for name, dtype in columns.items()}
+
+    with open(index_path, newline='') as f:
+        entries = sorted(csv.reader(f), key=lambda entry: int(entry[1]))
+    for filename, first_ts, last_ts, _ in entries:
+        if start_ms is not None and int(last_ts) < start_ms:
+            continue
+        if end_ms is not None and int(first_ts) > end_ms:
+            continue
+        with np.load(os.path.join(directory, filename)) as chunk:
+            mask = np.ones(len(chunk["ts"]), dtype=bool)
+            if start_ms is not None:
+                mask &= chunk["ts"] >= start_ms
+            if end_ms is not None:
+                mask &= chunk["ts"] <= end_ms
+            for name in columns:
+                parts[name].append(chunk[name][mask])
+
+    return {
+        name: np.concatenate(arrays) if arrays else np.empty(0, dtype=columns[name])
+        for name, arrays in parts.items()
+    }
+
+
+class DepthRecorder:
+    """多合约深度、逐笔成交和大宗交易记录器"""
+
+    def __init__(self, symbols, root, base_url=BASE_URL, ws_url=WS_URL,
+                 trade_interval=TRADE_POLL_INTERVAL, snapshot_interval=SNAPSHOT_INTERVAL,
+                 taker_trade_interval=TAKER_TRADE_POLL_INTERVAL):
+        self.symbols = symbols
+        self.root = root
+        self.base_url = base_url
+        self.ws_url = ws_url
+        self.trade_interval = trade_interval
+        self.taker_trade_interval = taker_trade_interval
+        self.snapshot_interval = snapshot_interval
+        self.depth_writers = {s: ChunkWriter(os.path.join(root, "depth", s), DEPTH_COLUMNS) for s in symbols}
+        # 成交数据目录 -> {合约: 写入器}
+        self.trade_writers = {
+            kind: {s: ChunkWriter(os.path.join(root, kind, s), TRADE_COLUMNS, TRADE_CHUNK_ROWS) for s in symbols}
+            for kind in TRADE_SOURCES
+        }
+        # 每个目录每个合约已记录的最大成交ID, 用于去重
+        self.last_trade_ids = {kind: {s: 0 for s in symbols} for kind in TRADE_SOURCES}
+        self.event_count = 0
+        self._running = False
+        self._ws = None
+
+    # ---------- 深度 ----------
+
+    def record_snapshot(self, symbol):
+        """拉取一次REST快照并整体记录 (snapshot=1), 回放时可从任意快照开始"""
+        try:
+            response = http_client.get(self.base_url + ORDERBOOK_ENDPOINT, params={"symbol": symbol, "limit": 1000})
+            response.raise_for_status()
+            snapshot = response.json()
+        except (requests.exceptions.RequestException, json.JSONDecodeError) as e:
+            print(f"[{symbol}] 获取深度快照失败: {e}")
+            return
+        ts = snapshot.get('T') or int(time.time() * 1000)
+        update_id = snapshot.get('u', snapshot.get('lastUpdateId')) or 0
+        writer = self.depth_writers[symbol]
+        for side, levels in ((0, snapshot.get('bids', [])), (1, snapshot.get('asks', []))):
+            for price, qty in levels:
+                writer.append((ts, update_id, side, to_fixed(price), to_fixed(qty), 1))
+
+    def record_event(self, event):
+        """记录一条增量深度事件"""
+        writer = self.depth_writers.get(event.get('s'))
+        if writer is None:
+            return
+        self.event_count += 1
+        ts = event.get('T') or event.get('E') or int(time.time() * 1000)
+        update_id = event.get('u', 0)
+        for price, qty in event.get('b', []):
+            writer.append((ts, update_id, 0, to_fixed(price), to_fixed(qty), 0))
+        for price, qty in event.get('a', []):
+            writer.append((ts, update_id, 1, to_fixed(price), to_fixed(qty), 0))
+
+    def _on_message(self, ws, message):
+        try:
+            event = json.loads(message)
+        except json.JSONDecodeError as e:
+            print(f"解析深度事件失败: {e}")
+            return
+        self.record_event(event.get('data', event))
+
+    def _on_open(self, ws):
+        # (重)连接后先记录快照, 保证之后的增量有起点
+        for symbol in self.symbols:
+            self.record_snapshot(symbol)
+
+    def _run_ws(self):
+        streams = '/'.join(DEPTH_STREAM.format(symbol=s) for s in self.symbols)
+        while self._running:
+            self._ws = websocket.WebSocketApp(
+                f"{self.ws_url}?streams={streams}",
+                on_open=self._on_open,
+                on_message=self._on_message,
+                on_error=lambda ws, error: print(f"深度WebSocket错误: {error}"),
+            )
+            self._ws.run_forever(ping_interval=30, ping_timeout=10)
+            if self._running:
+                print("深度WebSocket断开, 1秒后重连...")
+                time.sleep(1)
+
+    # ---------- 成交 ----------
+
+    def poll_trades(self, symbol, kind="trades"):
+        """拉取最近成交 (kind: trades=大宗交易, taker_trades=逐笔成交), 只记录比上次更新的成交"""
+        try:
+            response = http_client.get(self.base_url + TRADE_SOURCES[kind], params={"symbol": symbol, "limit": 500})
+            response.raise_for_status()
+            trades = response.json()
+        except (requests.exceptions.RequestException, json.JSONDecodeError) as e:
+            print(f"[{symbol}] 获取{'逐笔成交' if kind == 'taker_trades' else '大宗交易'}失败: {e}")
+            return
+        writer = self.trade_writers[kind][symbol]
+        last_id = self.last_trade_ids[kind][symbol]
+        for trade in sorted(trades, key=lambda t: t['id']):
+            if trade['id'] <= last_id:
+                continue
+            writer.append((trade['time'], trade['id'], trade['side'], to_fixed(trade['price']), to_fixed(trade['qty'])))
+            last_id = trade['id']
+        self.last_trade_ids[kind][symbol] = last_id
+
+    def _run_trades(self, kind, interval):
+        while self._running:
+            for symbol in self.symbols:
+                self.poll_trades(symbol, kind)
+            time.sleep(interval)
+
+    # ---------- 定时任务 ----------
+
+    def flush(self):
+        writers = list(self.depth_writers.values())
+        for by_symbol in self.trade_writers.values():
+            writers.extend(by_symbol.values())
+        for writer in writers:
+            writer.flush()
+
+    def _run_maintenance(self):
+        last_snapshot = time.monotonic()
+        while self._running:
+            time.sleep(FLUSH_INTERVAL)
+            self.flush()
+            if time.monotonic() - last_snapshot >= self.snapshot_interval:
+                for symbol in self.symbols:
+                    self.record_snapshot(symbol)
+                last_snapshot = time.monotonic()
+
+    def start(self):
+        self._running = True
+        for target in (self._run_ws, self._run_maintenance):
+            threading.Thread(target=target, daemon=True).start()
+        threading.Thread(target=self._run_trades, args=("trades", self.trade_interval), daemon=True).start()
+        threading.Thread(target=self._run_trades, args=("taker_trades", self.taker_trade_interval), daemon=True).start()
+
+    def stop(self):
+        self._running = False
+        if self._ws:
+            self._ws.close()
+        self.flush()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='币安期权深度、逐笔成交和大宗交易记录器')
+    parser.add_argument('--symbols', required=True, help='逗号分隔的期权交易对，例如: ETH-250728-3600-C,ETH-250728-3700-C')
+    parser.add_argument('--out', default='data', help='输出目录 (默认: data)')
+    parser.add_argument('--trade-interval', type=int, default=TRADE_POLL_INTERVAL, help=f'大宗交易轮询间隔秒数 (默认: {TRADE_POLL_INTERVAL})')
+    parser.add_argument('--taker-trade-interval', type=float, default=TAKER_TRADE_POLL_INTERVAL,
+                        help=f'逐笔成交轮询间隔秒数 (默认: {TAKER_TRADE_POLL_INTERVAL})')
+    parser.add_argument('--base-url', default=BASE_URL, help='REST地址 (默认: 币安期权)')
+    parser.add_argument('--ws-url', default=WS_URL, help='WebSocket组合流地址 (默认: 币安期权)')
+    args = parser.parse_args()
+
+    symbols = [s.strip() for s in args.symbols.split(',') if s.strip()]
+    recorder = DepthRecorder(symbols, args.out, base_url=args.base_url, ws_url=args.ws_url,
+                             trade_interval=args.trade_interval, taker_trade_interval=args.taker_trade_interval)
+    recorder.start()
+    print(f"开始记录 {len(symbols)} 个合约, 输出目录: {args.out}")
+    try:
+        while True:
+            time.sleep(FLUSH_INTERVAL)
+            written = sum(w.rows_written for w in recorder.depth_writers.values())
+            print(f"已接收深度事件: {recorder.event_count}, 已写入深度行数: {written}")
+    except KeyboardInterrupt:
+        recorder.stop()
+        print("已停止并刷盘")
+
+
+if __name__ == "__main__":
+    main()
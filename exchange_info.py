@@ -0,0 +1,221 @@
+# 交易规则缓存 - /eapi/v1/exchangeInfo 的磁盘缓存(带TTL) + 内存中按交易对索引
+# 提供价格/数量过滤器、最小/最大名义价值和到期时间, 下单前把价格和数量量化到 tickSize / stepSize
+# 启动时直接读磁盘缓存, 缓存过期则在后台线程刷新, 网络请求不在下单关键路径上
+# 缓存文件按接口地址区分 (测试网/模拟交易所的规则不会写进正式环境的缓存), 文件内也记录地址, 不一致时不使用
+# python exchange_info.py --symbol ETH-250728-3600-C
+import requests
+import argparse
+import json
+import os
+import threading
+import time
+import urllib.parse
+from decimal import ROUND_DOWN, ROUND_UP
+
+import http_client
+from order_manager import to_decimal
+
+# 币安期权API配置
+BASE_URL = "https://eapi.binance.com"
+EXCHANGE_INFO_ENDPOINT = '/eapi/v1/exchangeInfo'
+
+# 缓存文件和有效期 (秒)
+CACHE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '.cache')
+CACHE_PATH = os.path.join(CACHE_DIR, 'exchange_info.json')
+CACHE_TTL = 3600
+
+
+def cache_path_for(base_url):
+    """接口地址对应的缓存文件: 正式环境为 CACHE_PATH, 其他地址带上主机名和端口"""
+    if base_url == BASE_URL:
+        return CACHE_PATH
+    host = urllib.parse.urlsplit(base_url).netloc.replace(':', '_')
+    return os.path.join(CACHE_DIR, f'exchange_info-{host}.json')
+
+
+class SymbolFilters:
+    """单个合约的交易规则"""
+
+    def __init__(self, info):
+        self.symbol = info['symbol']
+        self.underlying = info.get('underlying')
+        self.side = info.get('side')
+        self.strike = to_decimal(info['strikePrice']) if info.get('strikePrice') else None
+        self.expiry = info.get('expiryDate')
+        self.tick_size = None
+        self.min_price = None
+        self.max_price = None
+        self.step_size = None
+        self.min_qty = to_decimal(info['minQty']) if info.get('minQty') else None
+        self.max_qty = to_decimal(info['maxQty']) if info.get('maxQty') else None
+        self.min_notional = None
+        self.max_notional = None
+
+        for item in info.get('filters', []):
+            filter_type = item.get('filterType')
+            if filter_type == 'PRICE_FILTER':
+                self.tick_size = to_decimal(item['tickSize'])
+                self.min_price = to_decimal(item['minPrice'])
+                self.max_price = to_decimal(item['maxPrice'])
+            elif filter_type == 'LOT_SIZE':
+                self.step_size = to_decimal(item['stepSize'])
+                self.min_qty = to_decimal(item['minQty'])
+                self.max_qty = to_decimal(item['maxQty'])
+            elif filter_type in ('MIN_NOTIONAL', 'NOTIONAL'):
+                if item.get('minNotional'):
+                    self.min_notional = to_decimal(item['minNotional'])
+                if item.get('maxNotional'):
+                    self.max_notional = to_decimal(item['maxNotional'])
+
+    def quantize_price(self, price, side="SELL"):
+        """价格对齐到tickSize: 卖单向上取整, 买单向下取整, 不会比计算价格更差"""
+        price = to_decimal(price)
+        if not self.tick_size:
+            return price
+        rounding = ROUND_UP if side == "SELL" else ROUND_DOWN
+        return (price / self.tick_size).to_integral_value(rounding) * self.tick_size
+
+    def quantize_qty(self, qty):
+        """数量向下对齐到stepSize, 不会超过计划数量"""
+        qty = to_decimal(qty)
+        if not self.step_size:
+            return qty
+        return (qty / self.step_size).to_integral_value(ROUND_DOWN) * self.step_size
+
+    def is_expired(self, now_ms=None):
+        if self.expiry is None:
+            return False
+        return (now_ms or time.time() * 1000) >= self.expiry
+
+    def validate(self, price, qty):
+        """检查已量化的价格和数量, 不满足规则时返回原因, 否则返回None"""
+        if self.min_price is not None and price < self.min_price:
+            return f"价格{price}低于最小价格{self.min_price}"
+        if self.max_price is not None and price > self.max_price:
+            return f"价格{price}高于最大价格{self.max_price}"
+        if self.min_qty is not None and qty < self.min_qty:
+            return f"数量{qty}低于最小数量{self.min_qty}"
+        if self.max_qty is not None and qty > self.max_qty:
+            return f"数量{qty}高于最大数量{self.max_qty}"
+        notional = price * qty
+        if self.min_notional is not None and notional < self.min_notional:
+            return f"名义价值{notional}低于最小值{self.min_notional}"
+        if self.max_notional is not None and notional > self.max_notional:
+            return f"名义价值{notional}高于最大值{self.max_notional}"
+        return None
+
+
+class ExchangeInfo:
+    """交易规则缓存, 按交易对索引"""
+
+    def __init__(self, base_url=BASE_URL, cache_path=None, ttl=CACHE_TTL):
+        self.base_url = base_url
+        # 未指定时按当前 base_url 取缓存文件, 之后修改 base_url 也会跟着切换
+        self._cache_path = cache_path
+        self.ttl = ttl
+        self.symbols = {}
+        self.updated = None
+        self._lock = threading.Lock()
+        self._refreshing = False
+
+    @property
+    def cache_path(self):
+        return self._cache_path or cache_path_for(self.base_url)
+
+    @cache_path.setter
+    def cache_path(self, path):
+        self._cache_path = path
+
+    def load(self):
+        """优先读磁盘缓存; 缓存过期则后台刷新, 没有缓存 (或缓存来自其他接口地址) 才同步拉取"""
+        if os.path.exists(self.cache_path):
+            try:
+                with open(self.cache_path) as f:
+                    cached = json.load(f)
+                if cached.get('base_url') != self.base_url:
+                    raise KeyError(f"缓存来自 {cached.get('base_url')}, 当前地址 {self.base_url}")
+                self._index(cached['data'], cached['updated'])
+                if time.time() - self.updated > self.ttl:
+                    self.refresh_async()
+                return True
+            except (OSError, json.JSONDecodeError, KeyError) as e:
+                print(f"读取交易规则缓存失败: {e}")
+        return self.refresh()
+
+    def refresh(self):
+        """从交易所拉取并写入磁盘缓存, 返回是否成功"""
+        try:
+            response = http_client.get(self.base_url + EXCHANGE_INFO_ENDPOINT)
+            response.raise_for_status()
+            data = response.json()
+        except (requests.exceptions.RequestException, json.JSONDecodeError) as e:
+            print(f"获取交易规则失败: {e}")
+            return False
+
+        updated = time.time()
+        self._index(data, updated)
+        try:
+            os.makedirs(os.path.dirname(self.cache_path), exist_ok=True)
+            # 先写临时文件再替换, 避免中途退出留下半个文件
+            tmp_path = self.cache_path + '.tmp'
+            with open(tmp_path, 'w') as f:
+                json.dump({"base_url": self.base_url, "updated": updated, "data": data}, f)
+            os.replace(tmp_path, self.cache_path)
+        except OSError as e:
+            print(f"写入交易规则缓存失败: {e}")
+        return True
+
+    def refresh_async(self):
+        """后台线程刷新, 同一时间只运行一个"""
+        with self._lock:
+            if self._refreshing:
+                return
+            self._refreshing = True
+
+        def worker():
+            try:
+                self.refresh()
+            finally:
+                self._refreshing = False
+
+        threading.Thread(target=worker, daemon=True).start()
+
+    def _index(self, data, updated):
+        symbols = {info['symbol']: SymbolFilters(info) for info in data.get('optionSymbols', [])}
+        with self._lock:
+            self.symbols = symbols
+            self.updated = updated
+
+    def get(self, symbol):
+        """查询交易规则; 缓存中没有(可能是新上线合约)时同步刷新一次"""
+        filters = self.symbols.get(symbol)
+        if filters is None and self.refresh():
+            filters = self.symbols.get(symbol)
+        return filters
+
+
+def main():
+    parser = argparse.ArgumentParser(description='币安期权交易规则查询')
+    parser.add_argument('--symbol', required=True, help='期权交易对，例如: ETH-250728-3600-C')
+    parser.add_argument('--refresh', action='store_true', help='忽略缓存, 强制从交易所拉取')
+    args = parser.parse_args()
+
+    info = ExchangeInfo()
+    if args.refresh:
+        info.refresh()
+    else:
+        info.load()
+
+    filters = info.get(args.symbol)
+    if filters is None:
+        print(f"交易对不存在: {args.symbol}")
+        return
+    print(f"交易对: {filters.symbol} ({filters.underlying}, {filters.side}, 行权价 {filters.strike})")
+    print(f"到期时间: {filters.expiry}, 已到期: {filters.is_expired()}")
+    print(f"价格: tickSize={filters.tick_size}, 范围=[{filters.min_price}, {filters.max_price}]")
+    print(f"数量: stepSize={filters.step_size}, 范围=[{filters.min_qty}, {filters.max_qty}]")
+    print(f"名义价值: [{filters.min_notional}, {filters.max_notional}]")
+
+
+if __name__ == "__main__":
+    main()
@@ -4,8 +4,10 @@
 # python get_blocktrades.py \
 # --symbol BTC-250728-119500-P \
 # --limit 100
+# 持续采集多个合约并去重统计 (VWAP、买卖不平衡等) 用 block_trades.py
 
 import requests
+import http_client
 import argparse
 import json
 
@@ -29,7 +31,7 @@ params = {
 
 try:
     # 发送请求
-    response = requests.get(base_url + endpoint_path, params=params, timeout=10)
+    response = http_client.get(base_url + endpoint_path, params=params)
     
     print(f"请求URL: {response.url}")
     print(f"响应状态码: {response.status_code}")
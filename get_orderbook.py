@@ -1,6 +1,7 @@
 # 获取币安期权订单簿深度数据
 # 接口: /eapi/v1/depth (公开接口，无需签名)
 import requests
+import http_client
 import argparse
 import json
 
@@ -24,7 +25,7 @@ params = {
 
 try:
     # 发送请求
-    response = requests.get(base_url + endpoint_path, params=params, timeout=10)
+    response = http_client.get(base_url + endpoint_path, params=params)
     
     print(f"请求URL: {response.url}")
     print(f"响应状态码: {response.status_code}")
@@ -0,0 +1,147 @@
+# 共享HTTP客户端 - 所有脚本共用一个带连接池的 requests.Session
+# keep-alive复用TCP+TLS连接, 按接口设置超时, 幂等请求自动重试退避
+# 用法: import http_client; http_client.get(url, params=...)
+# 调整连接池: http_client.configure(pool_size=50)
+# 每个域名共享一个限速器, 发请求前按接口权重取令牌, 收到响应后按 X-MBX-* 头校准
+# 开启 metrics 后按接口记录请求延迟分布、错误状态码和自动重试次数
+import requests
+import threading
+import urllib.parse
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+import metrics
+from rate_limiter import RateLimiter, request_cost
+
+# 连接池配置
+DEFAULT_POOL_SIZE = 10
+DEFAULT_TIMEOUT = 10
+
+# 重试配置: 只重试幂等请求, 下单(POST)不自动重试以免重复下单
+# 429 不在自动重试之列: urllib3 会在调用线程里按 Retry-After 睡眠后绕过限速器重发, 其他线程照常发请求;
+# 429/418 由限速器按 Retry-After 暂停该域名的所有请求 (见 rate_limiter.py)
+RETRY_TOTAL = 3
+RETRY_BACKOFF = 0.2
+RETRY_STATUSES = (500, 502, 503, 504)
+RETRY_METHODS = ("GET", "PUT", "DELETE")
+
+# 各接口超时 (连接超时, 读取超时), 未列出的接口使用 DEFAULT_TIMEOUT
+ENDPOINT_TIMEOUTS = {
+    '/eapi/v1/depth': (3, 5),
+    '/eapi/v1/order': (3, 10),
+    '/eapi/v1/openOrders': (3, 5),
+    '/eapi/v1/historyOrders': (3, 5),
+    '/eapi/v1/trades': (3, 5),
+    '/eapi/v1/blockTrades': (3, 10),
+    '/eapi/v1/listenKey': (3, 5),
+    '/eapi/v1/ticker': (3, 10),
+    '/eapi/v1/mark': (3, 10),
+    '/eapi/v1/index': (3, 5),
+}
+
+_session = None
+_session_lock = threading.Lock()
+_limiters = {}
+
+
+def create_session(pool_size=DEFAULT_POOL_SIZE, retries=RETRY_TOTAL, backoff=RETRY_BACKOFF):
+    """创建带连接池和重试的Session"""
+    retry = Retry(
+        total=retries,
+        backoff_factor=backoff,
+        status_forcelist=RETRY_STATUSES,
+        allowed_methods=RETRY_METHODS,
+        respect_retry_after_header=True,
+        raise_on_status=False,
+    )
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retry)
+    session = requests.Session()
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+
+def configure(pool_size=DEFAULT_POOL_SIZE, retries=RETRY_TOTAL, backoff=RETRY_BACKOFF):
+    """替换全局Session (需在发起请求前调用)"""
+    global _session
+    with _session_lock:
+        if _session is not None:
+            _session.close()
+        _session = create_session(pool_size, retries, backoff)
+    return _session
+
+
+def get_session():
+    """获取全局共享Session"""
+    global _session
+    if _session is None:
+        with _session_lock:
+            if _session is None:
+                _session = create_session()
+    return _session
+
+
+def get_limiter(host):
+    """获取域名对应的共享限速器"""
+    limiter = _limiters.get(host)
+    if limiter is None:
+        with _session_lock:
+            limiter = _limiters.setdefault(host, RateLimiter())
+    return limiter
+
+
+def limiter_stats():
+    """各域名限速器的监控计数"""
+    return {host: limiter.stats() for host, limiter in _limiters.items()}
+
+
+def get_timeout(url):
+    """按接口路径查找超时设置"""
+    path = urllib.parse.urlsplit(url).path
+    return ENDPOINT_TIMEOUTS.get(path, DEFAULT_TIMEOUT)
+
+
+def request(method, url, weight=None, orders=None, **kwargs):
+    """通过共享Session发送请求, 未指定timeout时按接口取默认值
+
+    weight / orders 覆盖接口默认的请求权重和下单数 (如批量下单按订单个数计)
+    """
+    parts = urllib.parse.urlsplit(url)
+    kwargs.setdefault('timeout', get_timeout(url))
+
+    default_weight, default_orders = request_cost(method, parts.path)
+    limiter = get_limiter(parts.netloc)
+    limiter.acquire(
+        default_weight if weight is None else weight,
+        default_orders if orders is None else orders,
+    )
+    try:
+        with metrics.span("rest", endpoint=parts.path):
+            response = get_session().request(method, url, **kwargs)
+    except requests.exceptions.RequestException as e:
+        metrics.incr("rest_failures", endpoint=parts.path, error=type(e).__name__)
+        raise
+    limiter.update_from_headers(response.headers, response.status_code)
+    if metrics.enabled():
+        if response.status_code >= 400:
+            metrics.incr("rest_errors", endpoint=parts.path, status=response.status_code)
+        retries = getattr(response.raw, 'retries', None)
+        if retries is not None and retries.history:
+            metrics.incr("rest_retries", len(retries.history), endpoint=parts.path)
+    return response
+
+
+def get(url, **kwargs):
+    return request("GET", url, **kwargs)
+
+
+def post(url, **kwargs):
+    return request("POST", url, **kwargs)
+
+
+def put(url, **kwargs):
+    return request("PUT", url, **kwargs)
+
+
+def delete(url, **kwargs):
+    return request("DELETE", url, **kwargs)
@@ -0,0 +1,194 @@
+# 执行日志 - 卖出任务的下单意图/提交/状态变化追加写入 SQLite (WAL), 进程被杀后可按日志和交易所订单恢复
+# 写入不在下单热路径上: record() 只把事件放进队列 (约1微秒), 后台线程按 FLUSH_INTERVAL 攒批,
+# 一个事务写入并提交 (synchronous=FULL, 每批一次fsync); 只有任务开始/结束同步等待落盘
+# 日志里没来得及落盘的订单也不会丢: clientOrderId 由 job_id 确定性派生 (order_manager.py),
+# 恢复时按前缀从交易所的开放/历史订单中找回 (market_trade.recover_job)
+# 用法:
+#   journal = Journal("trade_journal.db")
+#   journal.start_job(job_id, symbol, "SELL", quantity)
+#   manager = OrderManager(symbol, "SELL", quantity, job_id=job_id, journal=journal)
+#   ...
+#   journal.finish_job(job_id, "done")
+# 查看: sqlite3 trade_journal.db "select * from events where job_id = '...' order by seq"
+import contextlib
+import queue
+import sqlite3
+import threading
+import time
+
+JOURNAL_PATH = 'trade_journal.db'
+# 攒批间隔 (秒): 第一条事件到达后最多等待这么久再提交, 期间的事件合并为一次fsync
+FLUSH_INTERVAL = 0.05
+MAX_BATCH = 1000
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    job_id TEXT PRIMARY KEY,
+    symbol TEXT NOT NULL,
+    side TEXT NOT NULL,
+    quantity TEXT NOT NULL,
+    created REAL NOT NULL,
+    status TEXT NOT NULL,
+    finished REAL
+);
+CREATE TABLE IF NOT EXISTS events (
+    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+    job_id TEXT NOT NULL,
+    ts REAL NOT NULL,
+    kind TEXT NOT NULL,
+    client_order_id TEXT NOT NULL,
+    order_id TEXT,
+    quantity TEXT,
+    price TEXT,
+    status TEXT,
+    executed_qty TEXT
+);
+CREATE INDEX IF NOT EXISTS events_job ON events (job_id, seq);
+"""
+
+INSERT_EVENT = ("INSERT INTO events (job_id, ts, kind, client_order_id, order_id, quantity, price, status, executed_qty) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)")
+
+# 事件类型
+INTENT = "intent"   # 登记订单 (发送前): 数量、价格
+SUBMIT = "submit"   # 交易所已接受: orderId
+STATUS = "status"   # 状态/累计成交变化
+
+
+def connect(path):
+    conn = sqlite3.connect(path, check_same_thread=False)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=FULL")
+    conn.executescript(SCHEMA)
+    return conn
+
+
+class Journal:
+    """追加写入的执行日志, 后台线程攒批提交"""
+
+    def __init__(self, path=JOURNAL_PATH, flush_interval=FLUSH_INTERVAL):
+        self.path = path
+        self.flush_interval = flush_interval
+        self._conn = connect(path)
+        self._queue = queue.SimpleQueue()
+        self._closed = False
+        # 写入统计: 批次数、事件数、提交总耗时 (秒)
+        self.batches = 0
+        self.written = 0
+        self.commit_time = 0.0
+        self._writer = threading.Thread(target=self._run, daemon=True)
+        self._writer.start()
+
+    # ---------- 写入 ----------
+
+    def record(self, job_id, kind, client_order_id, order_id=None, quantity=None, price=None,
+               status=None, executed_qty=None):
+        """追加一条订单事件 (只入队, 不等待落盘)"""
+        self._queue.put((INSERT_EVENT, (
+            job_id, time.time(), kind, client_order_id,
+            None if order_id is None else str(order_id),
+            None if quantity is None else str(quantity),
+            None if price is None else str(price),
+            status,
+            None if executed_qty is None else str(executed_qty),
+        )))
+
+    def start_job(self, job_id, symbol, side, quantity):
+        """登记任务并等待落盘 (恢复时据此找回任务和总数量)"""
+        self._queue.put(("INSERT OR IGNORE INTO jobs (job_id, symbol, side, quantity, created, status) "
+                         "VALUES (?, ?, ?, ?, ?, 'running')", (job_id, symbol, side, str(quantity), time.time())))
+        self.flush()
+
+    def finish_job(self, job_id, status="done"):
+        """标记任务结束并等待落盘, 之后不会再被当作未完成任务恢复"""
+        self._queue.put(("UPDATE jobs SET status = ?, finished = ? WHERE job_id = ?", (status, time.time(), job_id)))
+        self.flush()
+
+    def flush(self, timeout=10):
+        """等待此前入队的所有写入提交完成"""
+        done = threading.Event()
+        self._queue.put(done)
+        return done.wait(timeout)
+
+    def close(self):
+        if self._closed:
+            return
+        self.flush()
+        self._closed = True
+        self._queue.put(None)
+        self._writer.join(timeout=5)
+        self._conn.close()
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                return
+            # 组提交: 第一条到达后等一个攒批间隔, 把期间的事件放进同一个事务
+            batch, waiters = [], []
+            deadline = time.monotonic() + self.flush_interval
+            while True:
+                if isinstance(item, threading.Event):
+                    waiters.append(item)
+                elif item is None:
+                    self._queue.put(None)
+                    break
+                else:
+                    batch.append(item)
+                if len(batch) >= MAX_BATCH:
+                    break
+                try:
+                    if waiters:
+                        # 有人在等落盘时不再等待攒批
+                        item = self._queue.get_nowait()
+                    else:
+                        item = self._queue.get(timeout=max(deadline - time.monotonic(), 0))
+                except queue.Empty:
+                    break
+            if batch:
+                self._write(batch)
+            for waiter in waiters:
+                waiter.set()
+
+    def _write(self, batch):
+        start = time.perf_counter()
+        try:
+            with self._conn:
+                for sql, params in batch:
+                    self._conn.execute(sql, params)
+        except sqlite3.Error as e:
+            print(f"写入执行日志失败 ({len(batch)}条): {e}")
+            return
+        self.commit_time += time.perf_counter() - start
+        self.batches += 1
+        self.written += len(batch)
+
+    def stats(self):
+        return {
+            "batches": self.batches,
+            "events": self.written,
+            "avg_batch": round(self.written / self.batches, 1) if self.batches else 0,
+            "avg_commit_ms": round(self.commit_time / self.batches * 1000, 3) if self.batches else 0,
+        }
+
+    # ---------- 读取 (恢复) ----------
+
+    def unfinished_jobs(self, symbol=None):
+        """未结束的任务 [{job_id, symbol, side, quantity, created}], 新的在前"""
+        sql = "SELECT job_id, symbol, side, quantity, created FROM jobs WHERE status = 'running'"
+        params = ()
+        if symbol is not None:
+            sql += " AND symbol = ?"
+            params = (symbol,)
+        with contextlib.closing(sqlite3.connect(self.path)) as conn:
+            rows = conn.execute(sql + " ORDER BY created DESC", params).fetchall()
+        return [dict(zip(("job_id", "symbol", "side", "quantity", "created"), row)) for row in rows]
+
+    def events(self, job_id):
+        """任务的所有订单事件, 按写入顺序"""
+        with contextlib.closing(sqlite3.connect(self.path)) as conn:
+            rows = conn.execute(
+                "SELECT kind, client_order_id, order_id, quantity, price, status, executed_qty "
+                "FROM events WHERE job_id = ? ORDER BY seq", (job_id,)).fetchall()
+        return [dict(zip(("kind", "clientOrderId", "orderId", "quantity", "price", "status", "executedQty"), row))
+                for row in rows]
@@ -0,0 +1,304 @@
+# 本地订单簿 - 一次REST快照 + WebSocket增量深度事件
+# 按更新ID顺序应用增量, 发现断档自动重新拉快照同步, 买一/卖一读取为O(1)内存操作
+# python local_orderbook.py --symbol ETH-250728-3600-C
+# 离线回放(不联网): python local_orderbook.py --symbol ETH-250728-3600-C \
+# --snapshot snapshot.json --replay events.jsonl
+# 离线测试时可将 base_url / ws_url 指向本地桩服务器
+import requests
+import argparse
+import bisect
+import json
+import threading
+import time
+
+import websocket
+
+import http_client
+
+# 币安期权API配置
+BASE_URL = "https://eapi.binance.com"
+WS_URL = "wss://nbstream.binance.com/eapi/ws"
+ORDERBOOK_ENDPOINT = '/eapi/v1/depth'
+DEPTH_STREAM = "{symbol}@depth1000@100ms"
+
+
+class BookSide:
+    """单边盘口: 升序价格列表 + 价格->数量字典"""
+
+    def __init__(self, descending):
+        self.descending = descending
+        self.prices = []
+        self.levels = {}
+
+    def clear(self):
+        self.prices = []
+        self.levels = {}
+
+    def update(self, price, qty):
+        """更新一个价位, 数量为0表示删除该价位"""
+        if qty == 0:
+            if price in self.levels:
+                del self.levels[price]
+                index = bisect.bisect_left(self.prices, price)
+                del self.prices[index]
+            return
+        if price not in self.levels:
+            bisect.insort(self.prices, price)
+        self.levels[price] = qty
+
+    def best(self):
+        """最优价位 (价格, 数量), 空盘返回None"""
+        if not self.prices:
+            return None
+        price = self.prices[-1] if self.descending else self.prices[0]
+        return price, self.levels[price]
+
+    def top(self, n):
+        """前n档, 格式与REST深度一致: [[价格, 数量], ...]"""
+        prices = self.prices[::-1][:n] if self.descending else self.prices[:n]
+        return [[price, self.levels[price]] for price in prices]
+
+
+class LocalOrderBook:
+    """本地维护的订单簿, 后台线程接收增量深度事件"""
+
+    def __init__(self, symbol, base_url=BASE_URL, ws_url=WS_URL,
+                 snapshot_limit=100, stream=DEPTH_STREAM):
+        self.symbol = symbol
+        self.base_url = base_url
+        self.ws_url = ws_url
+        self.snapshot_limit = snapshot_limit
+        self.stream = stream.format(symbol=symbol)
+
+        self.bids = BookSide(descending=True)
+        self.asks = BookSide(descending=False)
+        self.last_update_id = None
+        self.last_event_time = None
+        self.resync_count = 0
+
+        # 缓存的买一/卖一, 读取方无需加锁
+        self._best_bid = None
+        self._best_ask = None
+
+        self._lock = threading.Lock()
+        self._synced = threading.Event()
+        self._buffer = []
+        self._snapshot_pending = False
+        self._running = False
+        self._ws = None
+        self._thread = None
+
+    # ---------- 查询接口 ----------
+
+    def is_synced(self):
+        return self._synced.is_set()
+
+    def wait_synced(self, timeout=None):
+        """等待完成首次同步, 返回是否同步成功"""
+        return self._synced.wait(timeout)
+
+    def best_bid(self):
+        """买一 (价格, 数量), O(1)"""
+        return self._best_bid
+
+    def best_ask(self):
+        """卖一 (价格, 数量), O(1)"""
+        return self._best_ask
+
+    def depth(self, limit=10):
+        """前limit档深度, 格式与 /eapi/v1/depth 返回一致"""
+        with self._lock:
+            return {
+                "bids": self.bids.top(limit),
+                "asks": self.asks.top(limit),
+                "u": self.last_update_id,
+                "T": self.last_event_time,
+            }
+
+    # ---------- 同步逻辑 ----------
+
+    def fetch_snapshot(self):
+        """通过REST获取一次深度快照"""
+        params = {
+            "symbol": self.symbol,
+            "limit": self.snapshot_limit
+        }
+        response = http_client.get(self.base_url + ORDERBOOK_ENDPOINT, params=params)
+        response.raise_for_status()
+        return response.json()
+
+    def apply_snapshot(self, snapshot):
+        """应用快照, 然后重放缓冲区中快照之后的增量事件"""
+        with self._lock:
+            self.bids.clear()
+            self.asks.clear()
+            for price, qty in snapshot.get('bids', []):
+                self.bids.update(float(price), float(qty))
+            for price, qty in snapshot.get('asks', []):
+                self.asks.update(float(price), float(qty))
+            self.last_update_id = snapshot.get('u', snapshot.get('lastUpdateId'))
+            self.last_event_time = snapshot.get('T')
+            self._snapshot_pending = False
+
+            buffered, self._buffer = self._buffer, []
+            self._synced.set()
+            self._refresh_best()
+            for event in buffered:
+                if not self._apply_locked(event):
+                    break
+
+    def apply_event(self, event):
+        """应用一条增量深度事件 (WebSocket回调和离线回放共用)"""
+        with self._lock:
+            if not self._synced.is_set():
+                self._buffer.append(event)
+                return
+            self._apply_locked(event)
+
+    def replay(self, snapshot, events):
+        """离线回放: 先应用快照, 再依次应用增量事件"""
+        self.apply_snapshot(snapshot)
+        for event in events:
+            self.apply_event(event)
+
+    def _apply_locked(self, event):
+        """在持锁状态下应用事件, 发现断档返回False并触发重新同步"""
+        first_id = event.get('U')
+        final_id = event.get('u')
+        prev_id = event.get('pu')
+
+        # 快照之前的事件直接丢弃
+        if final_id is not None and final_id <= self.last_update_id:
+            return True
+
+        if not self._in_sequence(first_id, prev_id):
+            print(f"订单簿更新ID断档 (本地={self.last_update_id}, U={first_id}, pu={prev_id}), 重新同步...")
+            self._start_resync_locked(event)
+            return False
+
+        for price, qty in event.get('b', []):
+            self.bids.update(float(price), float(qty))
+        for price, qty in event.get('a', []):
+            self.asks.update(float(price), float(qty))
+        if final_id is not None:
+            self.last_update_id = final_id
+        self.last_event_time = event.get('T', event.get('E'))
+        self._refresh_best()
+        return True
+
+    def _in_sequence(self, first_id, prev_id):
+        """检查事件是否紧接本地的最后更新ID"""
+        if prev_id is not None and prev_id == self.last_update_id:
+            return True
+        if first_id is not None and first_id <= self.last_update_id + 1:
+            return True
+        return first_id is None and prev_id is None
+
+    def _start_resync_locked(self, event=None):
+        self._synced.clear()
+        self._buffer = [event] if event is not None else []
+        self.resync_count += 1
+        if self._running and not self._snapshot_pending:
+            self._snapshot_pending = True
+            threading.Thread(target=self._snapshot_worker, daemon=True).start()
+
+    def _refresh_best(self):
+        self._best_bid = self.bids.best()
+        self._best_ask = self.asks.best()
+
+    def _snapshot_worker(self):
+        while self._running:
+            try:
+                snapshot = self.fetch_snapshot()
+            except (requests.exceptions.RequestException, json.JSONDecodeError) as e:
+                print(f"获取订单簿快照失败: {e}, 1秒后重试...")
+                time.sleep(1)
+                continue
+            self.apply_snapshot(snapshot)
+            return
+
+    # ---------- WebSocket ----------
+
+    def start(self):
+        """启动后台WebSocket线程, 连接成功后拉取快照"""
+        self._running = True
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._running = False
+        if self._ws:
+            self._ws.close()
+        if self._thread:
+            self._thread.join(timeout=5)
+
+    def _run(self):
+        while self._running:
+            self._ws = websocket.WebSocketApp(
+                f"{self.ws_url}/{self.stream}",
+                on_open=self._on_open,
+                on_message=self._on_message,
+                on_error=self._on_error,
+            )
+            self._ws.run_forever(ping_interval=30, ping_timeout=10)
+            # 连接断开后必须重新同步
+            with self._lock:
+                self._synced.clear()
+                self._buffer = []
+            if self._running:
+                print("订单簿WebSocket断开, 1秒后重连...")
+                time.sleep(1)
+
+    def _on_open(self, ws):
+        with self._lock:
+            self._start_resync_locked()
+
+    def _on_message(self, ws, message):
+        try:
+            event = json.loads(message)
+        except json.JSONDecodeError as e:
+            print(f"解析深度事件失败: {e}")
+            return
+        # 组合流格式 {"stream": ..., "data": {...}}
+        if 'data' in event:
+            event = event['data']
+        self.apply_event(event)
+
+    def _on_error(self, ws, error):
+        print(f"订单簿WebSocket错误: {error}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='币安期权本地订单簿')
+    parser.add_argument('--symbol', required=True, help='期权交易对，例如: ETH-250728-3600-C')
+    parser.add_argument('--base-url', default=BASE_URL, help='REST地址 (默认: 币安期权)')
+    parser.add_argument('--ws-url', default=WS_URL, help='WebSocket地址 (默认: 币安期权)')
+    parser.add_argument('--snapshot', help='离线回放: 快照JSON文件')
+    parser.add_argument('--replay', help='离线回放: 增量事件JSONL文件')
+    args = parser.parse_args()
+
+    book = LocalOrderBook(args.symbol, base_url=args.base_url, ws_url=args.ws_url)
+
+    if args.replay:
+        with open(args.snapshot) as f:
+            snapshot = json.load(f)
+        with open(args.replay) as f:
+            events = [json.loads(line) for line in f if line.strip()]
+        book.replay(snapshot, events)
+        print(f"回放完成: 更新ID={book.last_update_id}, 重新同步次数={book.resync_count}")
+        print(f"买一: {book.best_bid()}, 卖一: {book.best_ask()}")
+        return
+
+    book.start()
+    if not book.wait_synced(timeout=10):
+        print("10秒内未完成订单簿同步")
+    try:
+        while True:
+            print(f"买一: {book.best_bid()}, 卖一: {book.best_ask()}, 更新ID: {book.last_update_id}")
+            time.sleep(1)
+    except KeyboardInterrupt:
+        book.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -3,14 +3,28 @@
 # python market_trade.py --symbol ETH-250730-3700-P \
 # --quantity 1 \
 # --discount 2
+# 进程中断后 (被杀/断电), 从执行日志和交易所订单恢复, 按确切的剩余数量继续:
+# python market_trade.py --symbol ETH-250730-3700-P --resume
 import requests
 import argparse
 import json
 import time
-import hmac
-import hashlib
-import urllib.parse
 from datetime import datetime
+from decimal import Decimal
+
+import http_client
+import metrics
+from exchange_info import ExchangeInfo
+from journal import JOURNAL_PATH, Journal
+from local_orderbook import LocalOrderBook
+from order_tracker import OrderTracker
+from order_manager import OrderManager, to_decimal
+from risk_book import RiskBook
+from risk_gate import RiskGate, load_limits
+import schedulers
+from schedulers import STRATEGIES, TouchScheduler, make_scheduler
+from signer import RequestSigner
+from time_sync import TimeSync, is_timestamp_error
 
 # 币安期权API配置
 BASE_URL = "https://eapi.binance.com"
@@ -18,22 +32,84 @@ ORDERBOOK_ENDPOINT = '/eapi/v1/depth'
 ORDER_ENDPOINT = '/eapi/v1/order'
 OPEN_ORDERS_ENDPOINT = '/eapi/v1/openOrders'
 HISTORY_ORDERS_ENDPOINT = '/eapi/v1/historyOrders'
+BATCH_ORDERS_ENDPOINT = '/eapi/v1/batchOrders'
+
+# 批量下单接口单次最多10个订单
+MAX_BATCH_ORDERS = 10
+# 恢复任务时历史订单每页条数 (接口上限1000)
+HISTORY_PAGE_LIMIT = 1000
 
 # API密钥配置 - 请填入你的实际密钥
 API_KEY = ""  # 请替换为你的实际API Key
 SECRET_KEY = ""  # 请替换为你的实际Secret Key
+RECV_WINDOW = 5000
+
+# 服务器时间同步: 签名时间戳使用校准后的时钟
+TIME_SYNC = TimeSync(BASE_URL)
+
+# 交易规则缓存: tickSize / stepSize / 名义价值, 启动时读磁盘缓存
+EXCHANGE_INFO = ExchangeInfo(BASE_URL)
+
+# 共享签名器: 预置密钥的HMAC状态, 所有签名请求复用
+SIGNER = RequestSigner(API_KEY, SECRET_KEY, recv_window=RECV_WINDOW, time_source=TIME_SYNC.now)
+
+# 下单前风控, 由 main()/守护进程设置; 为None时不检查
+RISK_GATE = None
+
+# WebSocket地址 (本地订单簿/用户数据流), None为各组件默认的币安期权地址; 由 configure_endpoints 设置
+WS_URL = None
+
+# 失败重试的退避等待: 从0.25秒起指数增长, 最多5秒
+# 正常情况下不再固定sleep, 请求节奏由 http_client 的限速器按剩余额度控制
+RETRY_BASE_DELAY = 0.25
+RETRY_MAX_DELAY = 5
+
+# 下单超时后按 clientOrderId 确认并重发的最多次数
+SUBMIT_RETRIES = 3
+
+# 恢复任务时向前多查的历史订单时间 (毫秒), 覆盖本地与服务器的时钟偏差
+RECOVER_LOOKBACK_MS = 60000
+
+# 交易所返回的"订单不存在"错误码
+ORDER_NOT_FOUND = -2013
+# 订单是否已创建无法确认 (提交超时且查询失败): query_order / send_limit_order / send_batch_orders 的返回值,
+# 调用方不能当作被拒绝, 需保持订单未结束, 按 clientOrderId 对账 (recover_job) 后再按剩余数量下单
+ORDER_UNKNOWN = "UNKNOWN"
+
+def configure_endpoints(base_url, ws_url=None):
+    """把共享组件 (签名请求/时间同步/交易规则缓存) 指向指定地址 (如测试网或本地模拟交易所)
+
+    交易规则缓存按地址分开存放 (exchange_info.py); ws_url 供 ws_options() 创建订单簿和用户数据流
+    """
+    global BASE_URL, WS_URL
+    if ws_url:
+        WS_URL = ws_url
+    if base_url == BASE_URL:
+        return
+    BASE_URL = base_url
+    TIME_SYNC.base_url = base_url
+    EXCHANGE_INFO.base_url = base_url
 
-def get_timestamp():
-    """获取当前时间戳"""
-    return int(time.time() * 1000)
+def ws_options():
+    """创建 LocalOrderBook / OrderTracker 时的 ws_url 参数"""
+    return {"ws_url": WS_URL} if WS_URL else {}
 
-def create_signature(query_string, secret_key):
-    """创建签名"""
-    return hmac.new(
-        secret_key.encode('utf-8'),
-        query_string.encode('utf-8'),
-        hashlib.sha256
-    ).hexdigest()
+def retry_delay(attempt):
+    """第attempt次连续失败后的等待秒数"""
+    return min(RETRY_BASE_DELAY * 2 ** attempt, RETRY_MAX_DELAY)
+
+def backoff(delay, reason):
+    """失败退避等待, 计入重试次数和等待耗时"""
+    metrics.incr("retries", reason=reason)
+    with metrics.span("stage", stage="backoff"):
+        time.sleep(delay)
+
+def calculate_order_price(best_bid_price, best_ask_price, discount):
+    """挂单价格: 卖一减折扣; 若不高于买一则直接挂卖一价格"""
+    calculated_price = best_ask_price - discount
+    if calculated_price <= best_bid_price:
+        return best_ask_price
+    return calculated_price
 
 def get_orderbook(symbol, limit=100):
     """获取订单簿深度数据"""
@@ -43,7 +119,7 @@ def get_orderbook(symbol, limit=100):
     }
     
     try:
-        response = requests.get(BASE_URL + ORDERBOOK_ENDPOINT, params=params, timeout=10)
+        response = http_client.get(BASE_URL + ORDERBOOK_ENDPOINT, params=params)
         response.raise_for_status()
         orderbook = response.json()
         
@@ -60,10 +136,72 @@ def get_orderbook(symbol, limit=100):
         print(f"解析订单簿数据失败: {e}")
         return None
 
-def send_limit_order(symbol, side, quantity, price):
-    """发送限价订单"""
-    timestamp = get_timestamp()
-    
+def get_top_of_book(symbol, book=None):
+    """获取盘口: 本地订单簿已同步时直接读内存, 否则回退到REST快照"""
+    if book is not None and book.is_synced():
+        best_bid = book.best_bid()
+        best_ask = book.best_ask()
+        return {
+            "bids": [list(best_bid)] if best_bid else [],
+            "asks": [list(best_ask)] if best_ask else [],
+        }
+    return get_orderbook(symbol)
+
+def get_depth(symbol, book=None, limit=10):
+    """获取多档深度: 本地订单簿已同步时直接读内存, 否则回退到REST快照"""
+    if book is not None and book.is_synced():
+        return book.depth(limit)
+    return get_orderbook(symbol)
+
+def build_ladder(orderbook, remaining_qty, discount, levels, filters=None):
+    """把剩余数量按深度拆成多档挂单, 返回 [(价格, 数量), ...]
+
+    每档价格为该档卖价减折扣 (不高于买一时挂该档卖价), 数量不超过该档卖量
+    """
+    best_bid_price = float(orderbook['bids'][0][0])
+    ladder = []
+    left = remaining_qty
+    for ask_price, ask_qty in orderbook['asks'][:levels]:
+        if left <= 0:
+            break
+        order_price = calculate_order_price(best_bid_price, float(ask_price), discount)
+        order_qty = min(to_decimal(ask_qty), left)
+        if filters is not None:
+            order_price = filters.quantize_price(order_price, "SELL")
+            order_qty = filters.quantize_qty(order_qty)
+            if filters.validate(order_price, order_qty):
+                continue
+        if order_qty <= 0:
+            continue
+        ladder.append((order_price, order_qty))
+        left -= order_qty
+    return ladder
+
+def trading_halted():
+    """风控停止下单 (停止开关/日内亏损上限) 时返回原因, 否则返回None"""
+    if RISK_GATE is None:
+        return None
+    return RISK_GATE.halt_reason()
+
+def pre_trade_check(symbol, side, quantity, price, best_bid=None, best_ask=None):
+    """下单前风控检查, 不通过时打印原因并返回False"""
+    if RISK_GATE is None:
+        return True
+    reason = RISK_GATE.check(symbol, side, quantity, price, best_bid, best_ask)
+    if reason is not None:
+        print(f"风控拒绝下单: {reason}")
+        return False
+    return True
+
+def send_limit_order(symbol, side, quantity, price, client_order_id=None, best_bid=None, best_ask=None):
+    """发送限价订单
+
+    指定 client_order_id 时, 超时/连接中断后先按 clientOrderId 查询订单是否已创建,
+    未创建才用同一个 clientOrderId 重发, 不会重复下单; 重试后仍无法确认时返回 ORDER_UNKNOWN;
+    发送前经过风控检查 (best_bid/best_ask 为计算价格时的盘口), 不通过返回None
+    """
+    if not pre_trade_check(symbol, side, quantity, price, best_bid, best_ask):
+        return None
     params = {
         "symbol": symbol,
         "side": side,
@@ -71,15 +209,107 @@ def send_limit_order(symbol, side, quantity, price):
         "quantity": str(quantity),
         "price": str(price),
         "timeInForce": "GTC",
-        "timestamp": timestamp
+        "clientOrderId": client_order_id
     }
     
-    # 创建查询字符串和签名
-    query_string = urllib.parse.urlencode(params)
-    signature = create_signature(query_string, SECRET_KEY)
+    headers = {
+        'X-MBX-APIKEY': API_KEY,
+        'Content-Type': 'application/x-www-form-urlencoded'
+    }
     
-    # 构建完整URL
-    url = f"{BASE_URL}{ORDER_ENDPOINT}?{query_string}&signature={signature}"
+    for attempt in range(SUBMIT_RETRIES + 1):
+        # 签名并构建完整URL (每次重发重新取时间戳)
+        url = SIGNER.signed_url(BASE_URL, ORDER_ENDPOINT, params)
+        
+        try:
+            response = http_client.post(url, headers=headers)
+            if is_timestamp_error(response):
+                # 时间戳超出接收窗口说明订单已被拒绝: 立即重新同步并重新签名发送, 不再盲等重试
+                print("时间戳超出接收窗口, 重新同步服务器时间...")
+                metrics.incr("retries", reason="timestamp")
+                TIME_SYNC.sync()
+                url = SIGNER.signed_url(BASE_URL, ORDER_ENDPOINT, params)
+                response = http_client.post(url, headers=headers)
+            if not response.ok and client_order_id and attempt > 0:
+                # 重发被拒绝时, 可能是前一次请求其实已经下单成功
+                existing = query_order(symbol, client_order_id=client_order_id)
+                if existing == ORDER_UNKNOWN:
+                    print(f"重发被拒绝且查询订单失败, 无法确认是否已下单: {client_order_id}")
+                    return ORDER_UNKNOWN
+                if existing:
+                    print(f"订单已存在! 订单ID: {existing['orderId']}, clientOrderId: {client_order_id}")
+                    return existing['orderId']
+            response.raise_for_status()
+            order_result = response.json()
+            
+            if 'orderId' in order_result:
+                print(f"下单成功! 订单ID: {order_result['orderId']}, 价格: {price}, 数量: {quantity}")
+                return order_result['orderId']
+            else:
+                print(f"下单失败: {order_result}")
+                return None
+                
+        except (requests.exceptions.Timeout, requests.exceptions.ConnectionError) as e:
+            if not client_order_id:
+                print(f"下单请求失败: {e}")
+                return None
+            print(f"下单请求超时或连接中断: {e}, 按clientOrderId查询是否已下单...")
+            existing = query_order(symbol, client_order_id=client_order_id)
+            if existing and existing != ORDER_UNKNOWN:
+                print(f"订单已存在! 订单ID: {existing['orderId']}, clientOrderId: {client_order_id}")
+                return existing['orderId']
+            if attempt == SUBMIT_RETRIES:
+                break
+            if existing == ORDER_UNKNOWN:
+                # 查询也失败: 同一 clientOrderId 重发是安全的 (已创建时交易所拒绝重复)
+                print(f"查询订单失败, 使用同一clientOrderId重发 (第{attempt + 1}/{SUBMIT_RETRIES}次)")
+            else:
+                print(f"订单未创建, 使用同一clientOrderId重发 (第{attempt + 1}/{SUBMIT_RETRIES}次)")
+            metrics.incr("retries", reason="submit_timeout")
+        except requests.exceptions.RequestException as e:
+            print(f"下单请求失败: {e}")
+            return None
+        except json.JSONDecodeError as e:
+            # 请求已被处理但响应无法解析, 订单可能已创建
+            print(f"解析下单响应失败: {e}")
+            return ORDER_UNKNOWN if client_order_id else None
+    
+    # 最后一次请求也超时: 可能仍在途中, 不能当作未下单
+    print(f"下单重试{SUBMIT_RETRIES}次仍未确认, 订单状态未知, 需对账后再继续")
+    return ORDER_UNKNOWN
+
+def send_batch_orders(symbol, side, orders, best_bid=None, best_ask=None):
+    """批量下限价单 (一次请求最多10个)
+
+    orders 为 [(数量, 价格, clientOrderId), ...], 返回对应的 orderId 列表, 失败项为None。
+    请求超时时按 clientOrderId 逐个确认哪些订单已创建, 不重发, 无法确认的项为 ORDER_UNKNOWN。
+    未通过风控检查的订单不发送, 对应位置为None。
+    """
+    orders = orders[:MAX_BATCH_ORDERS]
+    allowed = [pre_trade_check(symbol, side, quantity, price, best_bid, best_ask) for quantity, price, _ in orders]
+    checked = [order for order, ok in zip(orders, allowed) if ok]
+    order_ids = iter(_post_batch_orders(symbol, side, checked) if checked else [])
+    return [next(order_ids) if ok else None for ok in allowed]
+
+def _post_batch_orders(symbol, side, orders):
+    """发送一批已通过风控的订单, 返回 orderId 列表"""
+    batch = [
+        {
+            "symbol": symbol,
+            "side": side,
+            "type": "LIMIT",
+            "quantity": str(quantity),
+            "price": str(price),
+            "timeInForce": "GTC",
+            "clientOrderId": client_order_id
+        }
+        for quantity, price, client_order_id in orders
+    ]
+    params = {
+        "orders": json.dumps(batch, separators=(',', ':'))
+    }
+    
+    url = SIGNER.signed_url(BASE_URL, BATCH_ORDERS_ENDPOINT, params)
     
     headers = {
         'X-MBX-APIKEY': API_KEY,
@@ -87,46 +317,163 @@ def send_limit_order(symbol, side, quantity, price):
     }
     
     try:
-        response = requests.post(url, headers=headers, timeout=10)
+        response = http_client.post(url, headers=headers, orders=len(batch))
+        response.raise_for_status()
+        results = response.json()
+    except (requests.exceptions.Timeout, requests.exceptions.ConnectionError) as e:
+        print(f"批量下单请求超时或连接中断: {e}, 按clientOrderId确认订单...")
+        order_ids = []
+        for item in batch:
+            existing = query_order(symbol, client_order_id=item["clientOrderId"])
+            if existing == ORDER_UNKNOWN:
+                order_ids.append(ORDER_UNKNOWN)
+            else:
+                order_ids.append(existing['orderId'] if existing else None)
+        return order_ids
+    except requests.exceptions.RequestException as e:
+        print(f"批量下单请求失败: {e}")
+        return [None] * len(batch)
+    except json.JSONDecodeError as e:
+        print(f"解析批量下单响应失败: {e}")
+        return [None] * len(batch)
+    
+    order_ids = []
+    for item, result in zip(batch, results):
+        if 'orderId' in result:
+            print(f"下单成功! 订单ID: {result['orderId']}, 价格: {item['price']}, 数量: {item['quantity']}")
+            order_ids.append(result['orderId'])
+        else:
+            print(f"下单失败: {result}")
+            order_ids.append(None)
+    return order_ids
+
+def cancel_batch_orders(symbol, order_ids):
+    """批量撤单, 返回 {orderId: (status, executed_qty)}, 撤单失败的订单不在结果中"""
+    params = {
+        "symbol": symbol,
+        "orderIds": json.dumps(list(order_ids), separators=(',', ':'))
+    }
+    
+    url = SIGNER.signed_url(BASE_URL, BATCH_ORDERS_ENDPOINT, params)
+    
+    try:
+        response = http_client.delete(url, headers=SIGNER.headers)
+        response.raise_for_status()
+        results = response.json()
+    except requests.exceptions.RequestException as e:
+        print(f"批量撤单请求失败: {e}")
+        return {}
+    except json.JSONDecodeError as e:
+        print(f"解析批量撤单响应失败: {e}")
+        return {}
+    
+    cancelled = {}
+    for result in results:
+        if 'orderId' in result and 'status' in result:
+            cancelled[result['orderId']] = (result['status'], float(result['executedQty']))
+        else:
+            print(f"撤单失败: {result}")
+    print(f"批量撤单完成: {len(cancelled)}/{len(order_ids)}")
+    return cancelled
+
+def wait_for_orders(manager, tracker, live_orders, timeout):
+    """等待一组订单全部结束, 最多等待timeout秒; live_orders 为 {clientOrderId: orderId}"""
+    deadline = time.monotonic() + timeout
+    known = {}
+    while True:
+        active = {live_orders[coid]: coid for coid in live_orders if not manager.is_final(coid)}
+        if not active:
+            return
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            return
+        # 任意一档有回报就醒来处理, 不逐单等待
+        changed = tracker.wait_for_any(
+            {order_id: known.get(coid) for order_id, coid in active.items()}, timeout=remaining)
+        for order_id, (status, executed_qty) in changed.items():
+            client_order_id = active[order_id]
+            known[client_order_id] = (status, executed_qty)
+            manager.update(client_order_id, status, executed_qty)
+            print(f"订单 {order_id}: 状态={status}, 已成交={executed_qty}")
+
+def query_order(symbol, order_id=None, client_order_id=None):
+    """按 orderId 或 clientOrderId 查询单个订单
+
+    交易所确认订单不存在时返回None; 查询失败 (网络错误/其他错误响应) 返回 ORDER_UNKNOWN
+    """
+    params = {
+        "symbol": symbol,
+        "orderId": order_id,
+        "clientOrderId": client_order_id
+    }
+    
+    url = SIGNER.signed_url(BASE_URL, ORDER_ENDPOINT, params)
+    
+    try:
+        response = http_client.get(url, headers=SIGNER.headers)
+        order = response.json()
+        if not response.ok:
+            if isinstance(order, dict) and order.get('code') == ORDER_NOT_FOUND:
+                return None
+            print(f"查询订单失败: {order}")
+            return ORDER_UNKNOWN
+        return order if 'orderId' in order else ORDER_UNKNOWN
+    except requests.exceptions.RequestException as e:
+        print(f"查询订单失败: {e}")
+        return ORDER_UNKNOWN
+    except json.JSONDecodeError as e:
+        print(f"解析订单响应失败: {e}")
+        return ORDER_UNKNOWN
+
+def cancel_order(symbol, order_id):
+    """撤销订单, 返回撤单时的 (status, executed_qty); 撤单失败(如已成交)返回 (None, 0)"""
+    params = {
+        "symbol": symbol,
+        "orderId": order_id
+    }
+    
+    url = SIGNER.signed_url(BASE_URL, ORDER_ENDPOINT, params)
+    
+    try:
+        response = http_client.delete(url, headers=SIGNER.headers)
         response.raise_for_status()
         order_result = response.json()
         
-        if 'orderId' in order_result:
-            print(f"下单成功! 订单ID: {order_result['orderId']}, 价格: {price}, 数量: {quantity}")
-            return order_result['orderId']
+        if 'status' in order_result:
+            print(f"撤单成功! 订单ID: {order_id}, 已成交: {order_result['executedQty']}")
+            return order_result['status'], float(order_result['executedQty'])
         else:
-            print(f"下单失败: {order_result}")
-            return None
+            print(f"撤单失败: {order_result}")
+            return None, 0
             
     except requests.exceptions.RequestException as e:
-        print(f"下单请求失败: {e}")
-        return None
+        print(f"撤单请求失败: {e}")
+        return None, 0
     except json.JSONDecodeError as e:
-        print(f"解析下单响应失败: {e}")
-        return None
+        print(f"解析撤单响应失败: {e}")
+        return None, 0
+
+def is_order_undercut(symbol, order_price, book=None):
+    """挂单是否已不是卖一 (有人挂出更低的卖价)"""
+    orderbook = get_top_of_book(symbol, book)
+    if not orderbook or not orderbook.get('asks'):
+        return False
+    return float(orderbook['asks'][0][0]) < order_price
 
 def check_order_status(symbol, order_id):
     """查询订单状态 - 先查开放订单，再查历史订单"""
-    timestamp = get_timestamp()
-    
     # 第一步: 查询开放订单 (活跃状态: ACCEPTED, PARTIALLY_FILLED)
     params = {
-        "symbol": symbol,
-        "timestamp": timestamp
+        "symbol": symbol
     }
     
-    query_string = urllib.parse.urlencode(params)
-    signature = create_signature(query_string, SECRET_KEY)
-    
-    url = f"{BASE_URL}{OPEN_ORDERS_ENDPOINT}?{query_string}&signature={signature}"
+    url = SIGNER.signed_url(BASE_URL, OPEN_ORDERS_ENDPOINT, params)
     
-    headers = {
-        'X-MBX-APIKEY': API_KEY
-    }
+    headers = SIGNER.headers
     
     try:
         # 查询开放订单
-        response = requests.get(url, headers=headers, timeout=10)
+        response = http_client.get(url, headers=headers)
         response.raise_for_status()
         open_orders = response.json()
         
@@ -143,16 +490,13 @@ def check_order_status(symbol, order_id):
         
         history_params = {
             "symbol": symbol,
-            "orderId": order_id,
-            "timestamp": get_timestamp()  # 重新获取时间戳
+            "orderId": order_id
         }
         
-        history_query_string = urllib.parse.urlencode(history_params)
-        history_signature = create_signature(history_query_string, SECRET_KEY)
+        # 签名时重新获取时间戳
+        history_url = SIGNER.signed_url(BASE_URL, HISTORY_ORDERS_ENDPOINT, history_params)
         
-        history_url = f"{BASE_URL}{HISTORY_ORDERS_ENDPOINT}?{history_query_string}&signature={history_signature}"
-        
-        history_response = requests.get(history_url, headers=headers, timeout=10)
+        history_response = http_client.get(history_url, headers=headers)
         history_response.raise_for_status()
         history_orders = history_response.json()
         
@@ -182,44 +526,160 @@ def check_order_status(symbol, order_id):
         print(f"解析订单状态响应失败: {e}")
         return None, 0
 
-def main():
-    # 命令行参数解析
-    parser = argparse.ArgumentParser(description='币安期权贴卖一卖程序')
-    parser.add_argument('--symbol', required=True, help='期权交易对，例如: ETH-250728-3600-C')
-    parser.add_argument('--quantity', type=float, required=True, help='总卖出数量')
-    parser.add_argument('--side', default='SELL', help='交易方向(默认: SELL)')
-    parser.add_argument('--discount', type=float, default=5.0, help='相对卖一的折扣(默认: 5.0)')
-    
-    args = parser.parse_args()
-    
-    # 检查API密钥配置
-    if API_KEY == "your_api_key_here" or SECRET_KEY == "your_secret_key_here":
-        print("错误: 请先配置你的API密钥!")
-        print("请在代码中将API_KEY和SECRET_KEY替换为你的实际密钥")
-        return
-    
-    # 检查是否为卖单
-    if args.side.upper() != "SELL":
-        print("这个程序只支持卖出(SELL)操作")
-        return
-    
-    completed_qty = 0.0
+def fetch_job_orders(symbol, prefix, since_ms):
+    """批量拉取 since_ms 之后 clientOrderId 带指定前缀的订单 (开放订单 + 分页历史订单), 失败返回None"""
+    orders = {}
+    try:
+        response = http_client.get(SIGNER.signed_url(BASE_URL, OPEN_ORDERS_ENDPOINT, {"symbol": symbol}),
+                                   headers=SIGNER.headers)
+        response.raise_for_status()
+        pages = [response.json()]
+        params = {"symbol": symbol, "startTime": since_ms, "limit": HISTORY_PAGE_LIMIT}
+        while True:
+            response = http_client.get(SIGNER.signed_url(BASE_URL, HISTORY_ORDERS_ENDPOINT, params),
+                                       headers=SIGNER.headers)
+            response.raise_for_status()
+            page = response.json()
+            pages.append(page)
+            if len(page) < HISTORY_PAGE_LIMIT:
+                break
+            # 按 orderId 向后翻页
+            params = {"symbol": symbol, "orderId": max(order['orderId'] for order in page) + 1,
+                      "limit": HISTORY_PAGE_LIMIT}
+    except requests.exceptions.RequestException as e:
+        print(f"拉取订单列表失败: {e}")
+        return None
+    except json.JSONDecodeError as e:
+        print(f"解析订单列表失败: {e}")
+        return None
+
+    for page in pages:
+        for order in page:
+            if str(order.get('clientOrderId', '')).startswith(prefix):
+                # 开放订单在前, 同一订单以先出现的为准
+                orders.setdefault(order['clientOrderId'], order)
+    return list(orders.values())
+
+def recover_job(manager, since_ms):
+    """恢复中断的任务: 按交易所订单校正日志回放的状态, 撤掉遗留挂单, 之后 remaining_qty 即确切的剩余数量
+
+    日志里没有落盘的订单按 clientOrderId 前缀从交易所找回; 日志里有但订单列表里没有的订单逐个按 clientOrderId
+    查询, 交易所明确返回订单不存在时才视为未被接受; 卖出循环中提交结果未知 (ORDER_UNKNOWN) 的订单也由此对账后才继续下单;
+    拉取订单列表失败、有查询失败的订单或有撤不掉的挂单时返回False, 调用方不应继续卖出
+    """
+    symbol = manager.symbol
+    orders = fetch_job_orders(symbol, manager.client_id_prefix, since_ms)
+    if orders is None:
+        return False
+
+    live = {}
+    for order in orders:
+        client_order_id = order['clientOrderId']
+        manager.adopt(client_order_id, order['quantity'], order['price'])
+        if manager.get(client_order_id)["orderId"] is None:
+            manager.bind(client_order_id, order['orderId'])
+        manager.update(client_order_id, order['status'], order['executedQty'])
+        if order['status'] in ("ACCEPTED", "PARTIALLY_FILLED"):
+            live[order['orderId']] = client_order_id
+    print(f"交易所找回本任务订单 {len(orders)} 个, 其中挂单中 {len(live)} 个")
+
+    # 日志里登记了但列表里没有的订单: 可能是发送前中断或被拒绝, 也可能是超时的请求仍在途中或尚未进入历史列表,
+    # 逐个确认, 只有交易所明确返回不存在 (-2013) 才记为拒绝; 查询失败的保持未结束, 稍后再对账
+    found = {order['clientOrderId'] for order in orders}
+    for client_order_id, order in list(manager.orders.items()):
+        if client_order_id in found or manager.is_final(client_order_id):
+            continue
+        existing = query_order(symbol, client_order_id=client_order_id)
+        if existing is None:
+            manager.update(client_order_id, "REJECTED", order["executedQty"])
+        elif existing == ORDER_UNKNOWN:
+            print(f"订单 {client_order_id} 查询失败, 暂不能确认是否已下单")
+        else:
+            if order["orderId"] is None:
+                manager.bind(client_order_id, existing['orderId'])
+            manager.update(client_order_id, existing['status'], existing['executedQty'])
+            if existing['status'] in ("ACCEPTED", "PARTIALLY_FILLED"):
+                live[existing['orderId']] = client_order_id
+
+    # 遗留挂单按当前盘口已不合适, 撤掉后由卖出循环重新挂
+    order_ids = list(live)
+    for start in range(0, len(order_ids), MAX_BATCH_ORDERS):
+        chunk = order_ids[start:start + MAX_BATCH_ORDERS]
+        cancelled = cancel_batch_orders(symbol, chunk)
+        for order_id in chunk:
+            status, executed_qty = cancelled.get(order_id) or check_order_status(symbol, order_id)
+            if status is not None:
+                manager.update(live[order_id], status, executed_qty)
+
+    # 仍有撤不掉的挂单或未确认的订单时不能按剩余数量继续卖, 否则可能超卖
+    if manager.open_qty > 0:
+        print(f"仍有未结束的遗留挂单 (未成交 {manager.open_qty}), 请人工确认后再恢复")
+        return False
+    return True
+
+def run_sell(symbol, quantity, discount=5.0, book=None, tracker=None, filters=None, manager=None,
+             chase=False, min_requote_interval=1.0, max_requotes=20, ladder=1, ladder_timeout=30.0,
+             stop_event=None, scheduler=None):
+    """执行一个贴卖一卖出任务, 直到卖完或 stop_event 被设置, 返回 OrderManager
+
+    book / tracker 由调用方启动和停止, 守护进程可以在多个任务之间复用;
+    filters 默认取交易规则缓存, manager 默认按 symbol/quantity 新建;
+    scheduler (schedulers.py) 决定逐单模式下每片的数量/间隔/最长挂单时间, 默认按卖一数量挂单
+    """
+    filters = filters or EXCHANGE_INFO.get(symbol)
+    manager = manager or OrderManager(symbol, "SELL", quantity)
+    if filters is None:
+        print(f"交易对不存在: {symbol}")
+        return manager
+    if tracker is None:
+        # 未启动数据流的跟踪器, 订单状态全部走REST对账
+        tracker = OrderTracker(API_KEY, BASE_URL, reconcile=lambda oid: check_order_status(symbol, oid))
     
-    print(f"开始执行期权卖出程序")
-    print(f"交易对: {args.symbol}")
-    print(f"总数量: {args.quantity}")
-    print(f"折扣: {args.discount}")
-    print("-" * 50)
+    failures = 0
+    requotes = 0
+    # 每轮下单提交耗时 (秒) 和订单数, 用于比较逐单与批量下单的延迟
+    submit_latencies = []
+    submitted_orders = 0
+    ladder_levels = min(ladder, MAX_BATCH_ORDERS)
+    scheduler = scheduler or TouchScheduler()
+    scheduler.start(manager)
+    # 对账时拉取的历史订单起点: 本次执行开始之前的订单已由恢复流程 (recover_job) 处理
+    reconcile_since = int(TIME_SYNC.now()) - RECOVER_LOOKBACK_MS
     
-    while completed_qty < args.quantity:
-        remaining_qty = args.quantity - completed_qty
+    while manager.remaining_qty > 0:
+        if stop_event is not None and stop_event.is_set():
+            print("任务已取消, 停止挂单")
+            break
+        halted = trading_halted()
+        if halted is not None:
+            # 停止开关/日内亏损上限下重试只会不断被拒, 直接结束任务
+            print(f"风控已停止下单 ({halted}), 结束任务")
+            break
+        if manager.open_qty > 0:
+            # 有结果未确认的订单 (提交超时且查询失败/撤单后状态未知): 可能仍在交易所挂着,
+            # 先按 clientOrderId 前缀对账并撤掉, 确认成交数量后才能按剩余数量继续挂单, 否则可能超卖
+            print(f"有未确认的订单 (未成交 {manager.open_qty}), 对账后再继续...")
+            if not recover_job(manager, reconcile_since):
+                delay = retry_delay(failures)
+                failures += 1
+                print(f"订单对账未完成，等待{delay}秒后重试...")
+                backoff(delay, "reconcile")
+                continue
+        remaining_qty = manager.remaining_qty
         print(f"剩余待卖数量: {remaining_qty}")
+        slice_start = time.perf_counter()
         
-        # 获取订单簿
-        orderbook = get_orderbook(args.symbol)
+        # 获取订单簿 (阶梯模式需要多档深度)
+        with metrics.span("stage", stage="depth"):
+            if ladder_levels > 1 or scheduler.depth_levels > 1:
+                orderbook = get_depth(symbol, book, max(ladder_levels, scheduler.depth_levels))
+            else:
+                orderbook = get_top_of_book(symbol, book)
         if not orderbook or not orderbook.get('bids') or not orderbook.get('asks'):
-            print("无法获取订单簿或无买卖单深度，等待5秒后重试...")
-            time.sleep(5)
+            delay = retry_delay(failures)
+            failures += 1
+            print(f"无法获取订单簿或无买卖单深度，等待{delay}秒后重试...")
+            backoff(delay, "orderbook")
             continue
         
         # 获取买一和卖一价格数量
@@ -232,66 +692,416 @@ def main():
         print(f"当前卖一: 价格={best_ask_price}, 数量={best_ask_qty}")
         
         if best_ask_qty == 0:
-            print("卖一数量为0，等待5秒后重试...")
-            time.sleep(5)
+            delay = retry_delay(failures)
+            failures += 1
+            print(f"卖一数量为0，等待{delay}秒后重试...")
+            backoff(delay, "empty_ask")
             continue
         
-        # 计算挂单价格（比卖一便宜指定折扣）
-        calculated_price = best_ask_price - args.discount
+        # 阶梯模式: 多档一次批量提交, 超时后批量撤掉剩余挂单
+        if ladder_levels > 1:
+            ladder = build_ladder(orderbook, remaining_qty, discount, ladder_levels, filters)
+            if not ladder:
+                delay = retry_delay(failures)
+                failures += 1
+                print(f"无法按深度生成符合交易规则的挂单，等待{delay}秒后重试...")
+                backoff(delay, "ladder")
+                continue
+            
+            orders = [(qty, price, manager.new_order(qty, price)) for price, qty in ladder]
+            start = time.perf_counter()
+            order_ids = send_batch_orders(symbol, "SELL", orders, best_bid_price, best_ask_price)
+            latency = time.perf_counter() - start
+            metrics.observe("stage", latency * 1000, stage="submit")
+            submit_latencies.append(latency)
+            submitted_orders += len(orders)
+            print(f"批量提交{len(orders)}单耗时 {latency * 1000:.1f} ms, 平均每单 {latency * 1000 / len(orders):.1f} ms")
+            
+            live_orders = {}
+            for (qty, price, client_order_id), order_id in zip(orders, order_ids):
+                if order_id is None:
+                    metrics.incr("rejects")
+                    manager.update(client_order_id, "REJECTED", 0)
+                elif order_id == ORDER_UNKNOWN:
+                    # 保持未结束, 下一轮开始前对账
+                    print(f"订单 {client_order_id} 是否已创建未知, 稍后对账")
+                else:
+                    manager.bind(client_order_id, order_id)
+                    tracker.watch(order_id, symbol)
+                    live_orders[client_order_id] = order_id
+            if not live_orders:
+                if trading_halted() is not None:
+                    continue
+                delay = retry_delay(failures)
+                failures += 1
+                print(f"批量下单全部失败，等待{delay}秒后重试...")
+                backoff(delay, "batch_rejected")
+                continue
+            failures = 0
+            
+            with metrics.span("stage", stage="status_wait"):
+                wait_for_orders(manager, tracker, live_orders, ladder_timeout)
+            
+            leftovers = {order_id: coid for coid, order_id in live_orders.items() if not manager.is_final(coid)}
+            if leftovers:
+                print(f"等待超时, 批量撤销剩余{len(leftovers)}个挂单...")
+                with metrics.span("stage", stage="cancel"):
+                    cancelled = cancel_batch_orders(symbol, list(leftovers))
+                for order_id, client_order_id in leftovers.items():
+                    if order_id in cancelled:
+                        status, executed_qty = cancelled[order_id]
+                    else:
+                        # 撤单失败多半是已经成交, 查询最终状态
+                        status, executed_qty = check_order_status(symbol, order_id)
+                    if status is not None:
+                        manager.update(client_order_id, status, executed_qty)
+            for order_id in live_orders.values():
+                tracker.forget(order_id)
+            metrics.observe("stage", (time.perf_counter() - slice_start) * 1000, stage="slice")
+            
+            print(f"当前已完成数量: {manager.executed_qty}/{manager.total_qty}")
+            print("-" * 50)
+            continue
         
+        # 计算挂单价格（比卖一便宜指定折扣）
         # 检查价格逻辑：如果计算价格等于或比买一便宜，直接挂卖一
-        if calculated_price <= best_bid_price:
-            order_price = best_ask_price
-            print(f"计算价格{calculated_price}过低（≤买一{best_bid_price}），直接挂卖一价格: {order_price}")
+        order_price = calculate_order_price(best_bid_price, best_ask_price, discount)
+        if best_ask_price - discount <= best_bid_price:
+            print(f"计算价格{best_ask_price - discount}过低（≤买一{best_bid_price}），直接挂卖一价格: {order_price}")
         else:
-            order_price = calculated_price
-            print(f"挂单价格: {order_price} (卖一{best_ask_price} - 折扣{args.discount})")
+            print(f"挂单价格: {order_price} (卖一{best_ask_price} - 折扣{discount})")
         
-        # 计算本次挂单数量（不超过卖一数量和剩余数量）
-        order_qty = min(best_ask_qty, remaining_qty)
+        # 本片挂单数量由调度器决定 (默认不超过卖一数量和剩余数量), 未到下一片时等待
+        order_qty, wait = scheduler.next_slice(manager, orderbook)
+        if order_qty <= 0:
+            print(f"按{scheduler.name}进度暂不挂单, {wait:.1f}秒后重新计算")
+            if stop_event is not None:
+                stop_event.wait(wait)
+            else:
+                time.sleep(wait)
+            continue
+        
+        # 按交易规则量化: 价格向上对齐tickSize (不低于计算价), 数量向下对齐stepSize
+        order_price = filters.quantize_price(order_price, "SELL")
+        order_qty = filters.quantize_qty(order_qty)
+        if filters.min_qty is not None and order_qty < filters.min_qty:
+            # 卖一数量不足最小下单量时按最小下单量挂单
+            order_qty = min(filters.min_qty, filters.quantize_qty(remaining_qty))
+        if filters.min_qty is not None and order_qty < filters.min_qty:
+            print(f"剩余数量{remaining_qty}低于最小下单量{filters.min_qty}, 无法继续卖出")
+            break
+        if filters.max_qty is not None:
+            order_qty = min(order_qty, filters.max_qty)
+        error = filters.validate(order_price, order_qty)
+        if error:
+            delay = retry_delay(failures)
+            failures += 1
+            print(f"挂单不符合交易规则: {error}, 等待{delay}秒后重试...")
+            backoff(delay, "filters")
+            continue
         
         print(f"挂单信息: 价格={order_price}, 数量={order_qty}")
         
-        # 发送限价卖单
-        order_id = send_limit_order(args.symbol, "SELL", order_qty, order_price)
+        # 发送限价卖单 (超时后按clientOrderId幂等重发)
+        client_order_id = manager.new_order(order_qty, order_price)
+        start = time.perf_counter()
+        order_id = send_limit_order(symbol, "SELL", order_qty, order_price, client_order_id,
+                                    best_bid_price, best_ask_price)
+        latency = time.perf_counter() - start
+        metrics.observe("stage", latency * 1000, stage="submit")
+        submit_latencies.append(latency)
+        submitted_orders += 1
         
+        if order_id == ORDER_UNKNOWN:
+            # 不能记为拒绝: 订单可能已在交易所挂出, 下一轮开始前对账
+            continue
         if not order_id:
-            print("下单失败，等待5秒后重试...")
-            time.sleep(5)
+            metrics.incr("rejects")
+            manager.update(client_order_id, "REJECTED", 0)
+            if trading_halted() is not None:
+                continue
+            delay = retry_delay(failures)
+            failures += 1
+            print(f"下单失败，等待{delay}秒后重试...")
+            backoff(delay, "order_rejected")
             continue
+        failures = 0
+        manager.bind(client_order_id, order_id)
+        tracker.watch(order_id, symbol)
         
-        # 轮询订单状态
+        # 等待订单状态变化 (数据流事件驱动, 超时回退REST对账)
         print("开始监控订单状态...")
+        # 下单已成功, 以 ACCEPTED 作为初始状态: 数据流正常但回报迟到/丢失时等待返回该状态而不是 None,
+        # 撤单/追单/到期检查照常进行
+        known = ("ACCEPTED", 0)
+        quoted_at = time.monotonic()
+        slice_timeout = scheduler.slice_timeout()
+        # 本片到期撤单失败 (多半是刚好成交) 后, 按退避时间再次撤单
+        cancel_failures = 0
+        retry_cancel_at = None
+        # 撤单失败 (多半是刚好成交) 后, 下次醒来做一次REST对账, 数据流丢了回报时也能确认最终状态
+        reconcile_next = False
         while True:
-            status, executed_qty = check_order_status(args.symbol, order_id)
+            chasing = chase and requotes < max_requotes
+            with metrics.span("stage", stage="status_wait"):
+                if chasing:
+                    # 追单模式按重挂间隔醒来检查盘口, 数据流正常时不做REST对账
+                    status, executed_qty = tracker.wait_for_update(
+                        order_id, known, timeout=min_requote_interval, reconcile=reconcile_next)
+                elif slice_timeout is not None:
+                    # 调度器限定了挂单时间: 到期醒来撤单; 数据流正常时只在整10秒没有回报时做REST对账,
+                    # 撤单失败后醒来时对账一次, 确认订单是否已经成交 (数据流断开时 wait_for_update 总是对账);
+                    # 到期时还没收到过该订单任何回报的, 也先对账一次再撤单
+                    left = (retry_cancel_at or quoted_at + slice_timeout) - time.monotonic()
+                    unseen = tracker.get(order_id) is None
+                    status, executed_qty = tracker.wait_for_update(
+                        order_id, known, timeout=min(max(left, 0.1), 10),
+                        reconcile=left >= 10 or retry_cancel_at is not None or unseen or reconcile_next)
+                else:
+                    status, executed_qty = tracker.wait_for_update(order_id, known)
+            reconcile_next = False
             
             if status is None:
-                print("查询订单状态失败，等待3秒后重试...")
-                time.sleep(3)
-                continue
+                # REST对账失败: 视为状态未变, 下面的取消/追单/到期检查照常进行
+                print("查询订单状态失败，稍后重试...")
+            elif (status, executed_qty) != known:
+                known = (status, executed_qty)
+                manager.update(client_order_id, status, executed_qty)
+                
+                if status == "FILLED":
+                    print(f"订单完全成交! 成交数量: {order_qty}")
+                    break
+                elif status == "PARTIALLY_FILLED":
+                    print(f"订单部分成交, 已成交: {executed_qty}")
+                elif status == "ACCEPTED":
+                    print("订单已接受，等待成交...")
+                else:
+                    # 部分成交后撤单/过期的数量已按累计成交计入
+                    print(f"订单状态: {status}, 已成交: {executed_qty}, 退出监控")
+                    break
             
-            if status == "FILLED":
-                print(f"订单完全成交! 成交数量: {order_qty}")
-                completed_qty += order_qty
-                break
-            elif status == "PARTIALLY_FILLED":
-                print(f"订单部分成交, 已成交: {executed_qty}")
-                # 可以选择继续等待或取消订单重新挂单
-                time.sleep(2)
-            elif status == "ACCEPTED":
-                print("订单已接受，等待成交...")
-                time.sleep(2)
-            else:
-                print(f"订单状态: {status}, 退出监控")
+            # 任务取消: 撤掉当前挂单, 已成交部分按撤单回报计入
+            if stop_event is not None and stop_event.is_set():
+                cancel_status, cancel_qty = cancel_order(symbol, order_id)
+                if cancel_status is not None:
+                    manager.update(client_order_id, cancel_status, cancel_qty)
+                    print(f"任务已取消, 撤单完成, 已成交: {cancel_qty}")
+                    break
+                reconcile_next = True
+            
+            # 追单: 挂单被更低卖价压住时撤单, 回到外层循环按最新盘口和折扣/买一下限重新挂单
+            if chasing and time.monotonic() - quoted_at >= min_requote_interval:
+                if is_order_undercut(symbol, order_price, book):
+                    with metrics.span("stage", stage="cancel"):
+                        cancel_status, cancel_qty = cancel_order(symbol, order_id)
+                    if cancel_status is None:
+                        # 撤单失败多半是刚好成交, 继续监控由状态更新决定
+                        reconcile_next = True
+                        continue
+                    requotes += 1
+                    metrics.incr("requotes")
+                    manager.update(client_order_id, cancel_status, cancel_qty)
+                    print(f"挂单已不是卖一, 撤单重挂 (第{requotes}/{max_requotes}次)")
+                    break
+            
+            # 本片挂单到期: 撤掉未成交部分, 回到外层循环由调度器按最新进度/深度重新决定
+            if slice_timeout is not None and time.monotonic() >= (retry_cancel_at or quoted_at + slice_timeout):
+                with metrics.span("stage", stage="cancel"):
+                    cancel_status, cancel_qty = cancel_order(symbol, order_id)
+                if cancel_status is None:
+                    retry_cancel_at = time.monotonic() + retry_delay(cancel_failures)
+                    cancel_failures += 1
+                    continue
+                manager.update(client_order_id, cancel_status, cancel_qty)
+                print(f"本片挂单{slice_timeout:.0f}秒未完全成交, 撤单, 已成交: {cancel_qty}")
                 break
+        tracker.forget(order_id)
+        metrics.observe("stage", (time.perf_counter() - slice_start) * 1000, stage="slice")
         
-        print(f"当前已完成数量: {completed_qty}/{args.quantity}")
+        print(f"当前已完成数量: {manager.executed_qty}/{manager.total_qty}")
         print("-" * 50)
-        
-        # 避免过于频繁的请求
-        time.sleep(1)
     
-    print(f"程序执行完成! 总成交数量: {completed_qty}")
+    if submit_latencies:
+        total_latency = sum(submit_latencies) * 1000
+        print(f"下单提交: {len(submit_latencies)}轮 {submitted_orders}单, "
+              f"平均每轮 {total_latency / len(submit_latencies):.1f} ms, "
+              f"平均每单 {total_latency / submitted_orders:.1f} ms")
+    return manager
+
+def main():
+    global RISK_GATE
+    # 命令行参数解析
+    parser = argparse.ArgumentParser(description='币安期权贴卖一卖程序')
+    parser.add_argument('--symbol', required=True, help='期权交易对，例如: ETH-250728-3600-C')
+    parser.add_argument('--quantity', type=Decimal, help='总卖出数量 (--resume 时取执行日志中的数量)')
+    parser.add_argument('--side', default='SELL', help='交易方向(默认: SELL)')
+    parser.add_argument('--discount', type=float, default=5.0, help='相对卖一的折扣(默认: 5.0)')
+    parser.add_argument('--no-ws', action='store_true', help='不使用WebSocket本地订单簿, 每次下单前REST拉取深度')
+    parser.add_argument('--no-user-stream', action='store_true', help='不使用用户数据流, 通过REST轮询订单状态')
+    parser.add_argument('--chase', action='store_true', help='追单模式: 挂单不再是卖一时撤单并按最新盘口重挂')
+    parser.add_argument('--min-requote-interval', type=float, default=1.0, help='追单模式下两次重挂的最小间隔秒数(默认: 1.0)')
+    parser.add_argument('--max-requotes', type=int, default=20, help='追单模式下最多重挂次数(默认: 20)')
+    parser.add_argument('--ladder', type=int, default=1, help=f'阶梯模式: 按深度拆成多档一次批量下单, 档数(默认: 1, 最多{MAX_BATCH_ORDERS})')
+    parser.add_argument('--ladder-timeout', type=float, default=30.0, help='阶梯模式下每轮等待成交秒数, 超时批量撤单(默认: 30)')
+    parser.add_argument('--metrics-log', help='开启延迟统计, 以JSON lines写入该文件')
+    parser.add_argument('--metrics-port', type=int, help='开启延迟统计, 在该端口提供Prometheus /metrics')
+    parser.add_argument('--risk-config', help='下单前风控限额 (JSON, 见 risk_gate.py), 不指定时只做价格带检查')
+    parser.add_argument('--kill-switch', default='KILL_SWITCH', help='停止开关文件, 存在时拒绝所有新订单 (默认: KILL_SWITCH)')
+    parser.add_argument('--journal', default=JOURNAL_PATH, help=f'执行日志文件 (SQLite) (默认: {JOURNAL_PATH})')
+    parser.add_argument('--no-journal', action='store_true', help='不写执行日志 (进程中断后无法恢复)')
+    parser.add_argument('--resume', action='store_true', help='恢复该交易对最近一个中断的卖出任务, 从确切的剩余数量继续')
+    parser.add_argument('--strategy', choices=STRATEGIES, default='touch',
+                        help='执行调度 (见 schedulers.py): touch 按卖一数量挂单 / twap 按时间均分 / '
+                             'pov 按成交量比例 / adaptive 按盘口深度调整每片大小 (默认: touch)')
+    parser.add_argument('--duration', type=float, default=schedulers.DEFAULT_DURATION,
+                        help=f'twap: 计划完成秒数 (默认: {schedulers.DEFAULT_DURATION:.0f})')
+    parser.add_argument('--slices', type=int, default=schedulers.DEFAULT_SLICES,
+                        help=f'twap: 分片数 (默认: {schedulers.DEFAULT_SLICES})')
+    parser.add_argument('--pov-rate', type=float, default=schedulers.DEFAULT_POV_RATE,
+                        help=f'pov: 占市场成交量的比例 (默认: {schedulers.DEFAULT_POV_RATE})')
+    parser.add_argument('--pov-interval', type=float, default=schedulers.DEFAULT_POV_INTERVAL,
+                        help=f'pov: 按最新成交量重算目标的间隔秒数 (默认: {schedulers.DEFAULT_POV_INTERVAL:.0f})')
+    parser.add_argument('--depth-fraction', type=float, default=schedulers.DEFAULT_DEPTH_FRACTION,
+                        help=f'adaptive: 每片占前几档深度的比例 (默认: {schedulers.DEFAULT_DEPTH_FRACTION})')
+    parser.add_argument('--depth-levels', type=int, default=schedulers.DEFAULT_DEPTH_LEVELS,
+                        help=f'adaptive: 计算深度的档数 (默认: {schedulers.DEFAULT_DEPTH_LEVELS})')
+    parser.add_argument('--slice-timeout', type=float, default=schedulers.DEFAULT_SLICE_TIMEOUT,
+                        help=f'adaptive: 每片最长挂单秒数 (默认: {schedulers.DEFAULT_SLICE_TIMEOUT:.0f})')
+    
+    args = parser.parse_args()
+    if args.quantity is None and not args.resume:
+        parser.error("需要指定 --quantity (或用 --resume 恢复中断的任务)")
+    if args.strategy != 'touch' and args.ladder > 1:
+        parser.error("--ladder 阶梯模式不能与 --strategy 调度同时使用")
+    
+    # 检查API密钥配置
+    if API_KEY == "your_api_key_here" or SECRET_KEY == "your_secret_key_here":
+        print("错误: 请先配置你的API密钥!")
+        print("请在代码中将API_KEY和SECRET_KEY替换为你的实际密钥")
+        return
+    
+    # 检查是否为卖单
+    if args.side.upper() != "SELL":
+        print("这个程序只支持卖出(SELL)操作")
+        return
+    
+    # 交易规则: 校验交易对并获取价格/数量精度
+    EXCHANGE_INFO.load()
+    filters = EXCHANGE_INFO.get(args.symbol)
+    if filters is None:
+        print(f"交易对不存在: {args.symbol}")
+        return
+    if filters.is_expired():
+        print(f"合约已到期: {args.symbol}")
+        return
+    
+    # 延迟统计: 各阶段耗时和REST接口延迟分布, 默认关闭
+    if args.metrics_log or args.metrics_port:
+        metrics.configure(args.metrics_log, args.metrics_port)
+    
+    try:
+        scheduler = make_scheduler(args.strategy, args.symbol, BASE_URL, args.duration, args.slices,
+                                   args.pov_rate, args.pov_interval, args.depth_fraction, args.depth_levels,
+                                   args.slice_timeout)
+    except ValueError as e:
+        print(e)
+        return
+    
+    # 下单前风控: 限额预先计算, 标记价格/指数价格/停止开关由后台线程刷新
+    try:
+        limits = load_limits(args.risk_config)
+    except (OSError, json.JSONDecodeError) as e:
+        print(f"读取风控限额失败: {e}")
+        return
+    risk_book = RiskBook()
+    RISK_GATE = RiskGate(limits, risk_book, args.kill_switch)
+    RISK_GATE.start(BASE_URL, symbols=[args.symbol])
+    
+    # 执行日志: 同一交易对有中断的任务时必须先恢复, 避免重复卖出
+    journal = None
+    resumed = None
+    if not args.no_journal:
+        journal = Journal(args.journal)
+        unfinished = journal.unfinished_jobs(args.symbol)
+        if args.resume:
+            if not unfinished:
+                print(f"执行日志 {args.journal} 中没有 {args.symbol} 的中断任务")
+                RISK_GATE.stop()
+                return
+            resumed = unfinished[0]
+            if args.quantity is not None and args.quantity != to_decimal(resumed["quantity"]):
+                print(f"注意: 按执行日志中的总数量 {resumed['quantity']} 恢复, 忽略 --quantity {args.quantity}")
+            args.quantity = to_decimal(resumed["quantity"])
+        elif unfinished:
+            print(f"执行日志中 {args.symbol} 有未完成的卖出任务 (总数量 {unfinished[0]['quantity']}), "
+                  f"请用 --resume 恢复, 或确认后删除 {args.journal}")
+            RISK_GATE.stop()
+            return
+    
+    # 订单管理: 确定性clientOrderId, 按订单累计成交 (Decimal), 成交记入持仓账本供风控查询
+    manager = OrderManager(args.symbol, "SELL", args.quantity, job_id=resumed and resumed["job_id"],
+                           on_fill=risk_book.fill_callback(), journal=journal)
+    
+    print(f"开始执行期权卖出程序")
+    print(f"交易对: {args.symbol}")
+    print(f"总数量: {args.quantity}")
+    print(f"折扣: {args.discount}")
+    print(f"执行调度: {scheduler.describe()}")
+    print("-" * 50)
+    
+    # 校准服务器时间, 之后后台定期同步
+    TIME_SYNC.start()
+    print(f"服务器时钟偏移: {TIME_SYNC.offset:.1f} ms, 往返延迟: {TIME_SYNC.rtt} ms")
+    
+    if resumed is not None:
+        # 先回放日志, 再按交易所订单校正并撤掉遗留挂单
+        events = journal.events(manager.job_id)
+        manager.restore(events)
+        print(f"恢复任务: 日志事件 {len(events)} 条, 日志中已成交 {manager.executed_qty}")
+        if not recover_job(manager, int(resumed["created"] * 1000) - RECOVER_LOOKBACK_MS):
+            print("恢复失败, 请稍后重试 --resume")
+            TIME_SYNC.stop()
+            RISK_GATE.stop()
+            journal.close()
+            return
+        print(f"恢复完成: 已成交 {manager.executed_qty}, 剩余 {manager.remaining_qty}")
+    elif journal is not None:
+        journal.start_job(manager.job_id, args.symbol, "SELL", args.quantity)
+    
+    # 启动本地订单簿: 一次快照 + 增量深度, 之后每轮直接读内存
+    book = None
+    if not args.no_ws:
+        book = LocalOrderBook(args.symbol, BASE_URL, **ws_options())
+        book.start()
+        if not book.wait_synced(timeout=10):
+            print("本地订单簿10秒内未同步, 暂时回退到REST深度")
+    
+    # 订单状态跟踪: 用户数据流推送成交, REST查询只作为回退对账
+    tracker = OrderTracker(API_KEY, BASE_URL, reconcile=lambda oid: check_order_status(args.symbol, oid), **ws_options())
+    if not args.no_user_stream:
+        tracker.start()
+    
+    run_sell(args.symbol, args.quantity, args.discount, book=book, tracker=tracker, filters=filters,
+             manager=manager, chase=args.chase, min_requote_interval=args.min_requote_interval,
+             max_requotes=args.max_requotes, ladder=args.ladder, ladder_timeout=args.ladder_timeout,
+             scheduler=scheduler)
+    
+    if book is not None:
+        book.stop()
+    tracker.stop()
+    RISK_GATE.stop()
+    if journal is not None:
+        # 正常返回 (卖完/无法继续) 才结束任务; 进程被杀或中断时任务保持未完成, 可 --resume
+        journal.finish_job(manager.job_id, "done" if manager.remaining_qty <= 0 else "stopped")
+        journal.close()
+        print(f"执行日志: {journal.stats()}")
+    
+    print(f"程序执行完成! 总成交数量: {manager.executed_qty}")
+    if RISK_GATE.rejects:
+        print(f"风控拒单: {RISK_GATE.rejects}")
+    print(f"限速器统计: {http_client.limiter_stats()}")
+    metrics.report()
+    metrics.close()
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
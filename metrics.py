@@ -0,0 +1,244 @@
+# 延迟统计 - 执行循环各阶段计时 (单调时钟)、REST接口延迟分布 (p50/p99)、重试/拒单计数
+# 默认关闭: 关闭时 span() 直接返回共享的空上下文, incr()/observe() 只做一次判断, 对热路径几乎无开销
+# 开启后可输出 JSON lines 日志 (每个阶段一行) 和 Prometheus 文本格式的 /metrics 接口
+# 用法:
+#   import metrics
+#   metrics.configure(log_path="metrics.jsonl", port=9108)
+#   with metrics.span("submit"): ...
+#   metrics.incr("retries", reason="depth")
+#   metrics.report()
+import bisect
+import contextlib
+import http.server
+import json
+import math
+import threading
+import time
+
+# 直方图桶: 0.01ms 到 约100秒, 每档放大10%, 百分位误差不超过10%
+BUCKET_RATIO = 1.1
+BUCKET_MIN_MS = 0.01
+BUCKET_BOUNDS = [BUCKET_MIN_MS * BUCKET_RATIO ** i for i in range(170)]
+
+# 报告和导出的百分位
+QUANTILES = (0.5, 0.9, 0.99)
+
+_enabled = False
+_lock = threading.Lock()
+_histograms = {}
+_counters = {}
+_log = None
+_server = None
+_NULL_SPAN = contextlib.nullcontext()
+
+
+class Histogram:
+    """对数分桶的延迟直方图 (毫秒), 记录为O(log n)的一次二分查找"""
+
+    def __init__(self):
+        self.counts = [0] * (len(BUCKET_BOUNDS) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def record(self, value):
+        self.counts[bisect.bisect_left(BUCKET_BOUNDS, value)] += 1
+        self.count += 1
+        self.sum += value
+        if value > self.max:
+            self.max = value
+
+    def percentile(self, q):
+        """百分位估计: 返回所在桶的上界 (最后一个桶返回最大值)"""
+        if self.count == 0:
+            return None
+        rank = max(1, math.ceil(q * self.count))
+        seen = 0
+        for index, count in enumerate(self.counts):
+            seen += count
+            if seen >= rank:
+                return min(BUCKET_BOUNDS[index], self.max) if index < len(BUCKET_BOUNDS) else self.max
+        return self.max
+
+
+class _Span:
+    __slots__ = ("name", "labels", "start")
+
+    def __init__(self, name, labels):
+        self.name = name
+        self.labels = labels
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        observe(self.name, (time.perf_counter() - self.start) * 1000, **self.labels)
+        return False
+
+
+def enabled():
+    return _enabled
+
+
+def configure(log_path=None, port=None):
+    """开启统计; log_path 写 JSON lines 日志, port 启动 Prometheus /metrics 接口"""
+    global _enabled, _log
+    if log_path:
+        _log = open(log_path, 'a', buffering=1 << 16)
+    if port:
+        start_server(port)
+    _enabled = True
+
+
+def _key(name, labels):
+    # 多数指标只有一个标签, 不必排序
+    if len(labels) > 1:
+        return name, tuple(sorted(labels.items()))
+    return name, tuple(labels.items())
+
+
+def span(name, **labels):
+    """计时上下文: with metrics.span("depth"): ..."""
+    if not _enabled:
+        return _NULL_SPAN
+    return _Span(name, labels)
+
+
+def observe(name, value_ms, **labels):
+    """记录一次耗时 (毫秒)"""
+    if not _enabled:
+        return
+    key = _key(name, labels)
+    with _lock:
+        histogram = _histograms.get(key)
+        if histogram is None:
+            histogram = _histograms[key] = Histogram()
+        histogram.record(value_ms)
+        if _log is not None:
+            _log.write(json.dumps({"ts": time.time(), "type": "span", "name": name, "ms": round(value_ms, 3), **labels}) + "\n")
+
+
+def incr(name, value=1, **labels):
+    """计数器加一 (重试、拒单等)"""
+    if not _enabled:
+        return
+    key = _key(name, labels)
+    with _lock:
+        _counters[key] = _counters.get(key, 0) + value
+        if _log is not None:
+            _log.write(json.dumps({"ts": time.time(), "type": "count", "name": name, "value": value, **labels}) + "\n")
+
+
+def summary():
+    """当前统计快照: {"latency": {...}, "counters": {...}}, 键为 名称{标签}"""
+    with _lock:
+        latency = {
+            _format_key(key): {
+                "count": h.count,
+                "mean_ms": round(h.sum / h.count, 3),
+                "p50_ms": round(h.percentile(0.5), 3),
+                "p99_ms": round(h.percentile(0.99), 3),
+                "max_ms": round(h.max, 3),
+            }
+            for key, h in sorted(_histograms.items()) if h.count
+        }
+        counters = {_format_key(key): value for key, value in sorted(_counters.items())}
+    return {"latency": latency, "counters": counters}
+
+
+def _format_key(key):
+    name, labels = key
+    if not labels:
+        return name
+    return name + "{" + ",".join(f'{k}="{v}"' for k, v in labels) + "}"
+
+
+def report():
+    """打印各阶段耗时分布和计数, 同时写一行汇总到日志"""
+    if not _enabled:
+        return
+    data = summary()
+    print(f"{'阶段/接口':<48} {'次数':>7} {'平均ms':>9} {'p50ms':>9} {'p99ms':>9} {'最大ms':>9}")
+    for name, stats in data["latency"].items():
+        print(f"{name:<48} {stats['count']:>7} {stats['mean_ms']:>9.2f} {stats['p50_ms']:>9.2f} "
+              f"{stats['p99_ms']:>9.2f} {stats['max_ms']:>9.2f}")
+    for name, value in data["counters"].items():
+        print(f"{name:<48} {value:>7}")
+    if _log is not None:
+        with _lock:
+            _log.write(json.dumps({"ts": time.time(), "type": "summary", **data}) + "\n")
+            _log.flush()
+
+
+def prometheus_text():
+    """Prometheus 文本格式: 耗时为 summary (分位数/总和/次数), 计数为 counter"""
+    lines = []
+    with _lock:
+        histograms = sorted(_histograms.items())
+        counters = sorted(_counters.items())
+    seen = set()
+    for (name, labels), h in histograms:
+        metric = f"market_trade_{name}_ms"
+        if metric not in seen:
+            seen.add(metric)
+            lines.append(f"# TYPE {metric} summary")
+        for q in QUANTILES:
+            value = h.percentile(q)
+            lines.append(f"{metric}{_format_labels(labels + (('quantile', str(q)),))} {value if value is not None else 'NaN'}")
+        lines.append(f"{metric}_sum{_format_labels(labels)} {h.sum}")
+        lines.append(f"{metric}_count{_format_labels(labels)} {h.count}")
+    for (name, labels), value in counters:
+        metric = f"market_trade_{name}_total"
+        if metric not in seen:
+            seen.add(metric)
+            lines.append(f"# TYPE {metric} counter")
+        lines.append(f"{metric}{_format_labels(labels)} {value}")
+    return "\n".join(lines) + "\n"
+
+
+def _format_labels(labels):
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{k}="{v}"' for k, v in labels) + "}"
+
+
+class _MetricsHandler(http.server.BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split('?')[0] != '/metrics':
+            self.send_error(404)
+            return
+        body = prometheus_text().encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/plain; version=0.0.4')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_server(port, host='127.0.0.1'):
+    """后台线程提供 /metrics"""
+    global _server
+    _server = http.server.ThreadingHTTPServer((host, port), _MetricsHandler)
+    threading.Thread(target=_server.serve_forever, daemon=True).start()
+    print(f"Prometheus 指标: http://{host}:{port}/metrics")
+
+
+def close():
+    global _enabled, _log, _server
+    _enabled = False
+    if _server is not None:
+        _server.shutdown()
+        _server = None
+    if _log is not None:
+        _log.close()
+        _log = None
+
+
+def reset():
+    with _lock:
+        _histograms.clear()
+        _counters.clear()
@@ -0,0 +1,816 @@
+# 本地模拟币安期权交易所 - 离线压测和延迟测试用, 不需要真实密钥
+# REST: time / exchangeInfo / depth / ticker / mark / index / trades / blockTrades / order / openOrders / historyOrders / batchOrders / listenKey
+# WebSocket: /eapi/ws/<流名或listenKey> 单流, /eapi/stream?streams=a/b 组合流 (深度增量 + 用户订单回报)
+# 撮合: 每个合约一个价格优先/时间优先的订单簿; 后台做市商围绕 Black-Scholes 理论价挂多档报价, 随机吃单者按间隔主动成交
+# 成交: trades 返回吃单者在订单簿上的逐笔成交; blockTrades 是另外随机生成的大宗交易 (场外协商, 不经过订单簿, 独立的成交ID)
+# 故障注入: 固定/随机延迟、随机5xx错误、响应挂起(模拟超时)、按 X-MBX-* 规则的权重/下单数限频(429)、时钟偏移、-1021 时间戳校验
+# python mock_exchange.py --port 9000
+# python mock_exchange.py --port 9000 --latency-ms 20 --jitter-ms 10 --error-rate 0.01 --weight-limit 2400
+# 然后: python market_trade.py ... 前把 BASE_URL 指向 http://127.0.0.1:9000, 或 python trade_daemon.py --base-url http://127.0.0.1:9000 --ws-url ws://127.0.0.1:9000/eapi/ws
+import argparse
+import asyncio
+import bisect
+import collections
+import itertools
+import json
+import math
+import random
+import time
+import urllib.parse
+from datetime import datetime, timedelta, timezone
+
+from aiohttp import WSMsgType, web
+
+from pricing import bs_price, greeks, parse_symbol, year_fraction
+from rate_limiter import request_cost
+
+DEFAULT_PORT = 9000
+DEFAULT_UNDERLYING = "ETH"
+DEFAULT_SPOT = 3500.0
+DEFAULT_VOL = 0.6
+TICK_SIZE = 0.1
+STEP_SIZE = 0.01
+MIN_QTY = 0.01
+
+# 做市商报价: 档数、每档间隔(tick数)、半价差(理论价的比例)、每档数量
+MM_LEVELS = 5
+MM_LEVEL_TICKS = 5
+MM_HALF_SPREAD = 0.01
+MM_LEVEL_QTY = (0.5, 5.0)
+
+# 后台行情节奏: 每个合约每轮主动成交的概率和数量范围
+FLOW_INTERVAL = 0.5
+TAKER_PROBABILITY = 0.3
+TAKER_QTY = (0.05, 1.0)
+# 大宗交易: 每个合约每轮发生的概率和数量范围, 价格在理论价附近
+BLOCK_PROBABILITY = 0.02
+BLOCK_QTY = (5.0, 50.0)
+BLOCK_PRICE_SPREAD = 0.02
+# 大宗交易ID从该值开始, 与逐笔成交ID区分
+BLOCK_TRADE_ID_START = 900000000
+
+RECENT_TRADES = 500
+ACTIVE_STATUSES = ("ACCEPTED", "PARTIALLY_FILLED")
+
+INTERNAL_ERROR = {"code": -1001, "msg": "Internal error; unable to process your request. Please try again."}
+
+
+def now_ms():
+    return int(time.time() * 1000)
+
+
+def round_price(price):
+    return round(round(price / TICK_SIZE) * TICK_SIZE, 8)
+
+
+def fmt(value):
+    """数值转交易所风格的字符串"""
+    return f"{value:.8f}".rstrip('0').rstrip('.') or "0"
+
+
+def default_symbols(underlying=DEFAULT_UNDERLYING, spot=DEFAULT_SPOT):
+    """默认期权链: 约30天后到期, 平值上下各5档行权价, 看涨+看跌"""
+    expiry = (datetime.now(timezone.utc) + timedelta(days=30)).strftime("%y%m%d")
+    step = 100
+    atm = int(round(spot / step) * step)
+    return [f"{underlying}-{expiry}-{strike}-{side}"
+            for strike in range(atm - 5 * step, atm + 6 * step, step) for side in "CP"]
+
+
+class Book:
+    """单个合约的订单簿: 价格 -> 订单队列, 价格列表保持有序"""
+
+    def __init__(self, symbol):
+        self.symbol = symbol
+        self.levels = {"BUY": {}, "SELL": {}}
+        self.prices = {"BUY": [], "SELL": []}
+        # 每个价位的剩余数量合计, 随挂单/成交/撤单增量维护
+        self.totals = {"BUY": {}, "SELL": {}}
+        self.update_id = 0
+        self.last_price = None
+        self.volume = 0.0
+
+    def best(self, side):
+        prices = self.prices[side]
+        if not prices:
+            return None
+        return prices[-1] if side == "BUY" else prices[0]
+
+    def level_qty(self, side, price):
+        qty = self.totals[side].get(price, 0.0)
+        return qty if qty > 1e-12 else 0.0
+
+    def reduce(self, side, price, qty):
+        self.totals[side][price] -= qty
+
+    def add(self, order):
+        side, price = order["side"], order["priceValue"]
+        queue = self.levels[side].get(price)
+        if queue is None:
+            queue = self.levels[side][price] = collections.deque()
+            bisect.insort(self.prices[side], price)
+            self.totals[side][price] = 0.0
+        queue.append(order)
+        self.totals[side][price] += order["left"]
+
+    def remove(self, order):
+        side, price = order["side"], order["priceValue"]
+        queue = self.levels[side].get(price)
+        if queue is None:
+            return
+        try:
+            queue.remove(order)
+        except ValueError:
+            return
+        self.totals[side][price] -= order["left"]
+        if not queue:
+            self._drop_level(side, price)
+
+    def _drop_level(self, side, price):
+        del self.levels[side][price]
+        del self.totals[side][price]
+        prices = self.prices[side]
+        del prices[bisect.bisect_left(prices, price)]
+
+    def depth(self, limit):
+        bids = [[fmt(p), fmt(self.level_qty("BUY", p))] for p in reversed(self.prices["BUY"][-limit:])]
+        asks = [[fmt(p), fmt(self.level_qty("SELL", p))] for p in self.prices["SELL"][:limit]]
+        return bids, asks
+
+
+class MatchingEngine:
+    """所有合约的撮合引擎, 事件循环单线程调用, 不需要加锁"""
+
+    def __init__(self, symbols, spot=DEFAULT_SPOT, vol=DEFAULT_VOL, seed=None):
+        self.random = random.Random(seed)
+        self.spot = spot
+        self.vol = vol
+        self.books = {symbol: Book(symbol) for symbol in symbols}
+        self.contracts = {symbol: parse_symbol(symbol) for symbol in symbols}
+        self.orders = {}
+        self.client_ids = {}
+        self.mm_orders = collections.defaultdict(list)
+        self.trades = {symbol: collections.deque(maxlen=RECENT_TRADES) for symbol in symbols}
+        self.block_trades = {symbol: collections.deque(maxlen=RECENT_TRADES) for symbol in symbols}
+        self._order_ids = itertools.count(4700000000)
+        self._trade_ids = itertools.count(1)
+        self._block_trade_ids = itertools.count(BLOCK_TRADE_ID_START)
+        # 事件订阅: 深度增量按合约, 用户订单回报按 listenKey
+        self.depth_listeners = collections.defaultdict(set)
+        self.user_listeners = collections.defaultdict(set)
+        self.listen_keys = set()
+        self._changed = {}
+        self.stats = collections.Counter()
+
+    # ---------- 理论价和做市 ----------
+
+    def fair_price(self, symbol):
+        contract = self.contracts[symbol]
+        t = year_fraction(contract["expiry"])
+        price = float(bs_price(self.spot, contract["strike"], t, self.vol, contract["side"] == "CALL"))
+        return max(price, TICK_SIZE)
+
+    def requote(self, symbol):
+        """撤掉做市商旧报价, 围绕理论价重新挂多档"""
+        book = self.books[symbol]
+        for order in self.mm_orders.pop(symbol, ()):
+            if order["status"] in ACTIVE_STATUSES:
+                self._cancel(book, order)
+        fair = self.fair_price(symbol)
+        half = max(fair * MM_HALF_SPREAD, TICK_SIZE)
+        for level in range(MM_LEVELS):
+            offset = half + level * MM_LEVEL_TICKS * TICK_SIZE
+            for side, price in (("BUY", round_price(fair - offset)), ("SELL", round_price(fair + offset))):
+                if price <= 0:
+                    continue
+                qty = round(self.random.uniform(*MM_LEVEL_QTY), 2)
+                self.mm_orders[symbol].append(self.place(symbol, side, qty, price, owner="mm"))
+        self.flush(symbol)
+
+    def tick(self):
+        """后台行情一步: 标的随机游走, 做市商重挂, 随机主动成交, 偶发大宗交易"""
+        self.spot *= math.exp(self.random.gauss(0, 0.0005))
+        for symbol in self.books:
+            self.requote(symbol)
+            if self.random.random() < TAKER_PROBABILITY:
+                side = self.random.choice(("BUY", "SELL"))
+                qty = round(self.random.uniform(*TAKER_QTY), 2)
+                self.place(symbol, side, qty, None, order_type="MARKET", owner="taker")
+                self.flush(symbol)
+            if self.random.random() < BLOCK_PROBABILITY:
+                self._record_block_trade(symbol)
+
+    def _record_block_trade(self, symbol):
+        """大宗交易不经过订单簿: 不影响深度、最新价和成交量"""
+        price = round_price(self.fair_price(symbol) * (1 + self.random.uniform(-BLOCK_PRICE_SPREAD, BLOCK_PRICE_SPREAD)))
+        if price <= 0:
+            return
+        qty = round(self.random.uniform(*BLOCK_QTY), 2)
+        self.block_trades[symbol].append({
+            "id": next(self._block_trade_ids),
+            "symbol": symbol,
+            "price": fmt(price),
+            "qty": fmt(qty),
+            "quoteQty": fmt(price * qty),
+            "side": self.random.choice((1, -1)),
+            "time": now_ms(),
+        })
+
+    # ---------- 下单/撤单 ----------
+
+    def place(self, symbol, side, quantity, price, order_type="LIMIT", time_in_force="GTC",
+              client_order_id=None, owner="user", listen_key=None):
+        book = self.books[symbol]
+        ts = now_ms()
+        order = {
+            "orderId": next(self._order_ids),
+            "symbol": symbol,
+            "side": side,
+            "type": order_type,
+            "timeInForce": time_in_force,
+            "priceValue": price,
+            "quantityValue": quantity,
+            "left": quantity,
+            "executed": 0.0,
+            "quote": 0.0,
+            "status": "ACCEPTED",
+            "clientOrderId": client_order_id or f"mock-{ts}-{self.stats['orders']}",
+            "createTime": ts,
+            "updateTime": ts,
+            "owner": owner,
+            "listenKey": listen_key,
+        }
+        if owner == "user":
+            self.client_ids[order["clientOrderId"]] = order["orderId"]
+            self.stats["orders"] += 1
+            # 只保留用户订单, 做市商和吃单者的订单不进历史, 避免内存增长
+            self.orders[order["orderId"]] = order
+
+        opposite = "SELL" if side == "BUY" else "BUY"
+        if time_in_force == "FOK" and self._available(book, opposite, price) < quantity - 1e-12:
+            order["left"] = 0.0
+            order["status"] = "CANCELLED"
+            self._order_event(order)
+            return order
+
+        while order["left"] > 1e-12:
+            best = book.best(opposite)
+            if best is None or (price is not None and (best > price if side == "BUY" else best < price)):
+                break
+            queue = book.levels[opposite][best]
+            resting = queue[0]
+            qty = min(order["left"], resting["left"])
+            self._fill(resting, qty, best)
+            self._fill(order, qty, best)
+            book.reduce(opposite, best, qty)
+            self._mark_changed(symbol, opposite, best)
+            if resting["left"] <= 1e-12:
+                queue.popleft()
+                if not queue:
+                    book._drop_level(opposite, best)
+            self._record_trade(book, side, best, qty)
+
+        if order["left"] > 1e-12:
+            if order_type == "LIMIT" and time_in_force == "GTC":
+                book.add(order)
+                self._mark_changed(symbol, side, price)
+            else:
+                order["status"] = "CANCELLED"
+                order["left"] = 0.0
+        if owner == "user" or order["status"] != "ACCEPTED":
+            self._order_event(order)
+        return order
+
+    def _available(self, book, side, limit_price):
+        total = 0.0
+        for price in (reversed(book.prices[side]) if side == "BUY" else book.prices[side]):
+            if limit_price is not None and (price < limit_price if side == "BUY" else price > limit_price):
+                break
+            total += book.level_qty(side, price)
+        return total
+
+    def _fill(self, order, qty, price):
+        order["left"] -= qty
+        order["executed"] += qty
+        order["quote"] += qty * price
+        order["status"] = "FILLED" if order["left"] <= 1e-12 else "PARTIALLY_FILLED"
+        order["updateTime"] = now_ms()
+        if order["owner"] == "user":
+            self.stats["fills"] += 1
+            self._order_event(order)
+
+    def _record_trade(self, book, taker_side, price, qty):
+        book.last_price = price
+        book.volume += qty
+        self.trades[book.symbol].append({
+            "id": next(self._trade_ids),
+            "symbol": book.symbol,
+            "price": fmt(price),
+            "qty": fmt(qty),
+            "quoteQty": fmt(price * qty),
+            "side": 1 if taker_side == "BUY" else -1,
+            "time": now_ms(),
+        })
+
+    def cancel(self, symbol, order_id=None, client_order_id=None):
+        if order_id is None:
+            order_id = self.client_ids.get(client_order_id)
+        order = self.orders.get(order_id)
+        if order is None or order["symbol"] != symbol or order["owner"] != "user":
+            return None
+        if order["status"] not in ACTIVE_STATUSES:
+            return False
+        self._cancel(self.books[symbol], order)
+        self.flush(symbol)
+        return order
+
+    def _cancel(self, book, order):
+        book.remove(order)
+        self._mark_changed(book.symbol, order["side"], order["priceValue"])
+        order["status"] = "CANCELLED"
+        order["left"] = 0.0
+        order["updateTime"] = now_ms()
+        self._order_event(order)
+
+    def get(self, order_id=None, client_order_id=None):
+        if order_id is None:
+            order_id = self.client_ids.get(client_order_id)
+        order = self.orders.get(order_id)
+        return order if order is not None and order["owner"] == "user" else None
+
+    # ---------- 事件 ----------
+
+    def _mark_changed(self, symbol, side, price):
+        self._changed.setdefault(symbol, set()).add((side, price))
+
+    def flush(self, symbol):
+        """把本次操作改动的价位合并成一条深度增量事件推送"""
+        changed = self._changed.pop(symbol, None)
+        if not changed:
+            return
+        book = self.books[symbol]
+        previous = book.update_id
+        book.update_id += 1
+        ts = now_ms()
+        event = {
+            "e": "depthUpdate", "E": ts, "T": ts, "s": symbol,
+            "U": book.update_id, "u": book.update_id, "pu": previous,
+            "b": [[fmt(p), fmt(book.level_qty("BUY", p))] for side, p in sorted(changed) if side == "BUY"],
+            "a": [[fmt(p), fmt(book.level_qty("SELL", p))] for side, p in sorted(changed) if side == "SELL"],
+        }
+        for queue in list(self.depth_listeners[symbol]):
+            queue.put_nowait(event)
+
+    def _order_event(self, order):
+        if order["owner"] != "user":
+            return
+        event = {
+            "e": "ORDER_TRADE_UPDATE",
+            "E": now_ms(),
+            "o": [{
+                "T": order["createTime"], "t": order["updateTime"], "s": order["symbol"], "c": order["clientOrderId"],
+                "oid": str(order["orderId"]), "p": fmt(order["priceValue"] or 0), "q": fmt(order["quantityValue"]),
+                "stp": 0, "r": False, "po": True, "S": order["status"], "e": fmt(order["executed"]),
+                "ec": fmt(order["quote"]), "f": "0", "tif": order["timeInForce"], "oty": order["type"],
+            }],
+        }
+        for key in ([order["listenKey"]] if order["listenKey"] else list(self.user_listeners)):
+            for queue in list(self.user_listeners.get(key, ())):
+                queue.put_nowait(event)
+
+    def to_api(self, order):
+        """订单的接口返回格式"""
+        executed = order["executed"]
+        return {
+            "orderId": order["orderId"],
+            "symbol": order["symbol"],
+            "price": fmt(order["priceValue"] or 0),
+            "quantity": fmt(order["quantityValue"]),
+            "executedQty": fmt(executed),
+            "fee": "0",
+            "side": order["side"],
+            "type": order["type"],
+            "timeInForce": order["timeInForce"],
+            "reduceOnly": False,
+            "postOnly": False,
+            "createTime": order["createTime"],
+            "updateTime": order["updateTime"],
+            "status": order["status"],
+            "avgPrice": fmt(order["quote"] / executed) if executed else "0",
+            "clientOrderId": order["clientOrderId"],
+            "priceScale": 1,
+            "quantityScale": 2,
+            "optionSide": self.contracts[order["symbol"]]["side"],
+            "quoteAsset": "USDT",
+            "mmp": False,
+        }
+
+
+class FaultInjector:
+    """延迟、错误、挂起和限频注入"""
+
+    def __init__(self, latency_ms=0.0, jitter_ms=0.0, error_rate=0.0, hang_rate=0.0, hang_seconds=30.0,
+                 weight_limit=None, order_limit_10s=None, clock_offset_ms=0, recv_window_check=True, seed=None):
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.error_rate = error_rate
+        self.hang_rate = hang_rate
+        self.hang_seconds = hang_seconds
+        self.weight_limit = weight_limit
+        self.order_limit_10s = order_limit_10s
+        self.clock_offset_ms = clock_offset_ms
+        self.recv_window_check = recv_window_check
+        self.random = random.Random(seed)
+        # 固定窗口计数: (窗口起点, 已用)
+        self.weight_window = (0, 0)
+        self.order_window = (0, 0)
+        self.stats = collections.Counter()
+
+    def server_time(self):
+        return now_ms() + self.clock_offset_ms
+
+    def charge(self, method, path):
+        """按接口权重/下单数计入当前窗口, 超限返回需要等待的秒数, 否则返回 (None, 响应头)"""
+        weight, orders = request_cost(method, path)
+        now = time.time()
+        minute = int(now // 60)
+        start, used = self.weight_window
+        used = used + weight if start == minute else weight
+        self.weight_window = (minute, used)
+        headers = {"X-MBX-USED-WEIGHT-1M": str(used)}
+
+        ten = int(now // 10)
+        start, order_used = self.order_window
+        order_used = order_used + orders if start == ten else orders
+        self.order_window = (ten, order_used)
+        if orders:
+            headers["X-MBX-ORDER-COUNT-10S"] = str(order_used)
+
+        if self.weight_limit and used > self.weight_limit:
+            return math.ceil(60 - now % 60), headers
+        if self.order_limit_10s and orders and order_used > self.order_limit_10s:
+            return math.ceil(10 - now % 10), headers
+        return None, headers
+
+
+class MockExchange:
+    """aiohttp 应用: REST + WebSocket"""
+
+    def __init__(self, engine, faults, flow_interval=FLOW_INTERVAL):
+        self.engine = engine
+        self.faults = faults
+        self.flow_interval = flow_interval
+        self.app = web.Application(middlewares=[self.middleware])
+        self.app.add_routes([
+            web.get('/eapi/v1/time', self.time),
+            web.get('/eapi/v1/exchangeInfo', self.exchange_info),
+            web.get('/eapi/v1/depth', self.depth),
+            web.get('/eapi/v1/ticker', self.ticker),
+            web.get('/eapi/v1/mark', self.mark),
+            web.get('/eapi/v1/index', self.index),
+            web.get('/eapi/v1/trades', self.trades),
+            web.get('/eapi/v1/blockTrades', self.block_trades),
+            web.post('/eapi/v1/order', self.new_order),
+            web.get('/eapi/v1/order', self.query_order),
+            web.delete('/eapi/v1/order', self.cancel_order),
+            web.get('/eapi/v1/openOrders', self.open_orders),
+            web.get('/eapi/v1/historyOrders', self.history_orders),
+            web.post('/eapi/v1/batchOrders', self.batch_orders),
+            web.delete('/eapi/v1/batchOrders', self.cancel_batch),
+            web.post('/eapi/v1/listenKey', self.listen_key),
+            web.put('/eapi/v1/listenKey', self.listen_key),
+            web.delete('/eapi/v1/listenKey', self.listen_key),
+            web.get('/eapi/ws/{name}', self.ws_single),
+            web.get('/eapi/stream', self.ws_combined),
+            web.get('/mock/stats', self.mock_stats),
+        ])
+        self.app.on_startup.append(self._start_flow)
+        self.app.on_cleanup.append(self._stop_flow)
+        self._flow_task = None
+
+    # ---------- 中间件: 故障注入 ----------
+
+    @web.middleware
+    async def middleware(self, request, handler):
+        path = request.path
+        if not path.startswith('/eapi/v1/'):
+            return await handler(request)
+        faults = self.faults
+        faults.stats["requests"] += 1
+
+        delay = faults.latency_ms + (faults.random.uniform(0, faults.jitter_ms) if faults.jitter_ms else 0)
+        if delay > 0:
+            await asyncio.sleep(delay / 1000)
+
+        retry_after, headers = faults.charge(request.method, path)
+        if retry_after is not None:
+            faults.stats["throttled"] += 1
+            headers["Retry-After"] = str(retry_after)
+            return web.json_response({"code": -1003, "msg": "Too many requests."}, status=429, headers=headers)
+        if faults.error_rate and faults.random.random() < faults.error_rate:
+            faults.stats["errors"] += 1
+            return web.json_response(INTERNAL_ERROR, status=503, headers=headers)
+
+        params = dict(request.query)
+        if request.can_read_body:
+            params.update(urllib.parse.parse_qsl(await request.text()))
+        request["params"] = params
+        if faults.recv_window_check and 'timestamp' in params:
+            drift = abs(faults.server_time() - int(params['timestamp']))
+            if drift > int(params.get('recvWindow', 5000)):
+                faults.stats["timestamp_errors"] += 1
+                return web.json_response(
+                    {"code": -1021, "msg": "Timestamp for this request is outside of the recvWindow."},
+                    status=400, headers=headers)
+
+        response = await handler(request)
+        response.headers.update(headers)
+        # 挂起: 请求已处理 (订单已创建), 但迟迟不返回, 用于测试超时后的幂等重发
+        if faults.hang_rate and faults.random.random() < faults.hang_rate:
+            faults.stats["hangs"] += 1
+            await asyncio.sleep(faults.hang_seconds)
+        return response
+
+    # ---------- 行情 ----------
+
+    async def time(self, request):
+        return web.json_response({"serverTime": self.faults.server_time()})
+
+    async def exchange_info(self, request):
+        symbols = []
+        for symbol, contract in self.engine.contracts.items():
+            symbols.append({
+                "symbol": symbol,
+                "underlying": contract["underlying"] + "USDT",
+                "side": contract["side"],
+                "strikePrice": fmt(contract["strike"]),
+                "expiryDate": contract["expiry"],
+                "unit": 1,
+                "quoteAsset": "USDT",
+                "minQty": fmt(MIN_QTY),
+                "maxQty": "10000",
+                "filters": [
+                    {"filterType": "PRICE_FILTER", "minPrice": fmt(TICK_SIZE), "maxPrice": "100000", "tickSize": fmt(TICK_SIZE)},
+                    {"filterType": "LOT_SIZE", "minQty": fmt(MIN_QTY), "maxQty": "10000", "stepSize": fmt(STEP_SIZE)},
+                ],
+            })
+        return web.json_response({"timezone": "UTC", "serverTime": self.faults.server_time(), "optionSymbols": symbols})
+
+    def _book(self, request):
+        symbol = request["params"].get("symbol")
+        book = self.engine.books.get(symbol)
+        if book is None:
+            raise web.HTTPBadRequest(text=json.dumps({"code": -1121, "msg": "Invalid symbol."}),
+                                     content_type='application/json')
+        return book
+
+    async def depth(self, request):
+        book = self._book(request)
+        bids, asks = book.depth(int(request["params"].get("limit", 100)))
+        return web.json_response({"bids": bids, "asks": asks, "T": now_ms(), "u": book.update_id})
+
+    async def ticker(self, request):
+        rows = []
+        for symbol, book in self.engine.books.items():
+            bid, ask = book.best("BUY"), book.best("SELL")
+            rows.append({
+                "symbol": symbol,
+                "lastPrice": fmt(book.last_price or 0),
+                "bidPrice": fmt(bid or 0),
+                "askPrice": fmt(ask or 0),
+                "volume": fmt(book.volume),
+                "strikePrice": fmt(self.engine.contracts[symbol]["strike"]),
+            })
+        return web.json_response(rows)
+
+    async def mark(self, request):
+        rows = []
+        for symbol, contract in self.engine.contracts.items():
+            values = greeks(self.engine.spot, contract["strike"], year_fraction(contract["expiry"]),
+                            self.engine.vol, contract["side"] == "CALL")
+            rows.append({
+                "symbol": symbol,
+                "markPrice": fmt(round_price(self.engine.fair_price(symbol))),
+                "markIV": fmt(self.engine.vol),
+                "bidIV": fmt(self.engine.vol),
+                "askIV": fmt(self.engine.vol),
+                **{name: f"{float(values[name]):.5f}" for name in ("delta", "gamma", "vega", "theta")},
+            })
+        return web.json_response(rows)
+
+    async def index(self, request):
+        return web.json_response({"time": now_ms(), "indexPrice": fmt(self.engine.spot)})
+
+    async def trades(self, request):
+        book = self._book(request)
+        limit = int(request["params"].get("limit", 100))
+        return web.json_response(list(self.engine.trades[book.symbol])[-limit:])
+
+    async def block_trades(self, request):
+        book = self._book(request)
+        limit = int(request["params"].get("limit", 100))
+        return web.json_response(list(self.engine.block_trades[book.symbol])[-limit:])
+
+    # ---------- 交易 ----------
+
+    def _place(self, params):
+        symbol = params.get("symbol")
+        if symbol not in self.engine.books:
+            return {"code": -1121, "msg": "Invalid symbol."}
+        client_order_id = params.get("clientOrderId")
+        if client_order_id and client_order_id in self.engine.client_ids:
+            return {"code": -2010, "msg": "Duplicate clientOrderId."}
+        try:
+            quantity = float(params["quantity"])
+            price = float(params["price"]) if params.get("price") is not None else None
+        except (KeyError, ValueError):
+            return {"code": -1102, "msg": "Mandatory parameter 'quantity' was not sent, was empty/null, or malformed."}
+        order_type = params.get("type", "LIMIT")
+        if order_type == "LIMIT" and price is None:
+            return {"code": -1102, "msg": "Mandatory parameter 'price' was not sent, was empty/null, or malformed."}
+        if quantity < MIN_QTY:
+            return {"code": -4003, "msg": "Quantity less than zero or min qty."}
+        order = self.engine.place(symbol, params.get("side", "BUY"), quantity, price, order_type,
+                                  params.get("timeInForce", "GTC"), client_order_id,
+                                  listen_key=None)
+        self.engine.flush(symbol)
+        return self.engine.to_api(order)
+
+    async def new_order(self, request):
+        result = self._place(request["params"])
+        return web.json_response(result, status=400 if "code" in result else 200)
+
+    async def query_order(self, request):
+        params = request["params"]
+        order = self.engine.get(int(params["orderId"]) if params.get("orderId") else None, params.get("clientOrderId"))
+        if order is None:
+            return web.json_response({"code": -2013, "msg": "Order does not exist."}, status=400)
+        return web.json_response(self.engine.to_api(order))
+
+    async def cancel_order(self, request):
+        params = request["params"]
+        order = self.engine.cancel(params.get("symbol"), int(params["orderId"]) if params.get("orderId") else None,
+                                   params.get("clientOrderId"))
+        if order is None:
+            return web.json_response({"code": -2013, "msg": "Order does not exist."}, status=400)
+        if order is False:
+            return web.json_response({"code": -2011, "msg": "Unknown order sent."}, status=400)
+        return web.json_response(self.engine.to_api(order))
+
+    async def open_orders(self, request):
+        symbol = request["params"].get("symbol")
+        return web.json_response([
+            self.engine.to_api(o) for o in self.engine.orders.values()
+            if o["owner"] == "user" and o["status"] in ACTIVE_STATUSES and (symbol is None or o["symbol"] == symbol)
+        ])
+
+    async def history_orders(self, request):
+        params = request["params"]
+        symbol = params.get("symbol")
+        order_id = int(params["orderId"]) if params.get("orderId") else None
+        limit = int(params.get("limit", 100))
+        orders = [
+            self.engine.to_api(o) for o in self.engine.orders.values()
+            if o["owner"] == "user" and o["status"] not in ACTIVE_STATUSES and o["symbol"] == symbol
+            and (order_id is None or o["orderId"] >= order_id)
+        ]
+        return web.json_response(orders[:limit])
+
+    async def batch_orders(self, request):
+        try:
+            batch = json.loads(request["params"].get("orders", "[]"))
+        except json.JSONDecodeError:
+            return web.json_response({"code": -1102, "msg": "Malformed orders."}, status=400)
+        return web.json_response([self._place(item) for item in batch[:10]])
+
+    async def cancel_batch(self, request):
+        params = request["params"]
+        results = []
+        for order_id in json.loads(params.get("orderIds", "[]")):
+            order = self.engine.cancel(params.get("symbol"), int(order_id))
+            if order:
+                results.append(self.engine.to_api(order))
+            else:
+                results.append({"code": -2011, "msg": "Unknown order sent."})
+        return web.json_response(results)
+
+    async def listen_key(self, request):
+        if request.method == "POST":
+            key = f"mock{len(self.engine.listen_keys) + 1:060d}"
+            self.engine.listen_keys.add(key)
+            return web.json_response({"listenKey": key})
+        return web.json_response({})
+
+    # ---------- WebSocket ----------
+
+    async def _serve_ws(self, request, channels, combined):
+        ws = web.WebSocketResponse(heartbeat=30)
+        await ws.prepare(request)
+        queue = asyncio.Queue()
+        for registry, key, _ in channels:
+            registry[key].add(queue)
+
+        async def writer():
+            while True:
+                event = await queue.get()
+                if combined:
+                    name = next((n for _, k, n in channels if k == event.get("s")), channels[0][2])
+                    if event.get("e") == "ORDER_TRADE_UPDATE":
+                        name = next((n for r, _, n in channels if r is self.engine.user_listeners), name)
+                    event = {"stream": name, "data": event}
+                await ws.send_str(json.dumps(event))
+
+        task = asyncio.ensure_future(writer())
+        try:
+            async for message in ws:
+                if message.type == WSMsgType.ERROR:
+                    break
+        finally:
+            task.cancel()
+            for registry, key, _ in channels:
+                registry[key].discard(queue)
+        return ws
+
+    def _channel(self, name):
+        if name in self.engine.listen_keys:
+            return self.engine.user_listeners, name, name
+        symbol = name.split('@')[0]
+        if symbol in self.engine.books:
+            return self.engine.depth_listeners, symbol, name
+        return None
+
+    async def ws_single(self, request):
+        channel = self._channel(request.match_info['name'])
+        if channel is None:
+            raise web.HTTPNotFound()
+        return await self._serve_ws(request, [channel], combined=False)
+
+    async def ws_combined(self, request):
+        channels = [c for c in (self._channel(name) for name in request.query.get('streams', '').split('/')) if c]
+        if not channels:
+            raise web.HTTPNotFound()
+        return await self._serve_ws(request, channels, combined=True)
+
+    async def mock_stats(self, request):
+        return web.json_response({"engine": dict(self.engine.stats), "faults": dict(self.faults.stats)})
+
+    # ---------- 后台行情 ----------
+
+    async def _start_flow(self, app):
+        for symbol in self.engine.books:
+            self.engine.requote(symbol)
+        if self.flow_interval > 0:
+            self._flow_task = asyncio.ensure_future(self._flow())
+
+    async def _stop_flow(self, app):
+        if self._flow_task is not None:
+            self._flow_task.cancel()
+
+    async def _flow(self):
+        while True:
+            await asyncio.sleep(self.flow_interval)
+            self.engine.tick()
+
+
+def create_app(symbols=None, spot=DEFAULT_SPOT, vol=DEFAULT_VOL, seed=None, flow_interval=FLOW_INTERVAL, **fault_options):
+    """创建模拟交易所应用, 测试和压测脚本可直接在进程内启动"""
+    engine = MatchingEngine(symbols or default_symbols(spot=spot), spot=spot, vol=vol, seed=seed)
+    exchange = MockExchange(engine, FaultInjector(seed=seed, **fault_options), flow_interval=flow_interval)
+    return exchange
+
+
+def main():
+    parser = argparse.ArgumentParser(description='本地模拟币安期权交易所')
+    parser.add_argument('--host', default='127.0.0.1', help='监听地址 (默认: 127.0.0.1)')
+    parser.add_argument('--port', type=int, default=DEFAULT_PORT, help=f'监听端口 (默认: {DEFAULT_PORT})')
+    parser.add_argument('--symbols', help='逗号分隔的合约, 默认生成30天后到期的ETH期权链')
+    parser.add_argument('--spot', type=float, default=DEFAULT_SPOT, help=f'标的初始价格 (默认: {DEFAULT_SPOT})')
+    parser.add_argument('--vol', type=float, default=DEFAULT_VOL, help=f'做市报价使用的波动率 (默认: {DEFAULT_VOL})')
+    parser.add_argument('--seed', type=int, help='随机种子, 固定后行情和故障注入可复现')
+    parser.add_argument('--flow-interval', type=float, default=FLOW_INTERVAL, help=f'后台行情间隔秒数, 0为关闭 (默认: {FLOW_INTERVAL})')
+    parser.add_argument('--latency-ms', type=float, default=0.0, help='每个请求的固定延迟毫秒')
+    parser.add_argument('--jitter-ms', type=float, default=0.0, help='每个请求额外的随机延迟上限毫秒')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='随机返回503的比例')
+    parser.add_argument('--hang-rate', type=float, default=0.0, help='处理后挂起不返回的比例 (模拟超时)')
+    parser.add_argument('--hang-seconds', type=float, default=30.0, help='挂起秒数 (默认: 30)')
+    parser.add_argument('--weight-limit', type=int, help='每分钟请求权重上限, 超出返回429')
+    parser.add_argument('--order-limit', type=int, help='每10秒下单数上限, 超出返回429')
+    parser.add_argument('--clock-offset-ms', type=int, default=0, help='服务器时钟相对本地的偏移毫秒')
+    parser.add_argument('--no-recv-window-check', action='store_true', help='不校验 timestamp/recvWindow')
+    args = parser.parse_args()
+
+    symbols = [s.strip() for s in args.symbols.split(',') if s.strip()] if args.symbols else None
+    exchange = create_app(
+        symbols, spot=args.spot, vol=args.vol, seed=args.seed, flow_interval=args.flow_interval,
+        latency_ms=args.latency_ms, jitter_ms=args.jitter_ms, error_rate=args.error_rate,
+        hang_rate=args.hang_rate, hang_seconds=args.hang_seconds, weight_limit=args.weight_limit,
+        order_limit_10s=args.order_limit, clock_offset_ms=args.clock_offset_ms,
+        recv_window_check=not args.no_recv_window_check,
+    )
+    print(f"模拟交易所: http://{args.host}:{args.port}, {len(exchange.engine.books)} 个合约")
+    print(f"合约示例: {', '.join(list(exchange.engine.books)[:4])} ...")
+    web.run_app(exchange.app, host=args.host, port=args.port, print=None)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,22 +1,43 @@
-import hmac
-import hashlib
-import time
 import requests
+import http_client
+import argparse
+import concurrent.futures
+import csv
 import json
-from urllib.parse import urlencode
+import time
+
+from signer import RequestSigner
 
 # --- 1. 配置您的API密钥 (请务必使用母账户的密钥) ---
 API_KEY = '你的母账户API_KEY'
 SECRET_KEY = '你的母账户SECRET_KEY'
 BASE_URL = 'https://api.binance.com'
+MOVE_POSITION_ENDPOINT = "/sapi/v1/sub-account/futures/move-position"
 
-# --- 2. 设置请求参数 ---
-params = {
-    'fromUserEmail': 'masteraccount@example.com',  # 源账户邮箱（母账户或子账户）
-    'toUserEmail': 'subaccount@example.com',       # 目标账户邮箱（母账户或子账户）
-    'productType': 'UM',                           # 仅支持 "UM" (U本位合约)
-    'timestamp': int(time.time() * 1000)
+# 单次请求最多转移的仓位数
+MAX_ORDER_ARGS = 10
+
+# 批量移仓: 并发请求数、每个仓位最多尝试次数、重试前等待秒数
+BULK_WORKERS = 4
+BULK_ATTEMPTS = 3
+RETRY_DELAY = 1.0
+
+# 移仓计划的列名 (CSV表头/JSON键), 左边为可接受的别名
+PLAN_FIELDS = {
+    'from': 'from', 'fromUserEmail': 'from',
+    'to': 'to', 'toUserEmail': 'to',
+    'symbol': 'symbol',
+    'qty': 'quantity', 'quantity': 'quantity',
+    'side': 'positionSide', 'positionSide': 'positionSide',
+    'productType': 'productType',
 }
+POSITION_SIDES = ('BOTH', 'LONG', 'SHORT')
+REPORT_COLUMNS = ('from', 'to', 'symbol', 'quantity', 'positionSide', 'status', 'attempts', 'side', 'price', 'error')
+
+# --- 2. 设置请求参数 ---
+FROM_EMAIL = 'masteraccount@example.com'  # 源账户邮箱（母账户或子账户）
+TO_EMAIL = 'subaccount@example.com'       # 目标账户邮箱（母账户或子账户）
+PRODUCT_TYPE = 'UM'                       # 仅支持 "UM" (U本位合约)
 
 # --- 3. 设置orderArgs参数 (支持多个仓位转移，最多10个) ---
 # 注意：这里使用特殊的URL编码格式，不是JSON
@@ -30,63 +51,253 @@ order_args = [
     }
     # 可以添加更多仓位，最多10个
     # {
-    #     'symbol': 'ETHUSDT', 
+    #     'symbol': 'ETHUSDT',
     #     'quantity': '0.01',
     #     'positionSide': 'BOTH'
     # }
 ]
 
-# 将orderArgs转换为URL参数格式
-for i, order in enumerate(order_args):
-    params[f'orderArgs[{i}].symbol'] = order['symbol']
-    params[f'orderArgs[{i}].quantity'] = order['quantity']
-    params[f'orderArgs[{i}].positionSide'] = order['positionSide']
 
-# 可选：设置接收窗口时间（毫秒）
-# params['recvWindow'] = 5000
+def build_params(from_email, to_email, positions, product_type=PRODUCT_TYPE):
+    """请求参数: orderArgs 展开为 orderArgs[i].symbol 形式的URL参数"""
+    params = {
+        'fromUserEmail': from_email,
+        'toUserEmail': to_email,
+        'productType': product_type,
+    }
+    for i, order in enumerate(positions):
+        params[f'orderArgs[{i}].symbol'] = order['symbol']
+        params[f'orderArgs[{i}].quantity'] = order['quantity']
+        params[f'orderArgs[{i}].positionSide'] = order['positionSide']
+    return params
 
-# --- 4. 生成签名 ---
-query_string = urlencode(params, doseq=True)  # doseq=True 处理列表参数
-signature = hmac.new(SECRET_KEY.encode('utf-8'), query_string.encode('utf-8'), hashlib.sha256).hexdigest()
-params['signature'] = signature
 
-# --- 5. 发送POST请求 ---
-headers = {
-    'X-MBX-APIKEY': API_KEY
-}
+def move_positions(from_email, to_email, positions, product_type=PRODUCT_TYPE, signer=None, base_url=BASE_URL):
+    """发送一次移仓请求 (最多10个仓位), 返回解析后的响应, 请求失败时抛出 requests 异常"""
+    if len(positions) > MAX_ORDER_ARGS:
+        raise ValueError(f"单次最多转移{MAX_ORDER_ARGS}个仓位")
+    # 签名器自动补上毫秒时间戳; 可选：设置接收窗口时间（毫秒）, 例如 RequestSigner(..., recv_window=5000)
+    signer = signer or RequestSigner(API_KEY, SECRET_KEY)
+    query_string = signer.sign_params(build_params(from_email, to_email, positions, product_type))
+    url = f"{base_url}{MOVE_POSITION_ENDPOINT}?{query_string}"
+    response = http_client.post(url, headers=signer.headers)
+    response.raise_for_status()
+    return response.json()
 
-endpoint_path = "/sapi/v1/sub-account/futures/move-position"
-url = f"{BASE_URL}{endpoint_path}"
 
-print(f"正在向以下URL发送POST请求: {url}")
-print(f"请求参数: {query_string}")
+def load_plan(path):
+    """读取移仓计划 (CSV 或 JSON 列表), 每行: from, to, symbol, qty, side(BOTH/LONG/SHORT), 可选 productType"""
+    with open(path, newline='', encoding='utf-8') as f:
+        rows = json.load(f) if path.endswith('.json') else list(csv.DictReader(f))
+    return [parse_plan_item(row, line) for line, row in enumerate(rows, 1)]
 
-try:
-    response = requests.post(url, headers=headers, params=params)
-    response.raise_for_status()
-    
-    # --- 6. 解读返回结果 ---
-    result = response.json()
-    print("\nAPI Response:")
-    print(json.dumps(result, indent=2))
-
-    # 检查移仓结果
-    if 'movePositionOrders' in result:
-        print("\n移仓操作完成！详细结果:")
-        for order in result['movePositionOrders']:
-            if order.get('success'):
-                print(f"✅ {order['symbol']}: {order['quantity']} 从 {order['fromUserEmail']} 转移到 {order['toUserEmail']} 成功")
-                print(f"   价格类型: {order['priceType']}, 价格: {order['price']}, 方向: {order['side']}")
-            else:
-                print(f"❌ {order['symbol']}: 转移失败")
-    else:
-        print(f"\n移仓失败。可能的错误信息: {result}")
-
-except requests.exceptions.RequestException as e:
-    print(f"请求发生错误: {e}")
-    if hasattr(e, 'response') and e.response:
+
+def parse_plan_item(row, line=None):
+    """校验并规范一行计划, 数量保留原字符串避免精度变化"""
+    item = {'productType': PRODUCT_TYPE, 'positionSide': 'BOTH'}
+    for key, value in row.items():
+        if key in PLAN_FIELDS and value not in (None, ''):
+            item[PLAN_FIELDS[key]] = str(value).strip()
+    where = f"第{line}行" if line is not None else "计划项"
+    missing = [key for key in ('from', 'to', 'symbol', 'quantity') if key not in item]
+    if missing:
+        raise ValueError(f"{where}缺少字段: {', '.join(missing)}")
+    item['positionSide'] = item['positionSide'].upper()
+    if item['positionSide'] not in POSITION_SIDES:
+        raise ValueError(f"{where}仓位方向无效: {item['positionSide']}")
+    try:
+        quantity = float(item['quantity'])
+    except ValueError:
+        quantity = 0
+    if quantity <= 0:
+        raise ValueError(f"{where}数量必须为正数: {item['quantity']}")
+    return item
+
+
+def chunk_plan(items):
+    """按 (源账户, 目标账户, 产品类型) 分组, 每组切成最多10个仓位的请求, 保持计划中的顺序"""
+    groups = {}
+    for item in items:
+        groups.setdefault((item['from'], item['to'], item['productType']), []).append(item)
+    return [
+        group[i:i + MAX_ORDER_ARGS]
+        for group in groups.values() for i in range(0, len(group), MAX_ORDER_ARGS)
+    ]
+
+
+def _match_results(chunk, orders):
+    """把响应里的 movePositionOrders 对应回计划项 (按 symbol+positionSide, 同键按顺序)"""
+    pending = {}
+    for order in orders:
+        pending.setdefault((order.get('symbol'), order.get('positionSide', 'BOTH')), []).append(order)
+    matched = []
+    for item in chunk:
+        candidates = pending.get((item['symbol'], item['positionSide']))
+        matched.append(candidates.pop(0) if candidates else None)
+    return matched
+
+
+def _send_chunk(chunk, signer, base_url):
+    """发送一个分块, 返回 [(计划项, 结果状态, 详情)]; 状态: success / retry / failed / unknown / split"""
+    first = chunk[0]
+    positions = [
+        {'symbol': item['symbol'], 'quantity': item['quantity'], 'positionSide': item['positionSide']}
+        for item in chunk
+    ]
+    try:
+        result = move_positions(first['from'], first['to'], positions, first['productType'], signer, base_url)
+    except requests.exceptions.HTTPError as e:
+        status = e.response.status_code
         try:
-            error_detail = e.response.json()
-            print(f"错误详情: {json.dumps(error_detail, indent=2)}")
-        except:
-            print(f"错误详情: {e.response.text}")
\ No newline at end of file
+            error = e.response.json().get('msg', e.response.text)
+        except ValueError:
+            error = e.response.text
+        if status in (418, 429):
+            # 被限频拒绝, 未执行, 整块可安全重试 (限速器已按 Retry-After 暂停)
+            return [(item, 'retry', error) for item in chunk]
+        if status >= 500:
+            # 服务器错误时移仓可能已执行, 不自动重发
+            return [(item, 'unknown', f"{status}: {error}") for item in chunk]
+        if len(chunk) > 1:
+            # 参数错误: 拆成单个仓位重发, 定位出错的那一项
+            return [(item, 'split', error) for item in chunk]
+        return [(first, 'failed', f"{status}: {error}")]
+    except requests.exceptions.ConnectTimeout as e:
+        # 连接未建立, 请求没有发出, 可安全重试
+        return [(item, 'retry', str(e)) for item in chunk]
+    except requests.exceptions.RequestException as e:
+        # 读取超时、连接中断等: 请求可能已被执行, 结果未知
+        return [(item, 'unknown', str(e)) for item in chunk]
+
+    outcomes = []
+    for item, order in zip(chunk, _match_results(chunk, result.get('movePositionOrders', []))):
+        if order is None:
+            outcomes.append((item, 'unknown', f"响应中没有该仓位: {result}"))
+        elif order.get('success'):
+            outcomes.append((item, 'success', order))
+        else:
+            outcomes.append((item, 'retry', order.get('msg') or '移仓失败'))
+    return outcomes
+
+
+def move_bulk(items, workers=BULK_WORKERS, attempts=BULK_ATTEMPTS, signer=None, base_url=BASE_URL,
+              retry_delay=RETRY_DELAY):
+    """批量移仓: 分块并发发送 (经共享限速器), 失败的仓位单独重新分块重试, 返回每个计划项一行的结果报告"""
+    signer = signer or RequestSigner(API_KEY, SECRET_KEY)
+    report = [
+        {'from': item['from'], 'to': item['to'], 'symbol': item['symbol'], 'quantity': item['quantity'],
+         'positionSide': item['positionSide'], 'status': 'pending', 'attempts': 0,
+         'side': '', 'price': '', 'error': ''}
+        for item in items
+    ]
+    rows = {id(item): row for item, row in zip(items, report)}
+    chunks = chunk_plan(items)
+    round_number = 0
+    with concurrent.futures.ThreadPoolExecutor(max_workers=workers) as pool:
+        while chunks:
+            round_number += 1
+            if round_number > 1:
+                print(f"第{round_number}轮: 重试 {sum(len(c) for c in chunks)} 个仓位")
+                time.sleep(retry_delay)
+            retry, split = [], []
+            for outcomes in pool.map(lambda chunk: _send_chunk(chunk, signer, base_url), chunks):
+                for item, status, detail in outcomes:
+                    row = rows[id(item)]
+                    row['attempts'] += 1
+                    if status == 'success':
+                        row.update(status='success', side=detail.get('side', ''), price=detail.get('price', ''), error='')
+                    elif status == 'split':
+                        # 拆分不计入尝试次数
+                        row['attempts'] -= 1
+                        split.append(item)
+                    elif status == 'retry' and row['attempts'] < attempts:
+                        row['error'] = detail
+                        retry.append(item)
+                    else:
+                        row.update(status='failed' if status == 'retry' else status, error=detail)
+            chunks = chunk_plan(retry) + [[item] for item in split]
+    return report
+
+
+def write_report(report, path):
+    """结果报告写入 CSV 或 JSON (按扩展名)"""
+    with open(path, 'w', newline='', encoding='utf-8') as f:
+        if path.endswith('.json'):
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        else:
+            writer = csv.DictWriter(f, fieldnames=REPORT_COLUMNS)
+            writer.writeheader()
+            writer.writerows(report)
+
+
+def print_report(report):
+    counts = {}
+    for row in report:
+        counts[row['status']] = counts.get(row['status'], 0) + 1
+        mark = {'success': '✅', 'unknown': '❓'}.get(row['status'], '❌')
+        detail = f"方向: {row['side']}, 价格: {row['price']}" if row['status'] == 'success' else row['error']
+        print(f"{mark} {row['symbol']} {row['positionSide']} {row['quantity']}: {row['from']} -> {row['to']} "
+              f"(尝试{row['attempts']}次) {detail}")
+    print(f"\n共 {len(report)} 个仓位: " + ", ".join(f"{status} {count}" for status, count in sorted(counts.items())))
+    if counts.get('unknown'):
+        print("结果未知的仓位请先核对账户持仓再决定是否重新移仓")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='子账户合约仓位转移')
+    parser.add_argument('--plan', help='批量移仓计划 (CSV/JSON: from,to,symbol,qty,side), 不指定时使用文件中的配置')
+    parser.add_argument('--workers', type=int, default=BULK_WORKERS, help=f'并发请求数 (默认: {BULK_WORKERS})')
+    parser.add_argument('--attempts', type=int, default=BULK_ATTEMPTS, help=f'每个仓位最多尝试次数 (默认: {BULK_ATTEMPTS})')
+    parser.add_argument('--report', help='结果报告输出路径 (.csv 或 .json)')
+    parser.add_argument('--base-url', default=BASE_URL, help=f'接口地址 (默认: {BASE_URL})')
+    args = parser.parse_args()
+
+    if args.plan:
+        try:
+            items = load_plan(args.plan)
+        except (OSError, ValueError) as e:
+            print(f"读取移仓计划失败: {e}")
+            return
+        chunks = chunk_plan(items)
+        print(f"移仓计划: {len(items)} 个仓位, {len(chunks)} 个请求, 并发 {args.workers}")
+        report = move_bulk(items, args.workers, args.attempts, base_url=args.base_url)
+        print_report(report)
+        if args.report:
+            write_report(report, args.report)
+            print(f"结果报告已写入 {args.report}")
+        return
+
+    print(f"正在向 {args.base_url}{MOVE_POSITION_ENDPOINT} 发送移仓请求")
+    print(f"请求参数: {build_params(FROM_EMAIL, TO_EMAIL, order_args)}")
+
+    try:
+        result = move_positions(FROM_EMAIL, TO_EMAIL, order_args, base_url=args.base_url)
+
+        # --- 6. 解读返回结果 ---
+        print("\nAPI Response:")
+        print(json.dumps(result, indent=2))
+
+        # 检查移仓结果
+        if 'movePositionOrders' in result:
+            print("\n移仓操作完成！详细结果:")
+            for order in result['movePositionOrders']:
+                if order.get('success'):
+                    print(f"✅ {order['symbol']}: {order['quantity']} 从 {order['fromUserEmail']} 转移到 {order['toUserEmail']} 成功")
+                    print(f"   价格类型: {order['priceType']}, 价格: {order['price']}, 方向: {order['side']}")
+                else:
+                    print(f"❌ {order['symbol']}: 转移失败")
+        else:
+            print(f"\n移仓失败。可能的错误信息: {result}")
+
+    except requests.exceptions.RequestException as e:
+        print(f"请求发生错误: {e}")
+        if hasattr(e, 'response') and e.response:
+            try:
+                error_detail = e.response.json()
+                print(f"错误详情: {json.dumps(error_detail, indent=2)}")
+            except:
+                print(f"错误详情: {e.response.text}")
+
+
+if __name__ == "__main__":
+    main()
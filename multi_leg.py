@@ -0,0 +1,444 @@
+# 多腿组合执行 - 价差/跨式等组合各腿并发挂单, 限制腿间成交进度差, 报告实际净权利金
+# 每条腿一个线程, 复用 market_trade 的下单/撤单/订单状态逻辑和共享的订单跟踪器:
+#   - 挂单数量按最慢腿的完成比例封顶: 任何一条腿的成交比例不会超过 最慢腿 + --max-imbalance
+#   - 领先的腿被封顶等待超过 --lag-timeout 秒视为失衡: hedge 模式对落后腿按对手价穿价补齐, cancel 模式撤掉所有挂单停止
+#   - 被动挂单: 卖单比卖一便宜 discount (不低于买一则挂卖一), 买单比买一高 discount (不高于卖一则挂买一), 不再是最优价时撤单重挂
+# python multi_leg.py --leg SELL:ETH-250728-3600-C:1 --leg BUY:ETH-250728-3700-C:1 --max-imbalance 0.2
+# python multi_leg.py --leg SELL:ETH-250728-3600-C:1 --leg SELL:ETH-250728-3600-P:1 --on-breach cancel
+import argparse
+import json
+import threading
+import time
+from decimal import Decimal
+
+import market_trade
+import metrics
+from local_orderbook import LocalOrderBook
+from market_trade import (ORDER_UNKNOWN, RECOVER_LOOKBACK_MS, calculate_order_price, cancel_order,
+                          check_order_status, configure_endpoints, get_top_of_book, recover_job, retry_delay,
+                          send_limit_order, ws_options)
+from order_manager import OrderManager, to_decimal
+from order_tracker import OrderTracker
+from risk_book import RiskBook
+from risk_gate import RiskGate, load_limits
+
+DEFAULT_MAX_IMBALANCE = 0.2
+DEFAULT_LAG_TIMEOUT = 30.0
+DEFAULT_REQUOTE_INTERVAL = 1.0
+BREACH_ACTIONS = ("hedge", "cancel")
+
+# 协调线程检查失衡的间隔秒数
+COORDINATOR_INTERVAL = 0.2
+
+
+def calculate_buy_price(best_bid_price, best_ask_price, discount):
+    """买单挂单价格: 买一加折扣; 若不低于卖一则直接挂买一价格 (与 calculate_order_price 对称)"""
+    calculated_price = best_bid_price + discount
+    if calculated_price >= best_ask_price:
+        return best_bid_price
+    return calculated_price
+
+
+def parse_leg(text):
+    """'SELL:ETH-250728-3600-C:1' -> (side, symbol, quantity)"""
+    parts = text.split(':')
+    if len(parts) != 3 or parts[0].upper() not in ("BUY", "SELL"):
+        raise ValueError(f"腿格式应为 方向:合约:数量, 例如 SELL:ETH-250728-3600-C:1, 收到: {text}")
+    quantity = to_decimal(parts[2])
+    if quantity <= 0:
+        raise ValueError(f"数量必须为正数: {text}")
+    return parts[0].upper(), parts[1], quantity
+
+
+class Leg:
+    """组合中的一条腿: 独立的订单管理, 成交进度由协调器读取"""
+
+    def __init__(self, side, symbol, quantity, filters, book=None, on_fill=None):
+        self.side = side
+        self.symbol = symbol
+        self.filters = filters
+        self.book = book
+        self.manager = OrderManager(symbol, side, quantity, on_fill=on_fill)
+        # 已成交数量的快照, 只在持锁时更新, 供其他线程读取
+        self.filled = Decimal(0)
+        # 协调器要求下一笔按对手价穿价补齐
+        self.hedge = False
+        self.hedged_qty = Decimal(0)
+
+    @property
+    def total(self):
+        return self.manager.total_qty
+
+    @property
+    def progress(self):
+        return self.filled / self.total
+
+    @property
+    def done(self):
+        return self.filled >= self.total
+
+    def premium(self):
+        """已成交部分的权利金: 卖出为正, 买入为负 (按挂单价计算, 穿价单的实际成交价只会更优)"""
+        amount = sum((order["executedQty"] * order["price"] for order in self.manager.orders.values()), Decimal(0))
+        return amount if self.side == "SELL" else -amount
+
+    def average_price(self):
+        if not self.filled:
+            return None
+        return abs(self.premium()) / self.filled
+
+    def label(self):
+        return f"{self.side} {self.symbol}"
+
+
+class MultiLegExecutor:
+    """多腿并发执行, 按最慢腿进度封顶各腿挂单数量"""
+
+    def __init__(self, legs, discount=5.0, max_imbalance=DEFAULT_MAX_IMBALANCE, lag_timeout=DEFAULT_LAG_TIMEOUT,
+                 on_breach="hedge", requote_interval=DEFAULT_REQUOTE_INTERVAL, tracker=None, stop_event=None):
+        if on_breach not in BREACH_ACTIONS:
+            raise ValueError(f"失衡处理方式应为 {BREACH_ACTIONS} 之一")
+        self.legs = legs
+        self.discount = discount
+        self.max_imbalance = Decimal(str(max_imbalance))
+        self.lag_timeout = lag_timeout
+        self.on_breach = on_breach
+        self.requote_interval = requote_interval
+        self.tracker = tracker or OrderTracker(
+            market_trade.API_KEY, market_trade.BASE_URL,
+            reconcile=lambda oid: check_order_status(self.tracker.symbol_of(oid), oid))
+        self.stop_event = stop_event or threading.Event()
+        self.breaches = 0
+        self._cond = threading.Condition()
+
+    # ---------- 进度 ----------
+
+    def floor(self):
+        """最慢腿的完成比例"""
+        return min(leg.progress for leg in self.legs)
+
+    def imbalance(self):
+        return max(leg.progress for leg in self.legs) - self.floor()
+
+    def allowed_qty(self, leg):
+        """该腿当前还可以挂出的数量: 成交后不超过 (最慢腿比例 + 最大失衡) * 该腿总量"""
+        with self._cond:
+            cap = min(leg.total, (self.floor() + self.max_imbalance) * leg.total)
+            return leg.filters.quantize_qty(cap - leg.filled)
+
+    def _record(self, leg, client_order_id, status, executed_qty, hedging=False):
+        """更新订单成交并唤醒其他腿 (被封顶的腿可能因此可以继续挂单)"""
+        with self._cond:
+            delta = leg.manager.update(client_order_id, status, executed_qty)
+            leg.filled = leg.manager.executed_qty
+            if hedging:
+                leg.hedged_qty += delta
+            self._cond.notify_all()
+        return delta
+
+    # ---------- 执行 ----------
+
+    def run(self):
+        """启动各腿线程并协调失衡, 全部完成或停止后返回"""
+        threads = [threading.Thread(target=self._work_leg, args=(leg,), daemon=True) for leg in self.legs]
+        for thread in threads:
+            thread.start()
+        blocked_since = None
+        while any(thread.is_alive() for thread in threads):
+            try:
+                time.sleep(COORDINATOR_INTERVAL)
+            except KeyboardInterrupt:
+                print("正在停止, 撤掉各腿挂单...")
+                self.stop_event.set()
+            if self.stop_event.is_set() or all(leg.done for leg in self.legs):
+                continue
+            # 有腿已被封顶 (失衡达到上限) 才开始计时
+            with self._cond:
+                blocked = self.imbalance() >= self.max_imbalance
+            if not blocked:
+                blocked_since = None
+                continue
+            if blocked_since is None:
+                blocked_since = time.monotonic()
+            if time.monotonic() - blocked_since < self.lag_timeout:
+                continue
+            self.breaches += 1
+            metrics.incr("leg_breaches", action=self.on_breach)
+            laggards = [leg for leg in self.legs if not leg.done and leg.progress == self.floor()]
+            if self.on_breach == "cancel":
+                print(f"腿间失衡 {float(self.imbalance()):.0%} 持续超过{self.lag_timeout}秒, 撤掉所有挂单停止执行")
+                self.stop_event.set()
+            else:
+                for leg in laggards:
+                    print(f"[{leg.label()}] 落后 {float(self.imbalance()):.0%} 超过{self.lag_timeout}秒, 按对手价补齐")
+                    leg.hedge = True
+            with self._cond:
+                self._cond.notify_all()
+            blocked_since = None
+        for thread in threads:
+            thread.join()
+        return self.report()
+
+    def _target_hedge_qty(self, leg):
+        """穿价补齐的数量: 追到领先腿的完成比例"""
+        with self._cond:
+            leader = max(other.progress for other in self.legs)
+            return leg.filters.quantize_qty(min(leg.total, leader * leg.total) - leg.filled)
+
+    def _work_leg(self, leg):
+        failures = 0
+        filters = leg.filters
+        reconcile_since = int(market_trade.TIME_SYNC.now()) - RECOVER_LOOKBACK_MS
+        while not leg.done and not self.stop_event.is_set():
+            halted = market_trade.trading_halted()
+            if halted is not None:
+                # 风控停止下单: 整个组合一起停止, 其他腿撤掉挂单后退出
+                print(f"[{leg.label()}] 风控已停止下单 ({halted}), 停止所有腿")
+                self.stop_event.set()
+                break
+            if leg.manager.open_qty > 0:
+                # 提交结果未知的订单可能已挂出: 按 clientOrderId 前缀对账并撤掉后才继续, 避免超额成交
+                print(f"[{leg.label()}] 有未确认的订单, 对账后再继续...")
+                reconciled = recover_job(leg.manager, reconcile_since)
+                with self._cond:
+                    leg.filled = leg.manager.executed_qty
+                    self._cond.notify_all()
+                if not reconciled:
+                    delay = retry_delay(failures)
+                    failures += 1
+                    time.sleep(delay)
+                    continue
+            qty = self._target_hedge_qty(leg) if leg.hedge else None
+            if qty is not None and (qty <= 0 or (filters.min_qty is not None and qty < filters.min_qty)):
+                # 已追上领先腿, 不需要穿价
+                leg.hedge = False
+                qty = None
+            if qty is None:
+                qty = self.allowed_qty(leg)
+            if filters.min_qty is not None and qty < filters.min_qty:
+                if leg.manager.remaining_qty < filters.min_qty:
+                    print(f"[{leg.label()}] 剩余数量{leg.manager.remaining_qty}低于最小下单量{filters.min_qty}, 停止")
+                    return
+                # 已被封顶, 等其他腿成交
+                with self._cond:
+                    self._cond.wait(self.requote_interval)
+                continue
+
+            orderbook = get_top_of_book(leg.symbol, leg.book)
+            if not orderbook or not orderbook.get('bids') or not orderbook.get('asks'):
+                delay = retry_delay(failures)
+                failures += 1
+                print(f"[{leg.label()}] 无法获取订单簿, 等待{delay}秒后重试...")
+                time.sleep(delay)
+                continue
+            best_bid_price = float(orderbook['bids'][0][0])
+            best_ask_price = float(orderbook['asks'][0][0])
+
+            hedging = leg.hedge
+            if hedging:
+                # 穿价: 卖单挂买一, 买单挂卖一, 数量不超过对手盘第一档
+                price = best_bid_price if leg.side == "SELL" else best_ask_price
+                top_qty = orderbook['bids' if leg.side == "SELL" else 'asks'][0][1]
+                qty = min(qty, filters.quantize_qty(top_qty))
+            elif leg.side == "SELL":
+                price = calculate_order_price(best_bid_price, best_ask_price, self.discount)
+            else:
+                price = calculate_buy_price(best_bid_price, best_ask_price, self.discount)
+            price = filters.quantize_price(price, leg.side)
+            qty = min(qty, leg.manager.remaining_qty)
+            error = filters.validate(price, qty)
+            if error:
+                delay = retry_delay(failures)
+                failures += 1
+                print(f"[{leg.label()}] 挂单不符合交易规则: {error}, 等待{delay}秒后重试...")
+                time.sleep(delay)
+                continue
+
+            client_order_id = leg.manager.new_order(qty, price)
+            print(f"[{leg.label()}] {'穿价补齐' if hedging else '挂单'}: 价格={price}, 数量={qty}")
+            order_id = send_limit_order(leg.symbol, leg.side, qty, price, client_order_id,
+                                        best_bid_price, best_ask_price)
+            if order_id == ORDER_UNKNOWN:
+                continue
+            if not order_id:
+                metrics.incr("rejects")
+                self._record(leg, client_order_id, "REJECTED", 0)
+                if market_trade.trading_halted() is not None:
+                    continue
+                delay = retry_delay(failures)
+                failures += 1
+                time.sleep(delay)
+                continue
+            failures = 0
+            leg.manager.bind(client_order_id, order_id)
+            self.tracker.watch(order_id, leg.symbol)
+            self._monitor(leg, client_order_id, order_id, float(price), hedging)
+            self.tracker.forget(order_id)
+            if hedging:
+                leg.hedge = False
+
+        print(f"[{leg.label()}] 结束: 已成交 {leg.filled}/{leg.total}")
+
+    def _monitor(self, leg, client_order_id, order_id, price, hedging):
+        """监控一笔挂单直到结束; 不再是最优价、穿价单超时或任务停止时撤单"""
+        known = None
+        quoted_at = time.monotonic()
+        while True:
+            status, executed_qty = self.tracker.wait_for_update(
+                order_id, known, timeout=self.requote_interval, reconcile=False)
+            if status is not None and (status, executed_qty) != known:
+                known = (status, executed_qty)
+                self._record(leg, client_order_id, status, executed_qty, hedging)
+                if leg.manager.is_final(client_order_id):
+                    return
+
+            elapsed = time.monotonic() - quoted_at
+            if self.stop_event.is_set():
+                reason = "任务停止"
+            elif hedging and elapsed >= self.requote_interval:
+                reason = "穿价单未立即成交"
+            elif not hedging and leg.hedge:
+                reason = "转为穿价补齐"
+            elif not hedging and elapsed >= self.requote_interval and self._is_stale(leg, price):
+                reason = "不再是最优价"
+            else:
+                continue
+            cancel_status, cancel_qty = cancel_order(leg.symbol, order_id)
+            if cancel_status is None:
+                # 撤单失败多半是刚好成交, 查询最终状态
+                cancel_status, cancel_qty = check_order_status(leg.symbol, order_id)
+                if cancel_status is None:
+                    continue
+            print(f"[{leg.label()}] {reason}, 撤单 (已成交 {cancel_qty})")
+            self._record(leg, client_order_id, cancel_status, cancel_qty, hedging)
+            return
+
+    def _is_stale(self, leg, price):
+        orderbook = get_top_of_book(leg.symbol, leg.book)
+        if not orderbook or not orderbook.get('bids') or not orderbook.get('asks'):
+            return False
+        if leg.side == "SELL":
+            return float(orderbook['asks'][0][0]) < price
+        return float(orderbook['bids'][0][0]) > price
+
+    # ---------- 报告 ----------
+
+    def report(self):
+        legs = []
+        for leg in self.legs:
+            average = leg.average_price()
+            legs.append({
+                "side": leg.side,
+                "symbol": leg.symbol,
+                "quantity": str(leg.total),
+                "executed_qty": str(leg.filled),
+                "avg_price": str(average.quantize(Decimal('0.0001'))) if average is not None else None,
+                "premium": str(leg.premium()),
+                "hedged_qty": str(leg.hedged_qty),
+                "orders": len(leg.manager.orders),
+            })
+        return {
+            "legs": legs,
+            "net_premium": str(sum((leg.premium() for leg in self.legs), Decimal(0))),
+            "completion": float(self.floor()),
+            "imbalance": float(self.imbalance()),
+            "breaches": self.breaches,
+            "stopped": self.stop_event.is_set(),
+        }
+
+
+def print_report(report):
+    print(f"{'腿':<28} {'目标':>8} {'成交':>8} {'均价':>10} {'权利金':>12} {'穿价':>8}")
+    for leg in report["legs"]:
+        print(f"{leg['side'] + ' ' + leg['symbol']:<28} {leg['quantity']:>8} {leg['executed_qty']:>8} "
+              f"{leg['avg_price'] or '-':>10} {leg['premium']:>12} {leg['hedged_qty']:>8}")
+    print(f"净权利金 (收入为正): {report['net_premium']}")
+    print(f"组合完成比例: {report['completion']:.0%}, 剩余腿间失衡: {report['imbalance']:.0%}, 失衡处理次数: {report['breaches']}")
+    if report["imbalance"] > 0:
+        print("注意: 各腿成交不一致, 组合存在未对冲的敞口")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='币安期权多腿组合执行')
+    parser.add_argument('--leg', action='append', required=True,
+                        help='一条腿 方向:合约:数量, 可重复, 例如 --leg SELL:ETH-250728-3600-C:1 --leg BUY:ETH-250728-3700-C:1')
+    parser.add_argument('--discount', type=float, default=5.0, help='被动挂单相对最优价的让价(默认: 5.0)')
+    parser.add_argument('--max-imbalance', type=float, default=DEFAULT_MAX_IMBALANCE,
+                        help=f'腿间成交比例最大差值 (默认: {DEFAULT_MAX_IMBALANCE})')
+    parser.add_argument('--lag-timeout', type=float, default=DEFAULT_LAG_TIMEOUT,
+                        help=f'失衡达到上限后等待落后腿的秒数 (默认: {DEFAULT_LAG_TIMEOUT})')
+    parser.add_argument('--on-breach', choices=BREACH_ACTIONS, default='hedge',
+                        help='失衡超时处理: hedge 落后腿穿价补齐, cancel 撤单停止 (默认: hedge)')
+    parser.add_argument('--requote-interval', type=float, default=DEFAULT_REQUOTE_INTERVAL,
+                        help=f'检查挂单是否仍为最优价的间隔秒数 (默认: {DEFAULT_REQUOTE_INTERVAL})')
+    parser.add_argument('--no-ws', action='store_true', help='不使用WebSocket本地订单簿')
+    parser.add_argument('--no-user-stream', action='store_true', help='不使用用户数据流, 通过REST轮询订单状态')
+    parser.add_argument('--base-url', default=market_trade.BASE_URL, help='期权REST地址 (默认: 币安期权)')
+    parser.add_argument('--ws-url', help='期权WebSocket地址 (默认: 币安期权)')
+    parser.add_argument('--risk-config', help='下单前风控限额 (JSON, 见 risk_gate.py), 不指定时只做价格带检查')
+    parser.add_argument('--kill-switch', default='KILL_SWITCH', help='停止开关文件, 存在时拒绝所有新订单 (默认: KILL_SWITCH)')
+    args = parser.parse_args()
+
+    try:
+        specs = [parse_leg(text) for text in args.leg]
+    except ValueError as e:
+        print(e)
+        return
+    if len(specs) < 2:
+        print("组合至少需要两条腿")
+        return
+    try:
+        limits = load_limits(args.risk_config)
+    except (OSError, json.JSONDecodeError) as e:
+        print(f"读取风控限额失败: {e}")
+        return
+
+    configure_endpoints(args.base_url, args.ws_url)
+    market_trade.TIME_SYNC.start()
+    market_trade.EXCHANGE_INFO.load()
+    # 各腿成交记入同一持仓账本, 风控按组合整体的持仓检查单合约名义价值上限
+    risk_book = RiskBook()
+    market_trade.RISK_GATE = RiskGate(limits, risk_book, args.kill_switch)
+    market_trade.RISK_GATE.start(market_trade.BASE_URL, symbols=[symbol for _, symbol, _ in specs])
+
+    legs = []
+    for side, symbol, quantity in specs:
+        filters = market_trade.EXCHANGE_INFO.get(symbol)
+        if filters is None:
+            print(f"交易对不存在: {symbol}")
+            return
+        if filters.is_expired():
+            print(f"合约已到期: {symbol}")
+            return
+        book = None
+        if not args.no_ws:
+            book = LocalOrderBook(symbol, market_trade.BASE_URL, **ws_options())
+            book.start()
+        legs.append(Leg(side, symbol, quantity, filters, book, on_fill=risk_book.fill_callback()))
+    for leg in legs:
+        if leg.book is not None and not leg.book.wait_synced(timeout=10):
+            print(f"[{leg.symbol}] 本地订单簿10秒内未同步, 暂时回退到REST深度")
+
+    tracker = OrderTracker(market_trade.API_KEY, market_trade.BASE_URL,
+                           reconcile=lambda oid: check_order_status(tracker.symbol_of(oid), oid), **ws_options())
+    if not args.no_user_stream:
+        tracker.start()
+
+    executor = MultiLegExecutor(legs, args.discount, args.max_imbalance, args.lag_timeout, args.on_breach,
+                                args.requote_interval, tracker=tracker)
+    print(f"开始执行 {len(legs)} 腿组合: " + ", ".join(f"{leg.label()} x{leg.total}" for leg in legs))
+    print("-" * 50)
+    try:
+        report = executor.run()
+    finally:
+        for leg in legs:
+            if leg.book is not None:
+                leg.book.stop()
+        tracker.stop()
+        market_trade.RISK_GATE.stop()
+    print("-" * 50)
+    print_report(report)
+
+
+if __name__ == "__main__":
+    main()
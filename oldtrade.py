@@ -1,11 +1,12 @@
 #!/usr/bin/env python3
-import hmac
-import hashlib
 import requests
-import time
+import http_client
 import os
 from dotenv import load_dotenv
 
+from risk_gate import RiskGate, load_limits
+from signer import RequestSigner
+
 # 加载环境变量
 load_dotenv()
 
@@ -33,28 +34,30 @@ params = {
     'newOrderRespType': os.getenv('NEW_ORDER_RESP_TYPE', 'ACK'), # 响应类型：ACK, RESULT
     'clientOrderId': os.getenv('CLIENT_ORDER_ID', ''),          # 用户自定义订单ID
     'isMmp':        os.getenv('IS_MMP', 'false'),               # 是否做市商保护订单
-    'recvWindow':   os.getenv('RECV_WINDOW', '5000'),           # 接收窗口
 }
 
 # 移除空值参数
 params = {k: v for k, v in params.items() if v != ''}
 
-# 参数中加时间戳
-timestamp = int(time.time() * 1000)  # 以毫秒为单位的 UNIX 时间戳
-params['timestamp'] = timestamp
+# 下单前风控: 停止开关文件和数量/名义价值限额 (限额文件路径见 RISK_CONFIG)
+gate = RiskGate(load_limits(os.getenv('RISK_CONFIG')), kill_switch_path=os.getenv('KILL_SWITCH', 'KILL_SWITCH'))
+gate.refresh_kill_switch()
+try:
+    reason = gate.check(params['symbol'], params['side'], params['quantity'], params['price'])
+except ValueError:
+    reason = f"数量/价格无效: 数量{params['quantity']}, 价格{params['price']}"
+if reason is not None:
+    print(f"❌ 风控拒绝下单: {reason}")
+    raise SystemExit(1)
 
-# 生成签名
-query_string = '&'.join([f'{param}={value}' for param, value in params.items()])
-signature = hmac.new(
-    SECRET_KEY.encode('utf-8'),
-    query_string.encode('utf-8'),
-    hashlib.sha256
-).hexdigest()
-params['signature'] = signature
+# 生成签名 (签名器自动补上 recvWindow 接收窗口和毫秒时间戳)
+signer = RequestSigner(API_KEY, SECRET_KEY, recv_window=os.getenv('RECV_WINDOW', '5000'))
+body = signer.sign_params(params)
 
 # 发送请求
 headers = {
     'X-MBX-APIKEY': API_KEY,
+    'Content-Type': 'application/x-www-form-urlencoded'
 }
 
 try:
@@ -64,10 +67,10 @@ try:
     print(f"数量: {params['quantity']}")
     print(f"价格: {params['price']}")
     
-    response = requests.post(
+    response = http_client.post(
         'https://vapi.binance.com/vapi/v1/order',
         headers=headers,
-        data=params,
+        data=body,
     )
     
     if response.status_code in [200, 202]:
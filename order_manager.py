@@ -0,0 +1,157 @@
+# 订单管理 - 确定性 clientOrderId + 按订单累计成交 (Decimal)
+# 每个卖出任务由 job_id 派生固定的 clientOrderId 序列, 超时重发时沿用同一个ID, 交易所会拒绝重复挂单
+# 每个订单只记录交易所返回的累计成交量 (取最大值), 总成交 = 各订单累计成交之和,
+# 部分成交后被撤单/过期的数量也会计入, 重复的状态更新不会重复累加
+# 传入 journal (journal.py) 时, 登记/提交/状态变化都追加写入执行日志, 重启后由 restore() 回放
+import hashlib
+import time
+from decimal import Decimal
+
+# clientOrderId 前缀, 便于在交易所订单列表中识别本程序的订单
+CLIENT_ID_PREFIX = "mt"
+
+ACTIVE_STATUSES = ("ACCEPTED", "PARTIALLY_FILLED")
+
+
+def to_decimal(value):
+    """float/str 转 Decimal, float 先转为最短字符串表示避免二进制误差"""
+    if isinstance(value, Decimal):
+        return value
+    return Decimal(str(value))
+
+
+def make_job_id(symbol, side, quantity):
+    """生成任务ID: 交易对 + 方向 + 数量 + 启动毫秒时间戳"""
+    return f"{symbol}|{side}|{quantity}|{int(time.time() * 1000)}"
+
+
+class OrderManager:
+    """单个卖出/买入任务的订单和成交数量管理"""
+
+    def __init__(self, symbol, side, total_qty, job_id=None, on_fill=None, journal=None):
+        self.symbol = symbol
+        self.side = side
+        self.total_qty = to_decimal(total_qty)
+        self.job_id = job_id or make_job_id(symbol, side, total_qty)
+        self.job_key = hashlib.sha1(self.job_id.encode('utf-8')).hexdigest()[:12]
+        self.seq = 0
+        # clientOrderId -> 订单记录
+        self.orders = {}
+        self._order_ids = {}
+        # 新增成交回调 on_fill(symbol, side, qty, price), 如持仓/风险账本 (按挂单价记账)
+        self.on_fill = on_fill
+        self.journal = journal
+
+    def client_order_id(self, seq):
+        """第seq个订单的 clientOrderId (同一job_id下固定不变)"""
+        return f"{CLIENT_ID_PREFIX}-{self.job_key}-{seq}"
+
+    @property
+    def client_id_prefix(self):
+        """本任务所有 clientOrderId 的共同前缀, 用于在交易所订单列表中找回本任务的订单"""
+        return f"{CLIENT_ID_PREFIX}-{self.job_key}-"
+
+    def new_order(self, quantity, price):
+        """登记一个待发送的订单, 返回其 clientOrderId"""
+        self.seq += 1
+        client_order_id = self.client_order_id(self.seq)
+        self.orders[client_order_id] = {
+            "clientOrderId": client_order_id,
+            "orderId": None,
+            "quantity": to_decimal(quantity),
+            "price": to_decimal(price),
+            "status": "NEW",
+            "executedQty": Decimal(0),
+        }
+        if self.journal is not None:
+            self.journal.record(self.job_id, "intent", client_order_id, quantity=quantity, price=price)
+        return client_order_id
+
+    def bind(self, client_order_id, order_id):
+        """记录交易所分配的 orderId"""
+        self.orders[client_order_id]["orderId"] = order_id
+        self._order_ids[str(order_id)] = client_order_id
+        if self.journal is not None:
+            self.journal.record(self.job_id, "submit", client_order_id, order_id=order_id)
+
+    def get(self, client_order_id=None, order_id=None):
+        if client_order_id is None:
+            client_order_id = self._order_ids.get(str(order_id))
+        return self.orders.get(client_order_id)
+
+    def update(self, client_order_id, status, executed_qty):
+        """更新订单状态和累计成交, 返回本次新增成交数量"""
+        order = self.orders[client_order_id]
+        executed_qty = to_decimal(executed_qty)
+        delta = max(executed_qty - order["executedQty"], Decimal(0))
+        # 累计成交只增不减, 乱序到达的旧状态不会回退
+        order["executedQty"] += delta
+        if delta and self.on_fill is not None:
+            self.on_fill(self.symbol, self.side, delta, order["price"])
+        if order["status"] not in ACTIVE_STATUSES and order["status"] != "NEW":
+            if delta and self.journal is not None:
+                self.journal.record(self.job_id, "status", client_order_id, status=order["status"],
+                                    executed_qty=order["executedQty"])
+            return delta
+        changed = delta or status != order["status"]
+        order["status"] = status
+        if changed and self.journal is not None:
+            self.journal.record(self.job_id, "status", client_order_id, status=status,
+                                executed_qty=order["executedQty"])
+        return delta
+
+    def restore(self, events):
+        """按执行日志事件 (Journal.events) 回放订单记录, 回放本身不再写日志"""
+        journal, self.journal = self.journal, None
+        try:
+            for event in events:
+                client_order_id = event["clientOrderId"]
+                if event["kind"] == "intent":
+                    self.adopt(client_order_id, event["quantity"], event["price"])
+                elif client_order_id not in self.orders:
+                    continue
+                elif event["kind"] == "submit":
+                    self.bind(client_order_id, event["orderId"])
+                elif event["kind"] == "status":
+                    self.update(client_order_id, event["status"], event["executedQty"])
+        finally:
+            self.journal = journal
+
+    def adopt(self, client_order_id, quantity, price):
+        """登记一个已存在的订单 (日志回放或交易所找回), 序号推进到其之后, 新订单不会重用clientOrderId"""
+        if client_order_id not in self.orders:
+            self.orders[client_order_id] = {
+                "clientOrderId": client_order_id,
+                "orderId": None,
+                "quantity": to_decimal(quantity),
+                "price": to_decimal(price),
+                "status": "NEW",
+                "executedQty": Decimal(0),
+            }
+            if self.journal is not None:
+                self.journal.record(self.job_id, "intent", client_order_id, quantity=quantity, price=price)
+        seq = client_order_id.rsplit('-', 1)[-1]
+        if seq.isdigit():
+            self.seq = max(self.seq, int(seq))
+
+    def is_final(self, client_order_id):
+        status = self.orders[client_order_id]["status"]
+        return status != "NEW" and status not in ACTIVE_STATUSES
+
+    @property
+    def executed_qty(self):
+        """所有订单累计成交之和"""
+        return sum((order["executedQty"] for order in self.orders.values()), Decimal(0))
+
+    @property
+    def remaining_qty(self):
+        return self.total_qty - self.executed_qty
+
+    @property
+    def open_qty(self):
+        """仍在挂单中的未成交数量"""
+        return sum(
+            (order["quantity"] - order["executedQty"]
+             for order in self.orders.values() if not self.is_final(order["clientOrderId"])),
+            Decimal(0),
+        )
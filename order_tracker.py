@@ -0,0 +1,269 @@
+# 订单状态跟踪 - 基于用户数据流(listenKey)的订单回报
+# 内存中按 orderId / clientOrderId 维护订单状态, 卖单循环等待成交事件而不是轮询REST
+# 数据流不可用或超时未收到事件时, 才回退到REST查询对账
+# 离线测试时可将 base_url / ws_url 指向本地假数据流, 或直接调用 handle_event 注入事件
+# 数据流推送账户下所有订单的回报: 未登记 (watch) 的订单只保留最近 UNWATCHED_CAPACITY 个, 常驻进程内存不增长
+import requests
+import collections
+import json
+import threading
+import time
+
+import websocket
+
+import http_client
+
+# 币安期权API配置
+BASE_URL = "https://eapi.binance.com"
+WS_URL = "wss://nbstream.binance.com/eapi/ws"
+LISTEN_KEY_ENDPOINT = '/eapi/v1/listenKey'
+
+# listenKey 60分钟失效, 每30分钟延长一次
+KEEPALIVE_INTERVAL = 30 * 60
+
+# 终结状态, 之后不会再有更新
+FINAL_STATUSES = ("FILLED", "CANCELLED", "REJECTED", "EXPIRED")
+
+# 未登记订单的状态最多保留数量: 回报可能比下单响应先到, 登记前需要暂存, 其余订单 (其他程序/手工下单) 按LRU淘汰
+UNWATCHED_CAPACITY = 1000
+
+
+class OrderTracker:
+    """订阅用户数据流, 维护订单状态并提供成交等待"""
+
+    def __init__(self, api_key, base_url=BASE_URL, ws_url=WS_URL, reconcile=None,
+                 unwatched_capacity=UNWATCHED_CAPACITY):
+        self.api_key = api_key
+        self.base_url = base_url
+        self.ws_url = ws_url
+        # 回退对账函数: reconcile(order_id) -> (status, executed_qty)
+        self.reconcile = reconcile
+
+        self.listen_key = None
+        self.connected = False
+        self.event_count = 0
+        self.reconcile_count = 0
+
+        self._orders = {}
+        self._client_ids = {}
+        self._symbols = {}
+        # 有状态但未登记的 orderId, 按最近更新排序
+        self._unwatched = collections.OrderedDict()
+        self.unwatched_capacity = unwatched_capacity
+        self._cond = threading.Condition()
+        self._running = False
+        self._ws = None
+        self._thread = None
+        self._keepalive_thread = None
+
+    # ---------- 订单状态 ----------
+
+    def get(self, order_id=None, client_order_id=None):
+        """按 orderId 或 clientOrderId 查询内存中的订单状态"""
+        with self._cond:
+            if order_id is None:
+                order_id = self._client_ids.get(client_order_id)
+            return self._orders.get(str(order_id))
+
+    def update(self, order_id, status, executed_qty, client_order_id=None, symbol=None):
+        """写入一条订单状态并唤醒等待方"""
+        key = str(order_id)
+        with self._cond:
+            state = self._orders.setdefault(key, {"orderId": key})
+            state["status"] = status
+            state["executedQty"] = executed_qty
+            state["updateTime"] = time.time()
+            if symbol:
+                state["symbol"] = symbol
+            if client_order_id:
+                state["clientOrderId"] = client_order_id
+                self._client_ids[client_order_id] = key
+            if key not in self._symbols:
+                self._unwatched[key] = None
+                self._unwatched.move_to_end(key)
+                if len(self._unwatched) > self.unwatched_capacity:
+                    self._drop(self._unwatched.popitem(last=False)[0])
+            self._cond.notify_all()
+
+    def watch(self, order_id, symbol):
+        """登记订单所属交易对, 多个交易对共用一个跟踪器时回退对账按此查询"""
+        with self._cond:
+            self._symbols[str(order_id)] = symbol
+            self._unwatched.pop(str(order_id), None)
+
+    def symbol_of(self, order_id):
+        with self._cond:
+            state = self._orders.get(str(order_id))
+            return self._symbols.get(str(order_id)) or (state or {}).get("symbol")
+
+    def forget(self, order_id):
+        """订单处理完毕后移出内存"""
+        with self._cond:
+            self._symbols.pop(str(order_id), None)
+            self._unwatched.pop(str(order_id), None)
+            self._drop(str(order_id))
+
+    def _drop(self, key):
+        state = self._orders.pop(key, None)
+        if state and state.get("clientOrderId"):
+            self._client_ids.pop(state["clientOrderId"], None)
+
+    def handle_event(self, event):
+        """处理一条用户数据流事件 (WebSocket回调和假数据流共用)"""
+        if event.get('e') != 'ORDER_TRADE_UPDATE':
+            return
+        self.event_count += 1
+        for order in event.get('o', []):
+            self.update(
+                order['oid'],
+                order['S'],
+                float(order.get('e', 0)),
+                client_order_id=order.get('c'),
+                symbol=order.get('s'),
+            )
+
+    def wait_for_update(self, order_id, known=None, timeout=10, fallback_interval=2, reconcile=True):
+        """等待订单状态变化, 返回 (status, executed_qty)
+
+        known 为调用方上次看到的 (status, executed_qty), 状态与之不同才返回。
+        超时未收到数据流事件时调用 reconcile 做一次REST对账 (reconcile=False 时直接返回 known);
+        数据流未连接时按 fallback_interval 回退为轮询, 此时总是REST对账。
+        """
+        key = str(order_id)
+        if not self.connected:
+            timeout = min(timeout, fallback_interval)
+        deadline = time.monotonic() + timeout
+        with self._cond:
+            while True:
+                state = self._orders.get(key)
+                if state is not None:
+                    current = (state["status"], state["executedQty"])
+                    if current != known:
+                        return current
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                self._cond.wait(remaining)
+
+        if self.reconcile is None or (not reconcile and self.connected):
+            return known if known is not None else (None, 0)
+
+        self.reconcile_count += 1
+        status, executed_qty = self.reconcile(order_id)
+        if status is not None:
+            self.update(order_id, status, executed_qty)
+        return status, executed_qty
+
+    def wait_for_any(self, known, timeout=10, fallback_interval=2):
+        """等待一组订单中任意一个状态变化, 返回有变化的订单 {order_id: (status, executed_qty)}
+
+        known 为 {order_id: 调用方上次看到的 (status, executed_qty) 或 None}, 所有订单共用一次等待,
+        没有回报的订单不会耽误处理其他订单的成交。超时无变化时返回空字典 (数据流正常时不做REST对账);
+        数据流未连接时按 fallback_interval 回退为轮询, 逐个REST对账。
+        """
+        if not self.connected:
+            timeout = min(timeout, fallback_interval)
+        deadline = time.monotonic() + timeout
+        with self._cond:
+            while True:
+                changed = {}
+                for order_id, previous in known.items():
+                    state = self._orders.get(str(order_id))
+                    if state is not None and (state["status"], state["executedQty"]) != previous:
+                        changed[order_id] = (state["status"], state["executedQty"])
+                if changed:
+                    return changed
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                self._cond.wait(remaining)
+
+        if self.reconcile is None or self.connected:
+            return {}
+        changed = {}
+        for order_id, previous in known.items():
+            self.reconcile_count += 1
+            status, executed_qty = self.reconcile(order_id)
+            if status is None:
+                continue
+            self.update(order_id, status, executed_qty)
+            if (status, executed_qty) != previous:
+                changed[order_id] = (status, executed_qty)
+        return changed
+
+    # ---------- 用户数据流 ----------
+
+    def _listen_key_request(self, method):
+        headers = {
+            'X-MBX-APIKEY': self.api_key
+        }
+        response = http_client.request(method, self.base_url + LISTEN_KEY_ENDPOINT, headers=headers)
+        response.raise_for_status()
+        return response.json()
+
+    def start(self):
+        """申请listenKey并启动后台数据流线程, 失败时返回False (调用方继续用REST轮询)"""
+        try:
+            self.listen_key = self._listen_key_request("POST")['listenKey']
+        except (requests.exceptions.RequestException, json.JSONDecodeError, KeyError) as e:
+            print(f"申请listenKey失败: {e}, 订单状态回退到REST轮询")
+            return False
+
+        self._running = True
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+        self._keepalive_thread = threading.Thread(target=self._keepalive, daemon=True)
+        self._keepalive_thread.start()
+        return True
+
+    def stop(self):
+        self._running = False
+        if self._ws:
+            self._ws.close()
+        if self._thread:
+            self._thread.join(timeout=5)
+        if self.listen_key:
+            try:
+                self._listen_key_request("DELETE")
+            except (requests.exceptions.RequestException, json.JSONDecodeError):
+                pass
+
+    def _keepalive(self):
+        while self._running:
+            time.sleep(KEEPALIVE_INTERVAL)
+            if not self._running:
+                return
+            try:
+                self._listen_key_request("PUT")
+            except (requests.exceptions.RequestException, json.JSONDecodeError) as e:
+                print(f"延长listenKey失败: {e}")
+
+    def _run(self):
+        while self._running:
+            self._ws = websocket.WebSocketApp(
+                f"{self.ws_url}/{self.listen_key}",
+                on_open=self._on_open,
+                on_message=self._on_message,
+                on_error=self._on_error,
+            )
+            self._ws.run_forever(ping_interval=30, ping_timeout=10)
+            self.connected = False
+            if self._running:
+                print("用户数据流断开, 1秒后重连...")
+                time.sleep(1)
+
+    def _on_open(self, ws):
+        self.connected = True
+
+    def _on_message(self, ws, message):
+        try:
+            event = json.loads(message)
+        except json.JSONDecodeError as e:
+            print(f"解析用户数据流事件失败: {e}")
+            return
+        if 'data' in event:
+            event = event['data']
+        self.handle_event(event)
+
+    def _on_error(self, ws, error):
+        print(f"用户数据流错误: {error}")
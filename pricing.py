@@ -0,0 +1,250 @@
+# 期权定价 - 解析合约代码 + 向量化 Black-Scholes 价格/隐含波动率/希腊值
+# 合约代码格式: 标的-到期日(YYMMDD)-行权价-C/P, 例如 ETH-250728-3600-C, 到期时间为当天 08:00 UTC
+# 所有计算都是 numpy 数组运算, 整条期权链的买卖价一次批量求解, 不逐个合约循环
+# 隐含波动率用带区间保护的牛顿法: 牛顿步越界或 vega 过小时退回二分, 每个合约独立收敛
+# python pricing.py --symbol ETH-250728-3600-C --spot 3500 --price 120
+import argparse
+import functools
+import time
+from datetime import datetime, timezone
+
+import numpy as np
+
+# 期权到期时刻 (UTC 小时)
+EXPIRY_HOUR_UTC = 8
+
+# 年化时间单位 (毫秒)
+MS_PER_YEAR = 365 * 24 * 3600 * 1000
+
+# 隐含波动率求解区间和精度
+IV_MIN = 1e-4
+IV_MAX = 10.0
+IV_TOLERANCE = 1e-8
+IV_MAX_ITERATIONS = 50
+
+
+@functools.lru_cache(maxsize=None)
+def _parse(symbol):
+    parts = symbol.split('-')
+    if len(parts) != 4 or parts[3] not in ('C', 'P') or len(parts[1]) != 6 or not parts[1].isdigit():
+        raise ValueError(f"无法解析的期权合约代码: {symbol}")
+    underlying, expiry, strike, side = parts
+    expiry_dt = datetime(2000 + int(expiry[:2]), int(expiry[2:4]), int(expiry[4:]), EXPIRY_HOUR_UTC, tzinfo=timezone.utc)
+    return underlying, int(expiry_dt.timestamp() * 1000), float(strike), "CALL" if side == 'C' else "PUT"
+
+
+def parse_symbol(symbol):
+    """解析合约代码, 返回 {"underlying", "expiry"(毫秒), "strike", "side"("CALL"/"PUT")}
+
+    解析结果按合约代码缓存, 同一条期权链反复计算时不再重复解析
+    """
+    underlying, expiry, strike, side = _parse(symbol)
+    return {
+        "underlying": underlying,
+        "expiry": expiry,
+        "strike": strike,
+        "side": side,
+    }
+
+
+def parse_symbols(symbols):
+    """批量解析, 返回 (行权价数组, 到期毫秒数组, 是否看涨数组)"""
+    parsed = [_parse(symbol) for symbol in symbols]
+    strikes = np.array([p[2] for p in parsed], dtype=np.float64)
+    expiries = np.array([p[1] for p in parsed], dtype=np.int64)
+    is_call = np.array([p[3] == "CALL" for p in parsed], dtype=bool)
+    return strikes, expiries, is_call
+
+
+def year_fraction(expiries, now_ms=None):
+    """距到期的年化时间, 已到期的记为0"""
+    now_ms = now_ms if now_ms is not None else time.time() * 1000
+    return np.maximum((np.asarray(expiries, dtype=np.float64) - now_ms) / MS_PER_YEAR, 0.0)
+
+
+def norm_cdf(x):
+    """标准正态分布函数, Hart (1968) 有理逼近, 双精度误差约1e-14, 不依赖 scipy"""
+    x = np.asarray(x, dtype=np.float64)
+    a = np.abs(x)
+    exponential = np.exp(-0.5 * a * a)
+    # |x| < 7.07 用有理函数, 更远的尾部用连分式
+    numerator = ((((((0.0352624965998911 * a + 0.700383064443688) * a + 6.37396220353165) * a
+                    + 33.912866078383) * a + 112.079291497871) * a + 221.213596169931) * a + 220.206867912376)
+    denominator = (((((((0.0883883476483184 * a + 1.75566716318264) * a + 16.064177579207) * a
+                       + 86.7807322029461) * a + 296.564248779674) * a + 637.333633378831) * a
+                    + 793.826512519948) * a + 440.413735824752)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        fraction = a + 1.0 / (a + 2.0 / (a + 3.0 / (a + 4.0 / (a + 0.65))))
+        tail = np.where(a < 7.07106781186547, exponential * numerator / denominator,
+                        exponential / fraction / 2.506628274631)
+    tail = np.where(a > 37.0, 0.0, tail)
+    return np.where(x > 0, 1.0 - tail, tail)
+
+
+def norm_pdf(x):
+    return np.exp(-0.5 * x * x) / np.sqrt(2.0 * np.pi)
+
+
+def _d1_d2(spot, strike, t, vol, rate):
+    sqrt_t = np.sqrt(t)
+    vol_sqrt_t = vol * sqrt_t
+    d1 = (np.log(spot / strike) + (rate + 0.5 * vol * vol) * t) / vol_sqrt_t
+    return d1, d1 - vol_sqrt_t, sqrt_t
+
+
+def bs_price(spot, strike, t, vol, is_call, rate=0.0):
+    """Black-Scholes 理论价, 参数可为标量或等长数组"""
+    spot, strike, t, vol = np.broadcast_arrays(*(np.asarray(a, dtype=np.float64) for a in (spot, strike, t, vol)))
+    is_call = np.asarray(is_call, dtype=bool)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        d1, d2, _ = _d1_d2(spot, strike, t, vol, rate)
+        discount = np.exp(-rate * t)
+        call = spot * norm_cdf(d1) - strike * discount * norm_cdf(d2)
+    # 看跌由平价关系得到, 少算两次分布函数
+    price = np.where(is_call, call, call - spot + strike * discount)
+    # 到期或波动率为0时取内在价值
+    intrinsic = np.where(is_call, np.maximum(spot - strike, 0.0), np.maximum(strike - spot, 0.0))
+    return np.where((t > 0) & (vol > 0), price, intrinsic)
+
+
+def greeks(spot, strike, t, vol, is_call, rate=0.0):
+    """希腊值: delta, gamma, vega (每1%波动率), theta (每天); 无效输入为 nan"""
+    spot, strike, t, vol = np.broadcast_arrays(*(np.asarray(a, dtype=np.float64) for a in (spot, strike, t, vol)))
+    is_call = np.asarray(is_call, dtype=bool)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        d1, d2, sqrt_t = _d1_d2(spot, strike, t, vol, rate)
+        pdf_d1 = norm_pdf(d1)
+        discount = np.exp(-rate * t)
+        delta = np.where(is_call, norm_cdf(d1), norm_cdf(d1) - 1.0)
+        gamma = pdf_d1 / (spot * vol * sqrt_t)
+        vega = spot * pdf_d1 * sqrt_t / 100.0
+        decay = -spot * pdf_d1 * vol / (2.0 * sqrt_t)
+        theta = np.where(
+            is_call,
+            decay - rate * strike * discount * norm_cdf(d2),
+            decay + rate * strike * discount * norm_cdf(-d2),
+        ) / 365.0
+    valid = (t > 0) & (vol > 0)
+    return {
+        "delta": np.where(valid, delta, np.nan),
+        "gamma": np.where(valid, gamma, np.nan),
+        "vega": np.where(valid, vega, np.nan),
+        "theta": np.where(valid, theta, np.nan),
+    }
+
+
+def implied_vol(price, spot, strike, t, is_call, rate=0.0, tolerance=IV_TOLERANCE, max_iterations=IV_MAX_ITERATIONS):
+    """向量化隐含波动率, 价格超出无套利区间或已到期的合约返回 nan"""
+    price, spot, strike, t, is_call = np.broadcast_arrays(
+        *(np.asarray(a, dtype=np.float64) for a in (price, spot, strike, t)), np.asarray(is_call, dtype=bool))
+    shape = price.shape
+    price, spot, strike, t, is_call = (a.ravel() for a in (price, spot, strike, t, is_call))
+
+    discount = np.exp(-rate * t)
+    lower = np.where(is_call, np.maximum(spot - strike * discount, 0.0), np.maximum(strike * discount - spot, 0.0))
+    upper = np.where(is_call, spot, strike * discount)
+    valid = (t > 0) & (price > lower) & (price < upper)
+
+    lo = np.full(price.shape, IV_MIN)
+    hi = np.full(price.shape, IV_MAX)
+    # 初值: Brenner-Subrahmanyam 平值近似
+    with np.errstate(divide='ignore', invalid='ignore'):
+        vol = np.clip(np.sqrt(2.0 * np.pi / np.where(t > 0, t, 1.0)) * price / spot, 0.05, 3.0)
+    vol = np.where(valid, vol, np.nan)
+
+    # 每轮只计算尚未收敛的合约
+    idx = np.nonzero(valid)[0]
+    for _ in range(max_iterations):
+        if idx.size == 0:
+            break
+        p, s, k, tt, c, v, df = price[idx], spot[idx], strike[idx], t[idx], is_call[idx], vol[idx], discount[idx]
+        d1, d2, sqrt_t = _d1_d2(s, k, tt, v, rate)
+        call = s * norm_cdf(d1) - k * df * norm_cdf(d2)
+        diff = np.where(c, call, call - s + k * df) - p
+        vega = s * norm_pdf(d1) * sqrt_t
+
+        # 价格偏高说明波动率偏大, 收窄求解区间
+        too_high = diff > 0
+        hi[idx] = np.where(too_high, v, hi[idx])
+        lo[idx] = np.where(too_high, lo[idx], v)
+
+        # 牛顿步落在区间外或 vega 太小时改用二分
+        with np.errstate(divide='ignore', invalid='ignore', over='ignore'):
+            newton = v - diff / vega
+        use_newton = (vega > 1e-12) & (newton > lo[idx]) & (newton < hi[idx])
+        next_vol = np.where(use_newton, newton, 0.5 * (lo[idx] + hi[idx]))
+
+        # 价格误差已达标的保留当前波动率, 其余取下一步
+        converged = np.abs(diff) < tolerance * np.maximum(p, 1.0)
+        vol[idx] = np.where(converged, v, next_vol)
+        done = converged | (np.abs(next_vol - v) < tolerance)
+        idx = idx[~done]
+
+    return vol.reshape(shape)
+
+
+def evaluate_chain(symbols, spot, bids, asks, now_ms=None, rate=0.0):
+    """整条期权链一次批量计算: 买/卖/中间价隐含波动率, 以及按中间价波动率的理论价和希腊值
+
+    bids/asks 中缺失报价用 nan 表示, 对应结果为 nan
+    """
+    strikes, expiries, is_call = parse_symbols(symbols)
+    t = year_fraction(expiries, now_ms)
+    bids = np.asarray(bids, dtype=np.float64)
+    asks = np.asarray(asks, dtype=np.float64)
+    spot = np.broadcast_to(np.asarray(spot, dtype=np.float64), strikes.shape)
+
+    # 买卖价合并成一次求解
+    both = implied_vol(np.concatenate([bids, asks]), np.concatenate([spot, spot]),
+                       np.concatenate([strikes, strikes]), np.concatenate([t, t]),
+                       np.concatenate([is_call, is_call]), rate)
+    bid_iv, ask_iv = both[:len(strikes)], both[len(strikes):]
+    mid_iv = np.where(np.isnan(bid_iv), ask_iv, np.where(np.isnan(ask_iv), bid_iv, 0.5 * (bid_iv + ask_iv)))
+
+    result = {
+        "symbol": list(symbols),
+        "strike": strikes,
+        "expiry": expiries,
+        "is_call": is_call,
+        "t": t,
+        "bid_iv": bid_iv,
+        "ask_iv": ask_iv,
+        "mid_iv": mid_iv,
+        "theo": bs_price(spot, strikes, t, np.nan_to_num(mid_iv), is_call, rate),
+    }
+    result["theo"] = np.where(np.isnan(mid_iv), np.nan, result["theo"])
+    result.update(greeks(spot, strikes, t, mid_iv, is_call, rate))
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description='期权隐含波动率和希腊值计算')
+    parser.add_argument('--symbol', required=True, help='期权交易对，例如: ETH-250728-3600-C')
+    parser.add_argument('--spot', type=float, required=True, help='标的价格')
+    parser.add_argument('--price', type=float, help='期权价格, 用于求隐含波动率')
+    parser.add_argument('--vol', type=float, help='波动率 (例如 0.6), 用于求理论价')
+    parser.add_argument('--rate', type=float, default=0.0, help='无风险利率 (默认: 0)')
+    args = parser.parse_args()
+
+    contract = parse_symbol(args.symbol)
+    t = year_fraction(contract["expiry"])
+    is_call = contract["side"] == "CALL"
+    print(f"标的: {contract['underlying']}, 行权价: {contract['strike']}, 类型: {contract['side']}")
+    print(f"到期: {datetime.fromtimestamp(contract['expiry'] / 1000, timezone.utc)}, 剩余 {float(t) * 365:.2f} 天")
+
+    if args.price is not None:
+        vol = float(implied_vol(args.price, args.spot, contract["strike"], t, is_call, args.rate))
+        print(f"隐含波动率: {vol:.4%}")
+    elif args.vol is not None:
+        vol = args.vol
+        print(f"理论价: {float(bs_price(args.spot, contract['strike'], t, vol, is_call, args.rate)):.4f}")
+    else:
+        print("请提供 --price 或 --vol")
+        return
+
+    values = greeks(args.spot, contract["strike"], t, vol, is_call, args.rate)
+    print(", ".join(f"{name}: {float(value):.6f}" for name, value in values.items()))
+
+
+if __name__ == "__main__":
+    main()
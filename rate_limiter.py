@@ -0,0 +1,162 @@
+# 客户端限速器 - 请求权重 / 下单数令牌桶
+# 根据 X-MBX-USED-WEIGHT-* / X-MBX-ORDER-COUNT-* 响应头校准各时间窗口的剩余额度,
+# 在额度内尽快发出请求, 额度不足时精确等待到令牌恢复, 代替固定的 time.sleep
+# 线程安全, 多个线程/协程共享同一个限速器 (协程使用 reserve() 得到等待时间后自行 await)
+import threading
+import time
+
+# 币安期权默认限额 (时间窗口 -> 上限)
+DEFAULT_WEIGHT_LIMITS = {'1M': 2400}
+DEFAULT_ORDER_LIMITS = {'10S': 100, '1M': 1200}
+
+# 只使用限额的90%, 给其他进程/手工操作留余量
+SAFETY_FACTOR = 0.9
+
+# 各接口的请求权重, 未列出的接口按1计算
+ENDPOINT_WEIGHTS = {
+    '/eapi/v1/depth': 5,
+    '/eapi/v1/historyOrders': 3,
+    '/eapi/v1/trades': 5,
+    '/eapi/v1/blockTrades': 20,
+    '/eapi/v1/batchOrders': 5,
+    '/eapi/v1/ticker': 5,
+    '/eapi/v1/mark': 5,
+    '/eapi/v1/exchangeInfo': 1,
+}
+
+# 计入下单数的接口 (POST)
+ORDER_ENDPOINTS = ('/eapi/v1/order', '/eapi/v1/batchOrders')
+
+INTERVAL_SECONDS = {'S': 1, 'M': 60, 'H': 3600, 'D': 86400}
+
+WEIGHT_HEADER_PREFIX = 'x-mbx-used-weight-'
+ORDER_HEADER_PREFIX = 'x-mbx-order-count-'
+
+
+def parse_interval(interval):
+    """'10S' -> 10, '1M' -> 60"""
+    return int(interval[:-1]) * INTERVAL_SECONDS[interval[-1].upper()]
+
+
+def request_cost(method, path):
+    """接口的 (权重, 下单数)"""
+    weight = ENDPOINT_WEIGHTS.get(path, 1)
+    orders = 1 if method == "POST" and path in ORDER_ENDPOINTS else 0
+    return weight, orders
+
+
+class TokenBucket:
+    """匀速恢复的令牌桶, 允许预占(令牌为负)让并发请求排队"""
+
+    def __init__(self, limit, interval):
+        self.capacity = limit
+        self.interval = interval
+        self.rate = limit / interval
+        self.tokens = limit
+        self.updated = time.monotonic()
+
+    def _refill(self, now):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def reserve(self, amount, now):
+        """预占amount个令牌, 返回需要等待的秒数"""
+        self._refill(now)
+        self.tokens -= amount
+        if self.tokens >= 0:
+            return 0.0
+        return -self.tokens / self.rate
+
+    def sync(self, used, now):
+        """按服务器返回的已用额度校准剩余令牌"""
+        self._refill(now)
+        self.tokens = min(self.tokens, self.capacity - used)
+
+
+class RateLimiter:
+    """请求权重和下单数的组合限速器"""
+
+    def __init__(self, weight_limits=None, order_limits=None, safety=SAFETY_FACTOR):
+        weight_limits = weight_limits or DEFAULT_WEIGHT_LIMITS
+        order_limits = order_limits or DEFAULT_ORDER_LIMITS
+        self.weight_buckets = {
+            key.upper(): TokenBucket(limit * safety, parse_interval(key))
+            for key, limit in weight_limits.items()
+        }
+        self.order_buckets = {
+            key.upper(): TokenBucket(limit * safety, parse_interval(key))
+            for key, limit in order_limits.items()
+        }
+        self.blocked_until = 0.0
+        self._lock = threading.Lock()
+
+        # 监控计数
+        self.request_count = 0
+        self.order_count = 0
+        self.weight_total = 0
+        self.wait_count = 0
+        self.wait_seconds = 0.0
+        self.throttled_count = 0
+        self.used_weight = {}
+        self.used_orders = {}
+
+    def reserve(self, weight=1, orders=0):
+        """预占额度, 返回调用方应等待的秒数 (不阻塞)"""
+        with self._lock:
+            now = time.monotonic()
+            delay = max(0.0, self.blocked_until - now)
+            for bucket in self.weight_buckets.values():
+                delay = max(delay, bucket.reserve(weight, now))
+            if orders:
+                for bucket in self.order_buckets.values():
+                    delay = max(delay, bucket.reserve(orders, now))
+            self.request_count += 1
+            self.order_count += orders
+            self.weight_total += weight
+            if delay > 0:
+                self.wait_count += 1
+                self.wait_seconds += delay
+            return delay
+
+    def acquire(self, weight=1, orders=0):
+        """阻塞直到额度允许发出请求"""
+        delay = self.reserve(weight, orders)
+        if delay > 0:
+            time.sleep(delay)
+
+    def update_from_headers(self, headers, status_code=None):
+        """根据响应头校准额度; 429/418 时按 Retry-After 暂停所有请求"""
+        with self._lock:
+            now = time.monotonic()
+            for name, value in headers.items():
+                name = name.lower()
+                if name.startswith(WEIGHT_HEADER_PREFIX):
+                    interval = name[len(WEIGHT_HEADER_PREFIX):].upper()
+                    self.used_weight[interval] = int(value)
+                    if interval in self.weight_buckets:
+                        self.weight_buckets[interval].sync(int(value), now)
+                elif name.startswith(ORDER_HEADER_PREFIX):
+                    interval = name[len(ORDER_HEADER_PREFIX):].upper()
+                    self.used_orders[interval] = int(value)
+                    if interval in self.order_buckets:
+                        self.order_buckets[interval].sync(int(value), now)
+
+            if status_code in (418, 429):
+                self.throttled_count += 1
+                retry_after = float(headers.get('Retry-After', 60))
+                self.blocked_until = max(self.blocked_until, now + retry_after)
+                print(f"触发限频 (状态码 {status_code}), 暂停请求 {retry_after} 秒")
+
+    def stats(self):
+        """监控计数快照"""
+        with self._lock:
+            return {
+                "requests": self.request_count,
+                "orders": self.order_count,
+                "weight": self.weight_total,
+                "waits": self.wait_count,
+                "wait_seconds": round(self.wait_seconds, 3),
+                "throttled": self.throttled_count,
+                "used_weight": dict(self.used_weight),
+                "used_orders": dict(self.used_orders),
+            }
@@ -0,0 +1,278 @@
+# 持仓/风险账本 - 按成交增量更新的数组化持仓簿, 汇总各标的净希腊值和已实现/未实现盈亏
+# 每个 (子账户, 合约) 占数组中的一行: 净持仓、持仓均价、已实现盈亏、标记价格、单位希腊值
+# 成交时只改一行, 并把 持仓变化 * 单位希腊值 加到该子账户/标的的汇总上 (O(1), 不做全量重算)
+# 标记价格/希腊值来自 /eapi/v1/mark, 刷新时对所有行向量化重算一次汇总
+# 子账户按邮箱区分, 与 move_positions.py 的 fromUserEmail/toUserEmail 一致; 单账户使用时为 DEFAULT_ACCOUNT
+# 用法:
+#   book = RiskBook()
+#   manager = OrderManager(symbol, "SELL", qty, on_fill=book.fill_callback("sub1@example.com"))
+#   book.update_marks(fetch_marks(BASE_URL))
+#   book.exposure("ETH"), book.pnl(), book.summary()
+import threading
+
+import numpy as np
+
+from chain_scanner import BASE_URL, MARK_ENDPOINT, fetch_all
+from pricing import parse_symbol
+
+DEFAULT_ACCOUNT = "default"
+INITIAL_CAPACITY = 1024
+
+# 汇总的希腊值 (顺序即数组列顺序), 与 /eapi/v1/mark 的字段名一致
+GREEKS = ("delta", "gamma", "vega", "theta")
+
+# 非期权合约 (如 move_positions 转移的 BTCUSDT 永续) 按线性品种处理: delta=1
+LINEAR_GREEKS = (1.0, 0.0, 0.0, 0.0)
+LINEAR_QUOTES = ("USDT", "USDC", "BUSD", "USD")
+
+
+def underlying_of(symbol):
+    """合约的标的: ETH-250728-3600-C -> ETH, BTCUSDT -> BTC"""
+    try:
+        return parse_symbol(symbol)["underlying"]
+    except ValueError:
+        for quote in LINEAR_QUOTES:
+            if symbol.endswith(quote) and len(symbol) > len(quote):
+                return symbol[:-len(quote)]
+        return symbol
+
+
+def fetch_marks(base_url=BASE_URL):
+    """全市场标记价格和希腊值, 按交易对索引"""
+    return fetch_all(base_url, MARK_ENDPOINT)
+
+
+class RiskBook:
+    """数组化持仓簿, 线程安全 (成交回调可能来自多个任务线程)"""
+
+    def __init__(self, capacity=INITIAL_CAPACITY):
+        self._lock = threading.Lock()
+        self.size = 0
+        self._slots = {}
+        self._symbol_slots = {}
+        self.accounts = []
+        self._account_index = {}
+        self.underlyings = []
+        self._underlying_index = {}
+        self._alloc(capacity)
+        # 汇总: [子账户, 标的, 希腊值] 和每个子账户的已实现盈亏
+        self._exposure = np.zeros((4, 4, len(GREEKS)))
+        self._realized = np.zeros(4)
+        # 最近一次标记价格/单位希腊值, 新开仓的行直接取用
+        self._marks = {}
+
+    def _alloc(self, capacity):
+        self.symbols = [None] * capacity
+        self.qty = np.zeros(capacity)
+        self.cost = np.zeros(capacity)
+        self.realized = np.zeros(capacity)
+        self.mark = np.full(capacity, np.nan)
+        self.unit = np.zeros((capacity, len(GREEKS)))
+        self.account = np.zeros(capacity, dtype=np.int32)
+        self.underlying = np.zeros(capacity, dtype=np.int32)
+
+    def _grow(self):
+        capacity = len(self.qty) * 2
+        old = (self.qty, self.cost, self.realized, self.mark, self.unit, self.account, self.underlying)
+        symbols = self.symbols
+        self._alloc(capacity)
+        for new, values in zip((self.qty, self.cost, self.realized, self.mark, self.unit, self.account, self.underlying), old):
+            new[:len(values)] = values
+        self.symbols[:len(symbols)] = symbols
+
+    def _index(self, names, index, name, axis):
+        position = index.get(name)
+        if position is None:
+            position = index[name] = len(names)
+            names.append(name)
+            if position >= self._exposure.shape[axis]:
+                shape = list(self._exposure.shape)
+                shape[axis] *= 2
+                exposure = np.zeros(shape)
+                exposure[:self._exposure.shape[0], :self._exposure.shape[1]] = self._exposure
+                self._exposure = exposure
+                if axis == 0:
+                    self._realized = np.concatenate([self._realized, np.zeros(len(self._realized))])
+        return position
+
+    def _slot(self, account, symbol):
+        slot = self._slots.get((account, symbol))
+        if slot is not None:
+            return slot
+        if self.size == len(self.qty):
+            self._grow()
+        slot = self._slots[(account, symbol)] = self.size
+        self.size += 1
+        self.symbols[slot] = symbol
+        self._symbol_slots.setdefault(symbol, []).append(slot)
+        self.account[slot] = self._index(self.accounts, self._account_index, account, 0)
+        self.underlying[slot] = self._index(self.underlyings, self._underlying_index, underlying_of(symbol), 1)
+        mark = self._marks.get(symbol)
+        if mark is not None:
+            self.mark[slot], self.unit[slot] = mark
+        else:
+            try:
+                parse_symbol(symbol)
+            except ValueError:
+                self.unit[slot] = LINEAR_GREEKS
+        return slot
+
+    # ---------- 增量更新 ----------
+
+    def on_fill(self, symbol, side, quantity, price, account=DEFAULT_ACCOUNT):
+        """记录一笔成交, 返回该笔的已实现盈亏"""
+        signed = float(quantity) if side == "BUY" else -float(quantity)
+        price = float(price)
+        with self._lock:
+            slot = self._slot(account, symbol)
+            old = float(self.qty[slot])
+            cost = float(self.cost[slot])
+            new = old + signed
+            if abs(new) < 1e-12:
+                new = 0.0
+            realized = 0.0
+            if old == 0 or (old > 0) == (signed > 0):
+                # 开仓/加仓: 均价按数量加权
+                cost = (old * cost + signed * price) / new
+            elif abs(signed) <= abs(old):
+                # 减仓: 按均价结算平掉的部分
+                realized = (price - cost) * -signed
+                if new == 0:
+                    cost = 0.0
+            else:
+                # 反手: 原持仓全部平掉, 剩余部分以成交价开新仓
+                realized = (price - cost) * old
+                cost = price
+            self.qty[slot] = new
+            self.cost[slot] = cost
+            a, u = self.account[slot], self.underlying[slot]
+            self._exposure[a, u] += signed * self.unit[slot]
+            if realized:
+                self.realized[slot] += realized
+                self._realized[a] += realized
+        return realized
+
+    def fill_callback(self, account=DEFAULT_ACCOUNT):
+        """给 OrderManager(on_fill=...) 使用的回调, 成交记到指定子账户"""
+        def callback(symbol, side, quantity, price):
+            self.on_fill(symbol, side, quantity, price, account)
+        return callback
+
+    def on_move(self, from_account, to_account, symbol, quantity, price, position_side="BOTH"):
+        """子账户间移仓 (move_positions): 源账户按价格平掉, 目标账户按同一价格开仓"""
+        with self._lock:
+            slot = self._slots.get((from_account, symbol))
+            current = float(self.qty[slot]) if slot is not None else 0.0
+        short = position_side == "SHORT" or (position_side == "BOTH" and current < 0)
+        close_side, open_side = ("BUY", "SELL") if short else ("SELL", "BUY")
+        self.on_fill(symbol, close_side, quantity, price, from_account)
+        self.on_fill(symbol, open_side, quantity, price, to_account)
+
+    def update_marks(self, marks):
+        """按 /eapi/v1/mark 的结果 ({symbol: {markPrice, delta, gamma, vega, theta}}) 刷新并重算汇总"""
+        parsed = {}
+        for symbol, item in marks.items():
+            try:
+                parsed[symbol] = (float(item['markPrice']), [float(item.get(name) or 0.0) for name in GREEKS])
+            except (KeyError, TypeError, ValueError):
+                continue
+        with self._lock:
+            self._marks.update(parsed)
+            for symbol, (mark, unit) in parsed.items():
+                slots = self._symbol_slots.get(symbol)
+                if slots:
+                    self.mark[slots] = mark
+                    self.unit[slots] = unit
+            self._rebuild()
+
+    def _rebuild(self):
+        """全量重算希腊值汇总 (只在刷新标记价格时调用)"""
+        n = self.size
+        self._exposure[:] = 0
+        np.add.at(self._exposure, (self.account[:n], self.underlying[:n]), self.qty[:n, None] * self.unit[:n])
+
+    # ---------- 查询 (执行循环做风控检查时调用) ----------
+
+    def position(self, symbol, account=None):
+        """净持仓, account 为 None 时汇总所有子账户"""
+        with self._lock:
+            if account is not None:
+                slot = self._slots.get((account, symbol))
+                return float(self.qty[slot]) if slot is not None else 0.0
+            slots = self._symbol_slots.get(symbol)
+            if not slots:
+                return 0.0
+            if len(slots) == 1:
+                return float(self.qty[slots[0]])
+            return float(self.qty[slots].sum())
+
+    def exposure(self, underlying, account=None):
+        """标的的净希腊值 {delta, gamma, vega, theta}"""
+        with self._lock:
+            u = self._underlying_index.get(underlying)
+            if u is None:
+                return dict.fromkeys(GREEKS, 0.0)
+            if account is None:
+                values = self._exposure[:len(self.accounts), u].sum(axis=0)
+            else:
+                a = self._account_index.get(account)
+                values = self._exposure[a, u] if a is not None else np.zeros(len(GREEKS))
+        return dict(zip(GREEKS, values.tolist()))
+
+    def realized_pnl(self, account=None):
+        with self._lock:
+            if account is None:
+                return float(self._realized[:len(self.accounts)].sum())
+            a = self._account_index.get(account)
+            return float(self._realized[a]) if a is not None else 0.0
+
+    def unrealized_pnl(self, account=None):
+        """按标记价格的未实现盈亏, 没有标记价格的持仓不计入"""
+        with self._lock:
+            n = self.size
+            values = self.qty[:n] * (self.mark[:n] - self.cost[:n])
+            if account is not None:
+                a = self._account_index.get(account)
+                if a is None:
+                    return 0.0
+                values = values[self.account[:n] == a]
+            return float(np.nansum(values))
+
+    def pnl(self, account=None):
+        realized = self.realized_pnl(account)
+        unrealized = self.unrealized_pnl(account)
+        return {"realized": realized, "unrealized": unrealized, "total": realized + unrealized}
+
+    def positions(self, account=None):
+        """非零持仓列表"""
+        with self._lock:
+            rows = []
+            for (name, symbol), slot in self._slots.items():
+                if (account is not None and name != account) or self.qty[slot] == 0:
+                    continue
+                mark = float(self.mark[slot])
+                rows.append({
+                    "account": name,
+                    "symbol": symbol,
+                    "qty": float(self.qty[slot]),
+                    "avg_price": float(self.cost[slot]),
+                    "mark": None if np.isnan(mark) else mark,
+                    "realized": float(self.realized[slot]),
+                    **{greek: float(self.qty[slot] * value) for greek, value in zip(GREEKS, self.unit[slot])},
+                })
+        return rows
+
+    def summary(self):
+        """按标的和子账户的汇总视图"""
+        return {
+            "underlyings": {underlying: self.exposure(underlying) for underlying in list(self.underlyings)},
+            "accounts": {
+                account: {
+                    **self.pnl(account),
+                    "exposure": {underlying: self.exposure(underlying, account) for underlying in list(self.underlyings)},
+                }
+                for account in list(self.accounts)
+            },
+            "pnl": self.pnl(),
+            "positions": self.size,
+        }
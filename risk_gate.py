@@ -0,0 +1,247 @@
+# 下单前风控 - 每笔订单发出前的检查流水线, 不通过时返回原因, 调用方不发单
+# 检查项: 紧急停止开关、单笔最大数量/名义价值、单合约持仓名义价值上限、相对标记价格的价格带、
+#         相对买一/卖一的价格带和交叉盘口、卖价低于内在价值、日内亏损上限
+# 热路径只做比较: 每个合约的行权价/方向/限额在首次检查时算好缓存, 标记价格/指数价格/停止开关文件/日内盈亏
+# 由后台线程定期刷新成快照, check() 每单只需几微秒 (见 bench_risk_gate.py)
+# 限额配置为 JSON 文件, 未配置的项不检查:
+#   {"max_qty": 50, "max_notional": 20000, "max_symbol_notional": 50000, "mark_band": 0.3,
+#    "book_band": 0.05, "daily_loss_cap": 5000, "symbols": {"ETH-250728-3600-C": {"max_qty": 10}}}
+# 紧急停止: 创建停止开关文件 (默认 ./KILL_SWITCH) 即拒绝所有新订单, 删除后恢复
+import json
+import os
+import threading
+from datetime import datetime, timezone
+
+import requests
+
+import http_client
+import metrics
+from pricing import parse_symbol
+from risk_book import fetch_marks
+
+INDEX_ENDPOINT = '/eapi/v1/index'
+KILL_SWITCH_PATH = 'KILL_SWITCH'
+REFRESH_INTERVAL = 5.0
+
+# 默认限额: 只开启不依赖账户规模的价格类检查
+DEFAULT_LIMITS = {
+    "max_qty": None,
+    "max_notional": None,
+    "max_symbol_notional": None,
+    # 卖价低于 / 买价高于标记价格的最大比例 (对自己有利方向的偏离不限制);
+    # 低价虚值合约按最小绝对偏离放宽 (一两个价格档位就可能超过比例)
+    "mark_band": 0.5,
+    "mark_band_min": 1.0,
+    # 卖价低于买一 / 买价高于卖一的最大比例 (穿价太深视为胖手指)
+    "book_band": 0.1,
+    "daily_loss_cap": None,
+}
+
+INF = float('inf')
+
+
+def load_limits(path=None):
+    """读取限额配置 (JSON), 未提供的项取默认值"""
+    limits = dict(DEFAULT_LIMITS, symbols={})
+    if path:
+        with open(path, encoding='utf-8') as f:
+            limits.update(json.load(f))
+    return limits
+
+
+class RiskGate:
+    """下单前风控检查, 线程安全 (快照整体替换, 检查时只读)"""
+
+    def __init__(self, limits=None, risk_book=None, kill_switch_path=KILL_SWITCH_PATH):
+        self.limits = limits or load_limits()
+        self.risk_book = risk_book
+        self.kill_switch_path = kill_switch_path
+        self.killed = False
+        self.kill_reason = None
+        # 快照: 合约 -> 标记价格, 标的 -> 指数价格
+        self.marks = {}
+        self.spots = {}
+        self.loss_breached = False
+        self._day = None
+        self._day_start_pnl = 0.0
+        self._symbols = {}
+        self._stop = threading.Event()
+        self.rejects = {}
+
+    # ---------- 预计算 ----------
+
+    def _symbol_limits(self, symbol):
+        """合约的 (最大数量, 最大单笔名义价值, 最大持仓名义价值, 标记价格带, 最小绝对偏离, 盘口价格带,
+        行权价, 是否看涨, 标的), 无限额为 inf"""
+        cached = self._symbols.get(symbol)
+        if cached is not None:
+            return cached
+        limits = dict(self.limits, **self.limits.get("symbols", {}).get(symbol, {}))
+        try:
+            contract = parse_symbol(symbol)
+            strike, is_call, underlying = contract["strike"], contract["side"] == "CALL", contract["underlying"]
+        except ValueError:
+            strike, is_call, underlying = None, None, None
+        cached = self._symbols[symbol] = (
+            limits.get("max_qty") or INF,
+            limits.get("max_notional") or INF,
+            limits.get("max_symbol_notional") or INF,
+            INF if limits.get("mark_band") is None else limits["mark_band"],
+            limits.get("mark_band_min") or 0.0,
+            INF if limits.get("book_band") is None else limits["book_band"],
+            strike, is_call, underlying,
+        )
+        return cached
+
+    def prepare(self, symbols):
+        """预先计算合约限额, 后台刷新时一并拉取这些合约标的的指数价格"""
+        for symbol in symbols:
+            self._symbol_limits(symbol)
+
+    # ---------- 检查 (热路径) ----------
+
+    def check(self, symbol, side, quantity, price, best_bid=None, best_ask=None):
+        """检查一笔订单, 通过返回None, 否则返回拒绝原因"""
+        reason = self._check(symbol, side, float(quantity), float(price), best_bid, best_ask)
+        if reason is not None:
+            kind = reason.split(':', 1)[0]
+            self.rejects[kind] = self.rejects.get(kind, 0) + 1
+            metrics.incr("risk_rejects", check=kind)
+        return reason
+
+    def halt_reason(self):
+        """停止开关打开或已触发日内亏损上限时返回原因, 此时所有新订单都会被拒绝, 调用方应结束任务而不是重试"""
+        if self.killed:
+            return f"停止开关: {self.kill_reason}"
+        if self.loss_breached:
+            return "日内亏损上限: 已触发, 停止下单"
+        return None
+
+    def _check(self, symbol, side, qty, price, best_bid, best_ask):
+        halted = self.halt_reason()
+        if halted is not None:
+            return halted
+        (max_qty, max_notional, max_symbol_notional, mark_band, mark_band_min, book_band,
+         strike, is_call, underlying) = self._symbol_limits(symbol)
+        if qty <= 0 or price <= 0:
+            return f"数量/价格无效: 数量{qty}, 价格{price}"
+        if qty > max_qty:
+            return f"单笔数量: {qty} 超过上限 {max_qty}"
+        notional = qty * price
+        if notional > max_notional:
+            return f"单笔名义价值: {notional:.2f} 超过上限 {max_notional}"
+
+        mark = self.marks.get(symbol)
+        if mark:
+            allowed = max(mark_band * mark, mark_band_min)
+            if side == "SELL" and price < mark - allowed:
+                return f"标记价格带: 卖价{price} 低于标记价格{mark} 超过 {mark_band:.0%}"
+            if side == "BUY" and price > mark + allowed:
+                return f"标记价格带: 买价{price} 高于标记价格{mark} 超过 {mark_band:.0%}"
+
+        if best_bid is not None and best_ask is not None:
+            best_bid, best_ask = float(best_bid), float(best_ask)
+            if best_bid >= best_ask > 0:
+                return f"交叉盘口: 买一{best_bid} ≥ 卖一{best_ask}, 行情可能过期"
+            if side == "SELL" and price < best_bid * (1 - book_band):
+                return f"盘口价格带: 卖价{price} 低于买一{best_bid} 超过 {book_band:.0%}"
+            if side == "BUY" and price > best_ask * (1 + book_band):
+                return f"盘口价格带: 买价{price} 高于卖一{best_ask} 超过 {book_band:.0%}"
+
+        if side == "SELL" and strike is not None:
+            spot = self.spots.get(underlying)
+            if spot:
+                intrinsic = spot - strike if is_call else strike - spot
+                if price < intrinsic:
+                    return f"内在价值: 卖价{price} 低于内在价值 {intrinsic:.2f} (指数{spot})"
+
+        if max_symbol_notional != INF and self.risk_book is not None:
+            position = self.risk_book.position(symbol)
+            after = position + (qty if side == "BUY" else -qty)
+            if abs(after) > abs(position) and abs(after) * (mark or price) > max_symbol_notional:
+                return f"持仓名义价值: 成交后 {abs(after) * (mark or price):.2f} 超过上限 {max_symbol_notional}"
+        return None
+
+    # ---------- 快照刷新 (后台) ----------
+
+    def kill(self, reason="手动停止"):
+        self.killed = True
+        self.kill_reason = reason
+        print(f"风控停止开关已打开: {reason}")
+
+    def resume(self):
+        self.killed = False
+        self.kill_reason = None
+
+    def update_marks(self, marks):
+        """按 /eapi/v1/mark 结果刷新标记价格快照"""
+        snapshot = {}
+        for symbol, item in marks.items():
+            try:
+                snapshot[symbol] = float(item['markPrice'])
+            except (KeyError, TypeError, ValueError):
+                continue
+        self.marks = snapshot
+
+    def update_spots(self, spots):
+        self.spots = dict(self.spots, **spots)
+
+    def refresh_pnl(self):
+        """按持仓账本更新日内盈亏, 超过上限后拒绝新订单直到UTC次日"""
+        cap = self.limits.get("daily_loss_cap")
+        if not cap or self.risk_book is None:
+            return
+        total = self.risk_book.pnl()["total"]
+        today = datetime.now(timezone.utc).date()
+        if self._day != today:
+            self._day = today
+            self._day_start_pnl = total
+            self.loss_breached = False
+        loss = self._day_start_pnl - total
+        if loss >= cap and not self.loss_breached:
+            print(f"日内亏损 {loss:.2f} 达到上限 {cap}, 停止下单")
+        self.loss_breached = loss >= cap
+
+    def refresh_kill_switch(self):
+        exists = os.path.exists(self.kill_switch_path)
+        if exists and not self.killed:
+            self.kill(f"存在停止开关文件 {self.kill_switch_path}")
+        elif not exists and self.killed and self.kill_reason.startswith("存在停止开关文件"):
+            print("停止开关文件已删除, 恢复下单")
+            self.resume()
+
+    def refresh(self, base_url=None):
+        """刷新所有快照: 停止开关、日内盈亏, 指定 base_url 时拉取标记价格和指数价格"""
+        self.refresh_kill_switch()
+        self.refresh_pnl()
+        if base_url:
+            marks = fetch_marks(base_url)
+            if marks:
+                self.update_marks(marks)
+            underlyings = {self._symbol_limits(symbol)[-1] for symbol in self._symbols} - {None}
+            self.update_spots({u: p for u in underlyings if (p := fetch_index(base_url, u)) is not None})
+
+    def start(self, base_url=None, interval=REFRESH_INTERVAL, symbols=()):
+        """先同步刷新一次, 之后后台线程定期刷新"""
+        self.prepare(symbols)
+        self.refresh(base_url)
+
+        def worker():
+            while not self._stop.wait(interval):
+                self.refresh(base_url)
+
+        threading.Thread(target=worker, daemon=True).start()
+
+    def stop(self):
+        self._stop.set()
+
+
+def fetch_index(base_url, underlying):
+    """标的指数价格 (如 ETH -> ETHUSDT), 失败返回None"""
+    try:
+        response = http_client.get(base_url + INDEX_ENDPOINT, params={"underlying": f"{underlying}USDT"})
+        response.raise_for_status()
+        return float(response.json()['indexPrice'])
+    except (requests.exceptions.RequestException, ValueError, KeyError, TypeError) as e:
+        print(f"获取 {underlying} 指数价格失败: {e}")
+        return None
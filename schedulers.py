@@ -0,0 +1,196 @@
+# 执行调度 - 决定卖出循环每一片挂多少、何时挂、挂单最多挂多久, 价格仍由 market_trade 按卖一减折扣/不低于买一计算
+#   touch    - 默认: 每次按卖一数量挂单, 挂到成交为止 (原有行为)
+#   twap     - 在 duration 秒内均分为 slices 片, 落后进度的部分并入下一片
+#   pov      - 按市场成交量的固定比例卖出, 成交量来自 /eapi/v1/trades 的逐笔成交 (按成交ID增量拉取)
+#   adaptive - 按盘口前几档深度调整每片大小: 深度厚时大片快速卖出, 深度薄时缩小, 挂单超时后按最新深度重挂
+# 大额卖出不再被卖一数量限制成很多小单, 但价格始终在买一之上, 不会向下吃穿订单簿
+# 用法: python market_trade.py --symbol ETH-250728-3600-C --quantity 50 --strategy twap --duration 600 --slices 20
+import time
+from decimal import Decimal
+
+import requests
+
+import http_client
+from order_manager import to_decimal
+
+TRADES_ENDPOINT = '/eapi/v1/trades'
+STRATEGIES = ("touch", "twap", "pov", "adaptive")
+
+DEFAULT_DURATION = 600.0
+DEFAULT_SLICES = 20
+DEFAULT_POV_RATE = 0.1
+DEFAULT_POV_INTERVAL = 5.0
+DEFAULT_DEPTH_FRACTION = 0.3
+DEFAULT_DEPTH_LEVELS = 5
+DEFAULT_SLICE_TIMEOUT = 10.0
+
+
+def level_qty(levels, count):
+    """前count档的数量之和"""
+    return sum((to_decimal(qty) for _, qty in levels[:count]), Decimal(0))
+
+
+class TouchScheduler:
+    """按卖一数量挂单, 不限挂单时间"""
+
+    name = "touch"
+    depth_levels = 1
+
+    def start(self, manager):
+        """开始执行 (恢复的任务从当前已成交数量起算)"""
+        self.base_qty = manager.executed_qty
+
+    def next_slice(self, manager, orderbook):
+        """本片数量和下一次决策前的等待秒数; 数量为0时等待后重新决策"""
+        return min(to_decimal(orderbook['asks'][0][1]), manager.remaining_qty), 0.0
+
+    def slice_timeout(self):
+        """当前挂单最多挂多久 (秒), 超时撤单后重新决策; None为挂到成交"""
+        return None
+
+    def describe(self):
+        return "贴卖一 (每次按卖一数量挂单)"
+
+
+class TWAPScheduler(TouchScheduler):
+    """时间加权: 第k个时间片结束时累计卖出 total*k/slices"""
+
+    name = "twap"
+
+    def __init__(self, duration=DEFAULT_DURATION, slices=DEFAULT_SLICES):
+        self.duration = float(duration)
+        self.slices = max(int(slices), 1)
+        self.interval = self.duration / self.slices
+        self.started = None
+        self.total_qty = Decimal(0)
+
+    def start(self, manager):
+        super().start(manager)
+        self.started = time.monotonic()
+        self.total_qty = manager.remaining_qty
+
+    def _slice_index(self):
+        return int((time.monotonic() - self.started) // self.interval) + 1
+
+    def next_slice(self, manager, orderbook):
+        index = self._slice_index()
+        if index >= self.slices:
+            # 到期后剩余数量全部挂出, 仍按折扣/买一下限定价
+            return manager.remaining_qty, 0.0
+        target = self.total_qty * index / self.slices
+        qty = min(target - (manager.executed_qty - self.base_qty), manager.remaining_qty)
+        if qty <= 0:
+            return Decimal(0), self.started + index * self.interval - time.monotonic()
+        return qty, 0.0
+
+    def slice_timeout(self):
+        # 挂到本时间片结束, 未成交部分并入下一片
+        return max(self.started + self._slice_index() * self.interval - time.monotonic(), 1.0)
+
+    def describe(self):
+        return f"TWAP ({self.duration:.0f}秒内分{self.slices}片, 每片{self.interval:.1f}秒)"
+
+
+class TradeFlow:
+    """合约的逐笔成交量: 按成交ID增量拉取最近成交, 累计启动后的成交数量"""
+
+    def __init__(self, symbol, base_url, limit=100):
+        self.symbol = symbol
+        self.base_url = base_url
+        self.limit = limit
+        self.last_id = None
+        self.volume = Decimal(0)
+
+    def poll(self):
+        """拉取新成交, 返回累计成交量; 第一次调用只记录起点"""
+        try:
+            response = http_client.get(self.base_url + TRADES_ENDPOINT,
+                                       params={"symbol": self.symbol, "limit": self.limit})
+            response.raise_for_status()
+            trades = response.json()
+        except (requests.exceptions.RequestException, ValueError) as e:
+            print(f"获取最近成交失败: {e}")
+            return self.volume
+        if self.last_id is None:
+            self.last_id = max((trade['id'] for trade in trades), default=0)
+            return self.volume
+        for trade in trades:
+            if trade['id'] > self.last_id:
+                self.volume += to_decimal(trade['qty'])
+        self.last_id = max([self.last_id] + [trade['id'] for trade in trades])
+        return self.volume
+
+
+class POVScheduler(TouchScheduler):
+    """按成交量比例: 累计卖出 ≈ rate * 启动后的市场成交量 (含自己的成交)"""
+
+    name = "pov"
+
+    def __init__(self, flow, rate=DEFAULT_POV_RATE, interval=DEFAULT_POV_INTERVAL):
+        if not 0 < rate < 1:
+            raise ValueError(f"成交量比例必须在0和1之间: {rate}")
+        self.flow = flow
+        self.rate = Decimal(str(rate))
+        self.interval = interval
+
+    def start(self, manager):
+        super().start(manager)
+        self.flow.poll()
+
+    def next_slice(self, manager, orderbook):
+        # 公开成交里也有自己的成交: 自己 = rate * (其他人 + 自己) => 自己 = rate / (1 - rate) * 其他人
+        executed = manager.executed_qty - self.base_qty
+        others = max(self.flow.poll() - executed, Decimal(0))
+        target = self.rate / (1 - self.rate) * others
+        qty = min(target - executed, manager.remaining_qty)
+        if qty <= 0:
+            return Decimal(0), self.interval
+        return qty, 0.0
+
+    def slice_timeout(self):
+        # 定期按最新成交量重新计算目标
+        return self.interval
+
+    def describe(self):
+        return f"POV (市场成交量的{self.rate:.0%}, 每{self.interval:.0f}秒重算)"
+
+
+class AdaptiveScheduler(TouchScheduler):
+    """按盘口深度调整每片大小: 每片为前几档买卖深度较小一侧的固定比例, 至少卖一数量"""
+
+    name = "adaptive"
+
+    def __init__(self, depth_fraction=DEFAULT_DEPTH_FRACTION, depth_levels=DEFAULT_DEPTH_LEVELS,
+                 timeout=DEFAULT_SLICE_TIMEOUT):
+        self.depth_fraction = Decimal(str(depth_fraction))
+        self.depth_levels = depth_levels
+        self.timeout = timeout
+
+    def next_slice(self, manager, orderbook):
+        # 买方深度决定卖单能被吸收多少, 卖方深度决定排在前面的竞争挂单; 取较小一侧控制冲击
+        depth = min(level_qty(orderbook['bids'], self.depth_levels), level_qty(orderbook['asks'], self.depth_levels))
+        qty = max(depth * self.depth_fraction, to_decimal(orderbook['asks'][0][1]))
+        return min(qty, manager.remaining_qty), 0.0
+
+    def slice_timeout(self):
+        return self.timeout
+
+    def describe(self):
+        return (f"自适应 (前{self.depth_levels}档深度的{self.depth_fraction:.0%}, "
+                f"挂单{self.timeout:.0f}秒未成交按最新深度重挂)")
+
+
+def make_scheduler(strategy="touch", symbol=None, base_url=None, duration=DEFAULT_DURATION, slices=DEFAULT_SLICES,
+                   pov_rate=DEFAULT_POV_RATE, pov_interval=DEFAULT_POV_INTERVAL,
+                   depth_fraction=DEFAULT_DEPTH_FRACTION, depth_levels=DEFAULT_DEPTH_LEVELS,
+                   slice_timeout=DEFAULT_SLICE_TIMEOUT):
+    """按策略名创建调度器, 未知策略抛出 ValueError"""
+    if strategy == "touch":
+        return TouchScheduler()
+    if strategy == "twap":
+        return TWAPScheduler(duration, slices)
+    if strategy == "pov":
+        return POVScheduler(TradeFlow(symbol, base_url), pov_rate, pov_interval)
+    if strategy == "adaptive":
+        return AdaptiveScheduler(depth_fraction, depth_levels, slice_timeout)
+    raise ValueError(f"未知执行策略: {strategy}, 可选: {', '.join(STRATEGIES)}")
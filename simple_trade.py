@@ -1,49 +1,78 @@
-import requests
-import hmac
-import hashlib
-import time
-import urllib.parse
+import http_client
 import argparse
+import json
 
-api_key = "" 
-secret_key= "" 
+from risk_gate import RiskGate, load_limits
+from signer import RequestSigner
+
+api_key = ""
+secret_key= ""
 base_url = "https://eapi.binance.com"
 endpoint_path = '/eapi/v1/order'
-timestamp = round(time.time()*1000)
-
-parser = argparse.ArgumentParser(description='币安期权交易脚本')
-
-parser.add_argument('--symbol', required=True, help='交易标的，例如: ETH-250725-3600-C')
-parser.add_argument('--side', choices=['BUY', 'SELL'], required=True, help='交易方向: BUY 或 SELL')
-parser.add_argument('--type', default='LIMIT', choices=['LIMIT', 'MARKET'], help='订单类型: LIMIT 或 MARKET (默认: LIMIT)')
-parser.add_argument('--quantity', type=float, required=True, help='交易数量')
-parser.add_argument('--price', type=float, help='价格 (LIMIT订单必须)')
-parser.add_argument('--time-in-force', default='GTC', choices=['GTC', 'IOC', 'FOK'], 
-                    help='订单有效期类型 (默认: GTC)')
-
-args = parser.parse_args()
-
-params = {
-    "symbol": args.symbol,
-    "side": args.side,
-    "type": args.type,
-    "quantity": args.quantity,
-    "price": args.price, 
-    "timeInForce": args.time_in_force,
-    "timestamp": timestamp
-}
-
-
-querystring = urllib.parse.urlencode(params)
-signature = hmac.new(secret_key.encode('utf-8'),msg = querystring.encode('utf-8'), digestmod = hashlib.sha256).hexdigest()
-url = base_url + endpoint_path + "?" + querystring + "&signature=" + signature
-print(url)
-
-payload = {}
-headers= {
-    'X-MBX-APIKEY': api_key
-}
-
-response = requests.request("POST",url, headers=headers, data = payload)
-print(response.status_code)
-print(response.text)
\ No newline at end of file
+
+
+def place_order(symbol, side, quantity, price=None, order_type='LIMIT', time_in_force='GTC',
+                signer=None, base=None, gate=None):
+    """发送一笔订单, 返回响应 (守护进程等调用方可传入共享签名器和地址); 传入风控 gate 时未通过检查返回None"""
+    if gate is not None:
+        # 不带价格的订单按标记价格检查, 没有标记价格时拒绝
+        reason = gate.check(symbol, side, quantity, price if price is not None else gate.marks.get(symbol, 0))
+        if reason is not None:
+            print(f"风控拒绝下单: {reason}")
+            return None
+
+    params = {
+        "symbol": symbol,
+        "side": side,
+        "type": order_type,
+        "quantity": quantity,
+        "price": price,
+        "timeInForce": time_in_force
+    }
+
+    signer = signer or RequestSigner(api_key, secret_key)
+    url = signer.signed_url(base or base_url, endpoint_path, params)
+    print(url)
+
+    payload = {}
+    headers= {
+        'X-MBX-APIKEY': signer.api_key
+    }
+
+    return http_client.request("POST",url, headers=headers, data = payload)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='币安期权交易脚本')
+
+    parser.add_argument('--symbol', required=True, help='交易标的，例如: ETH-250725-3600-C')
+    parser.add_argument('--side', choices=['BUY', 'SELL'], required=True, help='交易方向: BUY 或 SELL')
+    parser.add_argument('--type', default='LIMIT', choices=['LIMIT', 'MARKET'], help='订单类型: LIMIT 或 MARKET (默认: LIMIT)')
+    parser.add_argument('--quantity', type=float, required=True, help='交易数量')
+    parser.add_argument('--price', type=float, help='价格 (LIMIT订单必须)')
+    parser.add_argument('--time-in-force', default='GTC', choices=['GTC', 'IOC', 'FOK'],
+                        help='订单有效期类型 (默认: GTC)')
+    parser.add_argument('--risk-config', help='下单前风控限额 (JSON, 见 risk_gate.py)')
+    parser.add_argument('--kill-switch', default='KILL_SWITCH', help='停止开关文件, 存在时拒绝下单 (默认: KILL_SWITCH)')
+
+    args = parser.parse_args()
+
+    try:
+        gate = RiskGate(load_limits(args.risk_config), kill_switch_path=args.kill_switch)
+    except (OSError, json.JSONDecodeError) as e:
+        print(f"读取风控限额失败: {e}")
+        return
+    # 单笔下单: 同步拉取一次标记价格/指数价格和停止开关
+    gate.prepare([args.symbol])
+    gate.refresh(base_url)
+
+    response = place_order(args.symbol, args.side, args.quantity, args.price, args.type, args.time_in_force,
+                           gate=gate)
+    if response is None:
+        return
+    print(response.status_code)
+    print(response.text)
+
+
+if __name__ == "__main__":
+    main()
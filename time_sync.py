@@ -0,0 +1,116 @@
+# 服务器时间同步 - 定期采样 /eapi/v1/time, 估计本地时钟偏移和往返延迟
+# 每轮采样多次, 取往返延迟(RTT)最小的一次估计偏移, 签名请求使用校准后的时间戳, 避免 -1021 时间戳错误
+# python time_sync.py
+# 离线测试: python time_sync.py --base-url http://127.0.0.1:8000 (本地桩服务器注入偏移和延迟)
+import requests
+import argparse
+import json
+import threading
+import time
+
+import http_client
+
+# 币安期权API配置
+BASE_URL = "https://eapi.binance.com"
+TIME_ENDPOINT = '/eapi/v1/time'
+
+# 每轮采样次数和同步间隔 (秒)
+SAMPLES_PER_SYNC = 5
+SYNC_INTERVAL = 60
+
+# 时间戳超出 recvWindow 时的错误码
+TIMESTAMP_ERROR_CODE = -1021
+
+
+def is_timestamp_error(response):
+    """响应是否为 -1021 时间戳错误"""
+    if response.status_code != 400:
+        return False
+    try:
+        return response.json().get('code') == TIMESTAMP_ERROR_CODE
+    except (json.JSONDecodeError, AttributeError):
+        return False
+
+
+class TimeSync:
+    """服务器时钟偏移估计, now() 可直接作为签名器的时间来源"""
+
+    def __init__(self, base_url=BASE_URL, samples=SAMPLES_PER_SYNC, interval=SYNC_INTERVAL):
+        self.base_url = base_url
+        self.samples = samples
+        self.interval = interval
+        # 服务器时间 - 本地时间 (毫秒)
+        self.offset = 0.0
+        self.rtt = None
+        self.last_sync = None
+        self.sync_count = 0
+        self._lock = threading.Lock()
+        self._running = False
+        self._thread = None
+
+    def now(self):
+        """校准后的毫秒时间戳, 未同步时等于本地时钟"""
+        return int(time.time() * 1000 + self.offset)
+
+    def sample(self):
+        """采样一次, 返回 (偏移毫秒, 往返毫秒)"""
+        local_send = time.time() * 1000
+        start = time.perf_counter()
+        response = http_client.get(self.base_url + TIME_ENDPOINT)
+        rtt = (time.perf_counter() - start) * 1000
+        response.raise_for_status()
+        server_time = response.json()['serverTime']
+        # 假设请求和响应路径延迟对称, 服务器时间对应发送后半个RTT
+        return server_time - (local_send + rtt / 2), rtt
+
+    def sync(self):
+        """采样多次, 用RTT最小的样本更新偏移, 返回是否成功"""
+        samples = []
+        for _ in range(self.samples):
+            try:
+                samples.append(self.sample())
+            except (requests.exceptions.RequestException, json.JSONDecodeError, KeyError) as e:
+                print(f"服务器时间采样失败: {e}")
+        if not samples:
+            return False
+        offset, rtt = min(samples, key=lambda sample: sample[1])
+        with self._lock:
+            self.offset = offset
+            self.rtt = rtt
+            self.last_sync = time.time()
+            self.sync_count += 1
+        return True
+
+    def start(self):
+        """先同步一次, 再启动后台线程定期同步"""
+        self.sync()
+        self._running = True
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._running = False
+
+    def _run(self):
+        while self._running:
+            time.sleep(self.interval)
+            if self._running:
+                self.sync()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='币安期权服务器时间同步')
+    parser.add_argument('--base-url', default=BASE_URL, help='REST地址 (默认: 币安期权)')
+    parser.add_argument('--samples', type=int, default=SAMPLES_PER_SYNC, help=f'采样次数 (默认: {SAMPLES_PER_SYNC})')
+    args = parser.parse_args()
+
+    time_sync = TimeSync(args.base_url, samples=args.samples)
+    if not time_sync.sync():
+        print("同步失败")
+        return
+    print(f"时钟偏移: {time_sync.offset:.1f} ms (服务器 - 本地)")
+    print(f"最小往返延迟: {time_sync.rtt:.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
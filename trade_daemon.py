@@ -0,0 +1,507 @@
+# 交易守护进程 - 常驻进程 + 任务队列, 代替每笔订单启动一次脚本
+# 启动时完成时间同步、交易规则加载和用户数据流连接, 之后所有任务共用连接池、签名器、限速器和本地订单簿
+# 通过本地HTTP接口提交任务, 多个任务在线程池中并发执行:
+#   sell  - market_trade.py 的贴卖一卖出算法 (run_sell)
+#   order - simple_trade.py 的单笔下单 (place_order)
+#   move  - move_positions.py 的子账户移仓 (move_positions, 带 plan 列表时走批量移仓 move_bulk)
+# python trade_daemon.py --port 8600 --workers 8
+# curl -X POST localhost:8600/jobs -d '{"type": "sell", "symbol": "ETH-250728-3600-C", "quantity": "1", "discount": 2}'
+# curl -X POST localhost:8600/jobs -d '{"type": "sell", "symbol": "...", "quantity": "50", "strategy": "twap", "duration": 600}'
+# curl localhost:8600/jobs/1        查询任务状态
+# curl localhost:8600/risk          各标的净希腊值、各子账户盈亏 (任务参数 account 指定成交记入的子账户)
+# curl localhost:8600/blocktrades   大宗交易滚动统计 (--block-trades ETH 开启), /blocktrades/<合约或到期日> 查单个
+# curl -X DELETE localhost:8600/jobs/1   取消任务 (卖出任务会撤掉当前挂单)
+# 所有任务的订单发出前都经过 risk_gate 风控检查 (--risk-config 限额文件, 工作目录下存在 KILL_SWITCH 文件时拒绝新订单)
+# 离线测试: python trade_daemon.py --base-url http://127.0.0.1:9000 --ws-url ws://127.0.0.1:9000/eapi/ws
+import requests
+import argparse
+import http.server
+import itertools
+import json
+import threading
+import time
+import urllib.parse
+from concurrent.futures import ThreadPoolExecutor
+from decimal import InvalidOperation
+
+import http_client
+import market_trade
+import metrics
+import move_positions
+import schedulers
+import simple_trade
+from block_trades import POLL_INTERVAL as BLOCK_POLL_INTERVAL, BlockTradeIngest
+from local_orderbook import LocalOrderBook
+from market_trade import configure_endpoints
+from order_manager import make_job_id, to_decimal
+from order_tracker import OrderTracker
+from risk_book import DEFAULT_ACCOUNT, RiskBook, fetch_marks
+from risk_gate import REFRESH_INTERVAL, RiskGate, load_limits
+
+DEFAULT_PORT = 8600
+DEFAULT_WORKERS = 8
+DEFAULT_MARK_INTERVAL = 10.0
+
+JOB_TYPES = ("sell", "order", "move")
+FINAL_JOB_STATUSES = ("done", "failed", "cancelled")
+
+# 卖出任务的数值参数及类型, 提交时检查
+SELL_NUMBER_PARAMS = {
+    "discount": float, "min_requote_interval": float, "max_requotes": int, "ladder": int, "ladder_timeout": float,
+    "duration": float, "slices": int, "pov_rate": float, "pov_interval": float, "depth_fraction": float,
+    "depth_levels": int, "slice_timeout": float,
+}
+
+
+def positive_quantity(value, name="quantity"):
+    """解析正数数量, 不合法时抛出 ValueError"""
+    try:
+        quantity = to_decimal(value)
+    except (InvalidOperation, TypeError, ValueError):
+        raise ValueError(f"{name} 不是有效数字: {value!r}")
+    if not quantity.is_finite() or quantity <= 0:
+        raise ValueError(f"{name} 必须为正数: {value!r}")
+    return quantity
+
+
+def validate_params(job_type, params):
+    """提交时检查任务参数, 不合法抛出 ValueError (接口返回400), 不让坏参数进入执行线程"""
+    if not isinstance(params, dict):
+        raise ValueError("任务参数必须是JSON对象")
+    if job_type in ("sell", "order"):
+        symbol = params.get("symbol")
+        if not isinstance(symbol, str) or not symbol:
+            raise ValueError("缺少 symbol")
+        if market_trade.EXCHANGE_INFO.get(symbol) is None:
+            raise ValueError(f"交易对不存在: {symbol}")
+        positive_quantity(params.get("quantity"))
+    if job_type == "sell":
+        strategy = params.get("strategy", "touch")
+        if strategy not in schedulers.STRATEGIES:
+            raise ValueError(f"未知执行策略: {strategy}, 可选: {', '.join(schedulers.STRATEGIES)}")
+        for name, kind in SELL_NUMBER_PARAMS.items():
+            if name not in params:
+                continue
+            try:
+                value = kind(params[name])
+            except (TypeError, ValueError):
+                raise ValueError(f"{name} 不是有效数字: {params[name]!r}")
+            if value != value or value < 0 or value == float('inf'):
+                raise ValueError(f"{name} 必须为非负有限数: {params[name]!r}")
+    elif job_type == "order":
+        if params.get("side") not in ("BUY", "SELL"):
+            raise ValueError(f"side 必须为 BUY 或 SELL: {params.get('side')!r}")
+        if params.get("price") is not None:
+            positive_quantity(params["price"], "price")
+    elif job_type == "move":
+        if "plan" in params:
+            if not isinstance(params["plan"], list) or not params["plan"]:
+                raise ValueError("plan 必须是非空列表")
+        elif not all(params.get(name) for name in ("from_email", "to_email", "positions")):
+            raise ValueError("移仓任务需要 from_email, to_email, positions (或 plan)")
+
+
+class Job:
+    """一个排队/执行中的任务"""
+
+    def __init__(self, job_id, job_type, params):
+        self.id = job_id
+        self.type = job_type
+        self.params = params
+        self.status = "queued"
+        self.result = None
+        self.error = None
+        self.created = time.time()
+        self.started = None
+        self.finished = None
+        self.stop_event = threading.Event()
+        self.future = None
+        # 卖出任务执行中的订单管理器, 用于实时查询进度
+        self.manager = None
+
+    def to_dict(self):
+        data = {
+            "id": self.id,
+            "type": self.type,
+            "status": self.status,
+            "params": self.params,
+            "result": self.result,
+            "error": self.error,
+            "created": self.created,
+            "started": self.started,
+            "finished": self.finished,
+        }
+        if self.manager is not None and self.status == "running":
+            data["progress"] = {
+                "executed_qty": str(self.manager.executed_qty),
+                "remaining_qty": str(self.manager.remaining_qty),
+            }
+        return data
+
+
+class TradeDaemon:
+    """常驻交易服务: 预热的连接/缓存/数据流 + 并发任务执行"""
+
+    def __init__(self, workers=DEFAULT_WORKERS, use_ws=True, use_user_stream=True,
+                 ws_url=None, move_base_url=move_positions.BASE_URL, mark_interval=DEFAULT_MARK_INTERVAL,
+                 risk_limits=None, block_trades=None, block_interval=BLOCK_POLL_INTERVAL):
+        self.workers = workers
+        self.use_ws = use_ws
+        self.use_user_stream = use_user_stream
+        self.ws_url = ws_url
+        self.move_base_url = move_base_url
+        self.executor = ThreadPoolExecutor(max_workers=workers)
+        self.jobs = {}
+        self.books = {}
+        self.started = time.time()
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+        # 所有交易对共用一个用户数据流; 回退对账时按订单登记的交易对查询
+        self.tracker = OrderTracker(
+            market_trade.API_KEY, market_trade.BASE_URL, **({"ws_url": ws_url} if ws_url else {}),
+            reconcile=self._reconcile,
+        )
+        # 所有任务的成交记入同一个持仓/风险账本, 后台按 mark_interval 刷新标记价格和希腊值
+        self.risk = RiskBook()
+        self.mark_interval = mark_interval
+        self._stopped = threading.Event()
+        # 下单前风控: 卖出任务经 market_trade.RISK_GATE, 单笔下单任务在 _run_order 中检查
+        self.gate = RiskGate(risk_limits, self.risk)
+        market_trade.RISK_GATE = self.gate
+        # 大宗交易采集 (可选): 后台增量拉取指定标的的活跃合约, 策略通过 self.block_trades.stats() 读取
+        self.block_trades = None
+        self.block_interval = block_interval
+        if block_trades:
+            self.block_trades = BlockTradeIngest(base_url=market_trade.BASE_URL, underlying=block_trades)
+
+    def _reconcile(self, order_id):
+        symbol = self.tracker.symbol_of(order_id)
+        if symbol is None:
+            return None, 0
+        return market_trade.check_order_status(symbol, order_id)
+
+    # ---------- 生命周期 ----------
+
+    def start(self):
+        """预热: 时间同步、交易规则缓存、用户数据流"""
+        market_trade.TIME_SYNC.start()
+        print(f"服务器时钟偏移: {market_trade.TIME_SYNC.offset:.1f} ms, 往返延迟: {market_trade.TIME_SYNC.rtt} ms")
+        market_trade.EXCHANGE_INFO.load()
+        print(f"交易规则: {len(market_trade.EXCHANGE_INFO.symbols)} 个合约")
+        if self.use_user_stream:
+            self.tracker.start()
+        self.gate.start(market_trade.BASE_URL, REFRESH_INTERVAL)
+        if self.block_trades is not None:
+            self.block_trades.start(self.block_interval)
+        if self.mark_interval:
+            threading.Thread(target=self._refresh_marks, daemon=True).start()
+
+    def _refresh_marks(self):
+        while not self._stopped.wait(self.mark_interval):
+            if self.risk.size:
+                self.risk.update_marks(fetch_marks(market_trade.BASE_URL))
+
+    def stop(self):
+        self._stopped.set()
+        self.gate.stop()
+        if self.block_trades is not None:
+            self.block_trades.stop()
+        for job in list(self.jobs.values()):
+            job.stop_event.set()
+        self.executor.shutdown(wait=True, cancel_futures=True)
+        for book in self.books.values():
+            book.stop()
+        self.tracker.stop()
+        market_trade.TIME_SYNC.stop()
+
+    def get_book(self, symbol):
+        """交易对的本地订单簿, 首次使用时启动, 之后常驻供后续任务复用"""
+        if not self.use_ws:
+            return None
+        with self._lock:
+            book = self.books.get(symbol)
+            if book is None:
+                kwargs = {"ws_url": self.ws_url} if self.ws_url else {}
+                book = self.books[symbol] = LocalOrderBook(symbol, market_trade.BASE_URL, **kwargs)
+                book.start()
+        if not book.wait_synced(timeout=10):
+            print(f"[{symbol}] 本地订单簿10秒内未同步, 暂时回退到REST深度")
+        return book
+
+    # ---------- 任务 ----------
+
+    def submit(self, job_type, params):
+        if job_type not in JOB_TYPES:
+            raise ValueError(f"未知任务类型: {job_type}, 支持: {', '.join(JOB_TYPES)}")
+        validate_params(job_type, params)
+        job = Job(next(self._ids), job_type, params)
+        with self._lock:
+            self.jobs[job.id] = job
+        job.future = self.executor.submit(self._run, job)
+        return job
+
+    def cancel(self, job_id):
+        job = self.jobs.get(job_id)
+        if job is None:
+            return None
+        if job.status == "queued" and job.future.cancel():
+            job.status = "cancelled"
+            job.finished = time.time()
+        else:
+            job.stop_event.set()
+        return job
+
+    def _run(self, job):
+        if job.stop_event.is_set():
+            job.status = "cancelled"
+            job.finished = time.time()
+            return
+        job.status = "running"
+        job.started = time.time()
+        try:
+            with metrics.span("job", type=job.type):
+                job.result = getattr(self, f"_run_{job.type}")(job)
+            job.status = "cancelled" if job.stop_event.is_set() else "done"
+        except (requests.exceptions.RequestException, json.JSONDecodeError, KeyError, ValueError, TypeError,
+                InvalidOperation) as e:
+            job.status = "failed"
+            job.error = f"{type(e).__name__}: {e}"
+            print(f"任务{job.id}失败: {job.error}")
+        except Exception as e:
+            # 兜底: 任何未预料的异常都要让任务结束, 不能一直停在 running
+            job.status = "failed"
+            job.error = f"{type(e).__name__}: {e}"
+            print(f"任务{job.id}异常退出: {job.error}")
+        finally:
+            job.finished = time.time()
+            metrics.incr("jobs", type=job.type, status=job.status)
+
+    def _run_sell(self, job):
+        params = job.params
+        symbol = params["symbol"]
+        filters = market_trade.EXCHANGE_INFO.get(symbol)
+        if filters is None:
+            raise ValueError(f"交易对不存在: {symbol}")
+        if filters.is_expired():
+            raise ValueError(f"合约已到期: {symbol}")
+        self.gate.prepare([symbol])
+        # 执行调度: strategy 及其参数与 market_trade.py 的命令行选项同名 (如 duration/slices/pov_rate)
+        scheduler = schedulers.make_scheduler(
+            params.get("strategy", "touch"), symbol, market_trade.BASE_URL,
+            float(params.get("duration", schedulers.DEFAULT_DURATION)),
+            int(params.get("slices", schedulers.DEFAULT_SLICES)),
+            float(params.get("pov_rate", schedulers.DEFAULT_POV_RATE)),
+            float(params.get("pov_interval", schedulers.DEFAULT_POV_INTERVAL)),
+            float(params.get("depth_fraction", schedulers.DEFAULT_DEPTH_FRACTION)),
+            int(params.get("depth_levels", schedulers.DEFAULT_DEPTH_LEVELS)),
+            float(params.get("slice_timeout", schedulers.DEFAULT_SLICE_TIMEOUT)),
+        )
+        quantity = to_decimal(params["quantity"])
+        # clientOrderId 由 job_id 派生: 未指定时附加守护进程内唯一的任务编号, 同一毫秒提交的相同任务也不会撞号
+        job_id = params.get("job_id") or f"{make_job_id(symbol, 'SELL', quantity)}|{job.id}"
+        manager = market_trade.OrderManager(symbol, "SELL", quantity, job_id=job_id,
+                                            on_fill=self.risk.fill_callback(params.get("account", DEFAULT_ACCOUNT)))
+        job.manager = manager
+        market_trade.run_sell(
+            symbol, manager.total_qty, float(params.get("discount", 5.0)),
+            book=self.get_book(symbol), tracker=self.tracker, filters=filters, manager=manager,
+            chase=bool(params.get("chase", False)),
+            min_requote_interval=float(params.get("min_requote_interval", 1.0)),
+            max_requotes=int(params.get("max_requotes", 20)),
+            ladder=int(params.get("ladder", 1)),
+            ladder_timeout=float(params.get("ladder_timeout", 30.0)),
+            stop_event=job.stop_event, scheduler=scheduler,
+        )
+        return {
+            "executed_qty": str(manager.executed_qty),
+            "remaining_qty": str(manager.remaining_qty),
+            "orders": len(manager.orders),
+        }
+
+    def _run_order(self, job):
+        params = job.params
+        self.gate.prepare([params["symbol"]])
+        reason = self.gate.check(params["symbol"], params["side"], params["quantity"],
+                                 params.get("price") or self.gate.marks.get(params["symbol"], 0))
+        if reason is not None:
+            raise ValueError(f"风控拒绝下单: {reason}")
+        response = simple_trade.place_order(
+            params["symbol"], params["side"], params["quantity"], params.get("price"),
+            params.get("type", "LIMIT"), params.get("time_in_force", "GTC"),
+            signer=market_trade.SIGNER, base=market_trade.BASE_URL,
+        )
+        try:
+            body = response.json()
+        except json.JSONDecodeError:
+            body = response.text
+        if not response.ok:
+            raise ValueError(f"下单失败 ({response.status_code}): {body}")
+        # 单笔下单任务不跟踪后续状态, 只记入下单时已立即成交的部分
+        executed = float(body.get("executedQty") or 0) if isinstance(body, dict) else 0
+        if executed:
+            price = float(body.get("avgPrice") or 0) or float(params.get("price") or 0)
+            self.risk.on_fill(params["symbol"], params["side"], executed, price,
+                              params.get("account", DEFAULT_ACCOUNT))
+        return body
+
+    def _run_move(self, job):
+        params = job.params
+        if "plan" in params:
+            # 批量移仓: plan 为 [{from, to, symbol, qty, side}, ...], 返回逐项结果报告
+            items = [move_positions.parse_plan_item(row, line) for line, row in enumerate(params["plan"], 1)]
+            report = move_positions.move_bulk(items, params.get("workers", move_positions.BULK_WORKERS),
+                                              params.get("attempts", move_positions.BULK_ATTEMPTS),
+                                              base_url=self.move_base_url)
+            for row in report:
+                if row["status"] == "success":
+                    self.risk.on_move(row["from"], row["to"], row["symbol"], row["quantity"],
+                                      row["price"] or 0, row["positionSide"])
+            return report
+        result = move_positions.move_positions(
+            params["from_email"], params["to_email"], params["positions"],
+            params.get("product_type", move_positions.PRODUCT_TYPE), base_url=self.move_base_url,
+        )
+        for order in result.get("movePositionOrders", []):
+            if order.get("success"):
+                self.risk.on_move(params["from_email"], params["to_email"], order["symbol"], order["quantity"],
+                                  order.get("price") or 0, order.get("positionSide", "BOTH"))
+        return result
+
+    def status(self):
+        counts = {}
+        for job in list(self.jobs.values()):
+            counts[job.status] = counts.get(job.status, 0) + 1
+        return {
+            "uptime": round(time.time() - self.started, 1),
+            "workers": self.workers,
+            "jobs": counts,
+            "books": {symbol: book.is_synced() for symbol, book in self.books.items()},
+            "user_stream": self.tracker.connected,
+            "time_offset_ms": market_trade.TIME_SYNC.offset,
+            "limiter": http_client.limiter_stats(),
+            "risk_gate": {"killed": self.gate.killed, "loss_breached": self.gate.loss_breached,
+                          "rejects": dict(self.gate.rejects)},
+            "metrics": metrics.summary() if metrics.enabled() else None,
+        }
+
+
+def make_handler(daemon):
+    class Handler(http.server.BaseHTTPRequestHandler):
+        def _reply(self, status, data):
+            body = json.dumps(data, ensure_ascii=False, default=str).encode('utf-8')
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/json; charset=utf-8')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def _job_id(self):
+            parts = urllib.parse.urlsplit(self.path).path.strip('/').split('/')
+            if len(parts) == 2 and parts[0] == 'jobs' and parts[1].isdigit():
+                return int(parts[1])
+            return None
+
+        def do_GET(self):
+            path = urllib.parse.urlsplit(self.path).path.rstrip('/')
+            if path == '/status':
+                self._reply(200, daemon.status())
+            elif path == '/risk':
+                self._reply(200, {**daemon.risk.summary(), "positions": daemon.risk.positions()})
+            elif path.startswith('/blocktrades'):
+                self._block_trades(path)
+            elif path == '/jobs':
+                self._reply(200, [job.to_dict() for job in list(daemon.jobs.values())])
+            elif self._job_id() is not None and self._job_id() in daemon.jobs:
+                self._reply(200, daemon.jobs[self._job_id()].to_dict())
+            else:
+                self._reply(404, {"error": "not found"})
+
+        def _block_trades(self, path):
+            ingest = daemon.block_trades
+            if ingest is None:
+                self._reply(404, {"error": "未开启大宗交易采集 (--block-trades)"})
+                return
+            key = path[len('/blocktrades'):].strip('/')
+            if not key:
+                self._reply(200, ingest.summary())
+            elif key.count('-') == 1:
+                self._reply(200, ingest.expiry_stats(key))
+            else:
+                self._reply(200, ingest.stats(key))
+
+        def do_POST(self):
+            if urllib.parse.urlsplit(self.path).path.rstrip('/') != '/jobs':
+                self._reply(404, {"error": "not found"})
+                return
+            try:
+                length = int(self.headers.get('Content-Length', 0))
+                params = json.loads(self.rfile.read(length) or b'{}')
+                job = daemon.submit(params.pop("type", None), params)
+            except (json.JSONDecodeError, ValueError, AttributeError) as e:
+                self._reply(400, {"error": str(e)})
+                return
+            self._reply(202, job.to_dict())
+
+        def do_DELETE(self):
+            job = daemon.cancel(self._job_id()) if self._job_id() is not None else None
+            if job is None:
+                self._reply(404, {"error": "not found"})
+            else:
+                self._reply(200, job.to_dict())
+
+        def log_message(self, format, *args):
+            pass
+
+    return Handler
+
+
+def main():
+    parser = argparse.ArgumentParser(description='币安期权交易守护进程')
+    parser.add_argument('--host', default='127.0.0.1', help='监听地址 (默认: 127.0.0.1)')
+    parser.add_argument('--port', type=int, default=DEFAULT_PORT, help=f'监听端口 (默认: {DEFAULT_PORT})')
+    parser.add_argument('--workers', type=int, default=DEFAULT_WORKERS, help=f'并发任务数 (默认: {DEFAULT_WORKERS})')
+    parser.add_argument('--pool-size', type=int, default=20, help='HTTP连接池大小 (默认: 20)')
+    parser.add_argument('--no-ws', action='store_true', help='不使用WebSocket本地订单簿')
+    parser.add_argument('--no-user-stream', action='store_true', help='不使用用户数据流, 通过REST轮询订单状态')
+    parser.add_argument('--base-url', default=market_trade.BASE_URL, help='期权REST地址 (默认: 币安期权)')
+    parser.add_argument('--ws-url', help='期权WebSocket地址 (默认: 币安期权)')
+    parser.add_argument('--move-base-url', default=move_positions.BASE_URL, help='移仓接口地址 (默认: 币安现货API)')
+    parser.add_argument('--metrics-log', help='开启延迟统计, 以JSON lines写入该文件')
+    parser.add_argument('--mark-interval', type=float, default=DEFAULT_MARK_INTERVAL,
+                        help=f'持仓账本刷新标记价格/希腊值的间隔秒数, 0为不刷新 (默认: {DEFAULT_MARK_INTERVAL})')
+    parser.add_argument('--risk-config', help='下单前风控限额 (JSON, 见 risk_gate.py), 不指定时只做价格带检查')
+    parser.add_argument('--block-trades', metavar='UNDERLYING', help='后台采集该标的的大宗交易并做滚动统计, 例如: ETH')
+    parser.add_argument('--block-interval', type=float, default=BLOCK_POLL_INTERVAL,
+                        help=f'大宗交易轮询间隔秒数 (默认: {BLOCK_POLL_INTERVAL})')
+    args = parser.parse_args()
+
+    try:
+        risk_limits = load_limits(args.risk_config)
+    except (OSError, json.JSONDecodeError) as e:
+        print(f"读取风控限额失败: {e}")
+        return
+
+    http_client.configure(pool_size=args.pool_size)
+    configure_endpoints(args.base_url, args.ws_url)
+    metrics.configure(args.metrics_log)
+
+    daemon = TradeDaemon(args.workers, use_ws=not args.no_ws, use_user_stream=not args.no_user_stream,
+                         ws_url=args.ws_url, move_base_url=args.move_base_url, mark_interval=args.mark_interval,
+                         risk_limits=risk_limits, block_trades=args.block_trades,
+                         block_interval=args.block_interval)
+    daemon.start()
+    server = http.server.ThreadingHTTPServer((args.host, args.port), make_handler(daemon))
+    print(f"守护进程已启动: http://{args.host}:{args.port}, 并发任务数: {args.workers}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print("正在停止, 取消未完成任务...")
+    finally:
+        server.server_close()
+        daemon.stop()
+        metrics.report()
+        metrics.close()
+
+
+if __name__ == "__main__":
+    main()